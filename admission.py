@@ -0,0 +1,148 @@
+# admission.py
+# Допуск к покупке билетов на представление. Пока покупателей немного, каждый проходит
+# сразу, расходуя жетон из корзины (ADMISSION_BURST жетонов, пополняется со скоростью
+# ADMISSION_RATE в секунду). Когда жетоны кончились, покупатели встают в очередь и
+# проходят строго по порядку, по одному на каждый новый жетон; страница ожидания
+# показывает место в очереди и примерное время. Переполненная очередь отвечает 503,
+# не трогая БД, поэтому распродажа одного представления не забирает ресурсы у каталога.
+# Состояние - в памяти процесса, лимиты действуют на каждый воркер отдельно.
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from config import ADMISSION_RATE, ADMISSION_BURST, ADMISSION_QUEUE_LIMIT, ADMISSION_PASS_TTL
+from config import ADMISSION_STALE_AFTER
+
+Admission = namedtuple('Admission', 'admitted position eta')
+
+_SWEEP_INTERVAL = 60          # секунд между чистками простаивающих представлений
+
+
+class AdmissionFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Слишком много желающих купить билеты, попробуйте через минуту')
+        self.retry_after = retry_after
+
+
+class _Waiting:
+    __slots__ = ('seq', 'last_seen')
+
+    def __init__(self, seq, now):
+        self.seq = seq
+        self.last_seen = now
+
+
+class _PerformanceGate:
+    def __init__(self, now, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = now
+        self.queue = OrderedDict()    # посетитель -> _Waiting, порядок = очередь
+        self.next_seq = 0             # номер следующего вставшего в очередь
+        self.served_seq = 0           # номер первого ещё не вышедшего из очереди
+        self.passes = {}              # посетитель -> до какого момента допуск действует
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def advance(self, now):
+        # Голова очереди получает допуск за каждый целый жетон; ушедшие со страницы
+        # ожидания жетон не тратят. Возвращает (допущено, покинули очередь)
+        promoted = abandoned = 0
+        while self.queue and self.tokens >= 1:
+            visitor, waiting = self.queue.popitem(last=False)
+            self.served_seq = waiting.seq + 1
+            if now - waiting.last_seen > ADMISSION_STALE_AFTER:
+                abandoned += 1
+                continue
+            self.tokens -= 1
+            self.passes[visitor] = now + ADMISSION_PASS_TTL
+            promoted += 1
+        return promoted, abandoned
+
+    def idle(self, now):
+        return not self.queue and self.tokens >= self.burst and all(until <= now for until in self.passes.values())
+
+
+class AdmissionController:
+    def __init__(self, rate=ADMISSION_RATE, burst=ADMISSION_BURST, queue_limit=ADMISSION_QUEUE_LIMIT):
+        self.rate = rate
+        self.burst = burst
+        self.queue_limit = queue_limit
+        self._gates = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+        self._stats = {'admitted': 0, 'queued': 0, 'promoted': 0, 'abandoned': 0, 'shed': 0}
+
+    def admit(self, performance_id, visitor):
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            gate = self._gates.get(performance_id)
+            if gate is None:
+                gate = self._gates[performance_id] = _PerformanceGate(now, self.rate, self.burst)
+            gate.refill(now)
+
+            if gate.passes.get(visitor, 0) > now:
+                return Admission(True, 0, 0)
+            promoted, abandoned = gate.advance(now)
+            self._stats['promoted'] += promoted
+            self._stats['abandoned'] += abandoned
+            if gate.passes.get(visitor, 0) > now:
+                return Admission(True, 0, 0)
+
+            # Очереди нет - проходит сразу; иначе только через очередь, без обгона
+            if not gate.queue and gate.tokens >= 1:
+                gate.tokens -= 1
+                gate.passes[visitor] = now + ADMISSION_PASS_TTL
+                self._stats['admitted'] += 1
+                return Admission(True, 0, 0)
+
+            waiting = gate.queue.get(visitor)
+            if waiting is None:
+                if len(gate.queue) >= self.queue_limit:
+                    self._stats['shed'] += 1
+                    raise AdmissionFullError(self._eta(gate, len(gate.queue)))
+                waiting = gate.queue[visitor] = _Waiting(gate.next_seq, now)
+                gate.next_seq += 1
+                self._stats['queued'] += 1
+            waiting.last_seen = now
+            position = waiting.seq - gate.served_seq + 1
+            return Admission(False, position, self._eta(gate, position))
+
+    def _eta(self, gate, position):
+        # Секунд до допуска: жетоны, которых не хватает до этого места, по ADMISSION_RATE в секунду
+        return max(1, math.ceil((position - gate.tokens) / self.rate))
+
+    def complete(self, performance_id, visitor):
+        # Покупка состоялась - повторно тем же допуском не пройти
+        with self._lock:
+            gate = self._gates.get(performance_id)
+            if gate is not None:
+                gate.passes.pop(visitor, None)
+
+    def _sweep(self, now):
+        if now - self._swept_at < _SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        for performance_id, gate in list(self._gates.items()):
+            gate.refill(now)
+            if gate.idle(now):
+                del self._gates[performance_id]
+            else:
+                gate.passes = {visitor: until for visitor, until in gate.passes.items() if until > now}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, rate=self.rate, burst=self.burst, queue_limit=self.queue_limit)
+            stats['performances'] = sorted(
+                ({'performance_id': performance_id, 'queue': len(gate.queue), 'tokens': round(gate.tokens, 1),
+                  'passes': len(gate.passes)} for performance_id, gate in self._gates.items()),
+                key=lambda row: -row['queue'])
+        return stats
+
+
+admission = AdmissionController()
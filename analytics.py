@@ -0,0 +1,187 @@
+# analytics.py
+# Аналитика продаж для /admin/statistics: кривые продаж по дням до представления,
+# прогноз распродажи, распределение цен по пьесам и занятость по залам и дням недели.
+# Билеты не выгружаются поштучно: MySQL сворачивает их GROUP BY до строк
+# (представление, день покупки, число билетов) и (пьеса, цена, число билетов), а
+# дальше всё считается векторно в numpy - одинаково быстро для тысячи билетов и для
+# миллионов. Без numpy раздел аналитики просто не показывается.
+from config import ANALYTICS_HORIZON_DAYS, ANALYTICS_VELOCITY_WINDOW
+from config import ANALYTICS_PRICE_BINS, ANALYTICS_SELLOUT_LIMIT
+from db import get_read_db
+from stats import stats_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHECKPOINTS = (60, 30, 14, 7, 3, 1, 0)   # дней до представления в таблице кривых продаж
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+
+def get_analytics():
+    if np is None:
+        return None
+    return stats_cache.get_or_load(('analytics',), lambda: compute(**load()))
+
+
+def load():
+    # Дни - в единицах TO_DAYS(), чтобы разности считались без разбора дат в Python
+    db = get_read_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT TO_DAYS(CURDATE())")
+        today, = cursor.fetchone()
+        cursor.execute("SELECT play_id, title FROM Play")
+        titles = dict(cursor.fetchall())
+        cursor.execute("""SELECT performance_id, Play_play_id, TO_DAYS(date_time), WEEKDAY(date_time),
+                                 available_seats, venue, date_time
+                          FROM Performance ORDER BY performance_id""")
+        performances = cursor.fetchall()
+        cursor.execute("""SELECT Performance_performance_id, TO_DAYS(purchase_date), COUNT(*)
+                          FROM Ticket GROUP BY Performance_performance_id, purchase_date""")
+        sales = cursor.fetchall()
+        cursor.execute("""SELECT p.Play_play_id, t.price, COUNT(*)
+                          FROM Ticket t JOIN Performance p ON p.performance_id = t.Performance_performance_id
+                          GROUP BY p.Play_play_id, t.price""")
+        prices = cursor.fetchall()
+    finally:
+        cursor.close()
+    return {'today': today, 'titles': titles, 'performances': performances, 'sales': sales, 'prices': prices}
+
+
+def compute(today, titles, performances, sales, prices):
+    # performances: (id, play_id, день, день недели, свободно, зал, дата), по возрастанию id;
+    # sales: (id представления, день покупки, билетов); prices: (play_id, цена, билетов)
+    perf = np.array([row[:5] for row in performances], dtype=np.int64).reshape(-1, 5)
+    perf_ids, play_ids, show_day, weekday, free = perf.T
+    sale = np.array(sales, dtype=np.int64).reshape(-1, 3)
+
+    # Строка продаж -> индекс представления; продажи удалённых представлений отбрасываются
+    idx = np.searchsorted(perf_ids, sale[:, 0])
+    known = idx < len(perf_ids)
+    known[known] = perf_ids[idx[known]] == sale[known, 0]
+    idx, sale_day, count = idx[known], sale[known, 1], sale[known, 2]
+
+    sold = np.bincount(idx, weights=count, minlength=len(perf_ids))
+    capacity = sold + free
+
+    context = {'today': today, 'titles': titles, 'performances': performances,
+               'play_ids': play_ids, 'show_day': show_day}
+    return {
+        'checkpoints': CHECKPOINTS,
+        'velocity': _velocity(context, idx, sale_day, count),
+        'sellout': _sellout(context, idx, sale_day, count, sold, capacity, free),
+        'prices': _prices(titles, prices),
+        'heatmap': _heatmap(performances, weekday, sold, capacity),
+    }
+
+
+def _velocity(context, idx, sale_day, count):
+    # Доля билетов, проданных не позже чем за d дней до представления, по прошедшим
+    # представлениям каждой пьесы. Покупки раньше горизонта считаются в первом дне
+    horizon = ANALYTICS_HORIZON_DAYS
+    plays, play_index = np.unique(context['play_ids'], return_inverse=True)
+    past = context['show_day'][idx] < context['today']
+    days_before = np.clip(context['show_day'][idx] - sale_day, 0, horizon)[past]
+    by_day = np.bincount(play_index[idx[past]] * (horizon + 1) + days_before, weights=count[past],
+                         minlength=len(plays) * (horizon + 1)).reshape(len(plays), horizon + 1)
+    # cumulative[:, d] - продано за d и более дней до представления
+    cumulative = by_day[:, ::-1].cumsum(axis=1)[:, ::-1]
+    total = cumulative[:, 0]
+    points = np.array([min(d, horizon) for d in CHECKPOINTS])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = 100.0 * cumulative[:, points] / total[:, None]
+    order = np.argsort(-total, kind='stable')
+    return [{'play_id': int(plays[i]), 'title': context['titles'].get(int(plays[i]), ''),
+             'tickets': int(total[i]), 'shares': [round(float(x), 1) for x in shares[i]]}
+            for i in order if total[i] > 0]
+
+
+def _sellout(context, idx, sale_day, count, sold, capacity, free):
+    # Прогноз по среднему темпу последних ANALYTICS_VELOCITY_WINDOW дней: через сколько
+    # дней кончатся места и успеют ли до представления
+    window = ANALYTICS_VELOCITY_WINDOW
+    today = context['today']
+    recent = sale_day > today - window
+    rate = np.bincount(idx[recent], weights=count[recent], minlength=len(sold)) / window
+    days_left = context['show_day'] - today
+    upcoming = (days_left >= 0) & (free > 0) & (rate > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        days_to_sellout = np.where(rate > 0, free / rate, np.inf)
+    projected = np.minimum(capacity, sold + rate * (days_left + 1))
+    candidates = np.flatnonzero(upcoming)
+    order = candidates[np.argsort(days_to_sellout[candidates], kind='stable')][:ANALYTICS_SELLOUT_LIMIT]
+    rows = []
+    for i in order:
+        perf = context['performances'][i]
+        rows.append({
+            'performance_id': int(perf[0]), 'title': context['titles'].get(perf[1], ''),
+            'date_time': perf[6], 'venue': perf[5],
+            'sold': int(sold[i]), 'capacity': int(capacity[i]), 'per_day': round(float(rate[i]), 1),
+            'days_to_sellout': round(float(days_to_sellout[i]), 1), 'days_left': int(days_left[i]),
+            'sells_out': bool(days_to_sellout[i] <= days_left[i] + 1),
+            'projected_occupancy': round(100.0 * float(projected[i]) / capacity[i], 1),
+        })
+    return rows
+
+
+def _prices(titles, prices):
+    if not prices:
+        return {'edges': [], 'plays': []}
+    play = np.array([row[0] for row in prices], dtype=np.int64)
+    price = np.array([row[1] for row in prices], dtype=np.float64)
+    count = np.array([row[2] for row in prices], dtype=np.float64)
+    order = np.lexsort((price, play))
+    play, price, count = play[order], price[order], count[order]
+    plays, starts, sizes = np.unique(play, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(plays)), sizes)
+
+    # Взвешенные квантили всех пьес сразу: накопленная сумма по всему массиву монотонна,
+    # поэтому порог внутри группы = сумма до группы + q * билетов в группе
+    cumulative = count.cumsum()
+    before = cumulative[starts] - count[starts]
+    total = np.bincount(group, weights=count)
+    quantiles = {}
+    for name, q in (('p10', 0.1), ('median', 0.5), ('p90', 0.9)):
+        position = np.searchsorted(cumulative, before + q * total, side='left')
+        quantiles[name] = price[np.minimum(position, starts + sizes - 1)]
+    mean = np.bincount(group, weights=price * count) / total
+
+    bins = ANALYTICS_PRICE_BINS
+    edges = np.linspace(price.min(), price.max(), bins + 1)
+    column = np.clip(np.searchsorted(edges, price, side='right') - 1, 0, bins - 1)
+    histogram = np.bincount(group * bins + column, weights=count, minlength=len(plays) * bins).reshape(-1, bins)
+    peak = histogram.max(axis=1, keepdims=True)
+    return {
+        'edges': [round(float(x), 2) for x in edges],
+        'plays': [{
+            'play_id': int(plays[g]), 'title': titles.get(int(plays[g]), ''), 'tickets': int(total[g]),
+            'min': float(price[starts[g]]), 'max': float(price[starts[g] + sizes[g] - 1]),
+            'mean': round(float(mean[g]), 2), 'p10': float(quantiles['p10'][g]),
+            'median': float(quantiles['median'][g]), 'p90': float(quantiles['p90'][g]),
+            'histogram': [(int(h), round(100.0 * h / peak[g, 0])) for h in histogram[g]],
+        } for g in np.argsort(-total, kind='stable')],
+    }
+
+
+def _heatmap(performances, weekday, sold, capacity):
+    # Занятость (продано / вместимость) по залам и дням недели, все представления
+    if not performances:
+        return {'weekdays': WEEKDAYS, 'venues': []}
+    venues, venue_index = np.unique(np.array([row[5] for row in performances], dtype=object), return_inverse=True)
+    cell = venue_index * 7 + weekday
+    size = len(venues) * 7
+    sold_cells = np.bincount(cell, weights=sold, minlength=size).reshape(-1, 7)
+    capacity_cells = np.bincount(cell, weights=capacity, minlength=size).reshape(-1, 7)
+    shows = np.bincount(cell, minlength=size).reshape(-1, 7)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        occupancy = 100.0 * sold_cells / capacity_cells
+    return {
+        'weekdays': WEEKDAYS,
+        'venues': [{
+            'venue': venues[v],
+            'cells': [(None if np.isnan(occupancy[v, d]) else round(float(occupancy[v, d]), 1), int(shows[v, d]))
+                      for d in range(7)],
+        } for v in range(len(venues))],
+    }
@@ -0,0 +1,151 @@
+# api.py
+# JSON API для мобильного приложения и киосков: каталог, представления пьесы, свободные
+# места для многих представлений одним вызовом и отзывы. Данные - через те же модели, что
+# и у HTML-страниц (снимок каталога, кэш, реплики), но без шаблонов: в ответе только
+# нужные клиенту поля. Ответы кэшируются по ETag из versions.conditional, как страницы,
+# и сжимаются gzip, если клиент это принимает. orjson используется, если установлен.
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Blueprint, abort, make_response, request
+
+from config import PAGE_SIZE, API_PAGE_LIMIT, API_BATCH_LIMIT, API_GZIP_MIN_SIZE
+from db import PoolExhaustedError
+from models import PlayModel, PerformanceModel, ReviewModel
+from pagination import PLAY_KEYSET, REVIEW_KEYSET
+from versions import conditional
+
+try:
+    import orjson
+except ImportError:  # без orjson - стандартный json, ответ тот же
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Поля ответа; остальное, что вернула модель, клиенту не отдаётся
+PLAY_FIELDS = ('play_id', 'title', 'genre', 'duration')
+PLAY_DETAIL_FIELDS = PLAY_FIELDS + ('description',)
+PERFORMANCE_FIELDS = ('performance_id', 'date_time', 'venue', 'available_seats')
+REVIEW_FIELDS = ('review_id', 'rating', 'text', 'date_posted', 'username')
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _json(data, status=200):
+    response = make_response(dumps(data), status)
+    response.mimetype = 'application/json'
+    return response
+
+
+def _pick(rows, fields):
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def _limit():
+    return max(1, min(request.args.get('limit', PAGE_SIZE, type=int), API_PAGE_LIMIT))
+
+
+def _ids():
+    # ids=1,2,3 или ids=1&ids=2; повторы убираются, порядок сохраняется
+    raw = ','.join(request.args.getlist('ids'))
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    except ValueError:
+        abort(400, 'ids: нужны целые числа через запятую')
+    if not ids:
+        abort(400, 'ids: не указано ни одного id')
+    if len(ids) > API_BATCH_LIMIT:
+        abort(400, f'ids: не больше {API_BATCH_LIMIT} за один запрос')
+    return ids
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def error(e):
+    return _json({'error': e.description}, e.code)
+
+
+@api.errorhandler(PoolExhaustedError)
+def pool_exhausted(e):
+    response = _json({'error': str(e)}, 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+@api.after_request
+def compress(response):
+    # Сжатие целиком готового ответа; ETag становится слабым - байты уже другие, а
+    # conditional() сравнивает If-None-Match нестрого, так что 304 по нему работает
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+    data = response.get_data()
+    if len(data) < API_GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+@api.route('/plays')
+@conditional('play')
+def plays():
+    limit = _limit()
+    rows = PlayModel.get_all_plays(PLAY_KEYSET.decode(request.args.get('after')), limit)
+    return _json({'items': _pick(rows, PLAY_FIELDS), 'next': PLAY_KEYSET.next_cursor(rows, limit)})
+
+
+@api.route('/plays/<int:play_id>')
+@conditional('play')
+def play(play_id):
+    row = PlayModel.get_play_by_id(play_id)
+    if row is None:
+        abort(404, 'Пьеса не найдена')
+    return _json(_pick([row], PLAY_DETAIL_FIELDS)[0])
+
+
+@api.route('/plays/<int:play_id>/performances')
+@conditional('play', 'performance')
+def play_performances(play_id):
+    if PlayModel.get_play_by_id(play_id) is None:
+        abort(404, 'Пьеса не найдена')
+    rows = PerformanceModel.get_performances_by_play(play_id)
+    return _json({'items': _pick(rows, PERFORMANCE_FIELDS)})
+
+
+@api.route('/availability')
+@conditional('performance')
+def availability():
+    # Свободные места для многих представлений: ?ids=1,2,3. Ключи - id строкой (так в JSON),
+    # несуществующие id перечислены в missing
+    ids = _ids()
+    seats = PerformanceModel.get_availability(ids)
+    return _json({'items': {str(performance_id): seats[performance_id] for performance_id in ids
+                            if performance_id in seats},
+                  'missing': [performance_id for performance_id in ids if performance_id not in seats]})
+
+
+@api.route('/reviews')
+@conditional('review')
+def reviews():
+    limit = _limit()
+    rows = ReviewModel.get_all_reviews(REVIEW_KEYSET.decode(request.args.get('after')), limit)
+    return _json({'items': _pick(rows, REVIEW_FIELDS), 'next': REVIEW_KEYSET.next_cursor(rows, limit)})
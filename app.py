@@ -1,20 +1,61 @@
 # app.py
+import io
+from datetime import date, datetime, timedelta
+from itertools import groupby
 from functools import wraps
 
-from flask import Flask, render_template, redirect, url_for, session, flash, request
-from flask_bcrypt import Bcrypt
+import click
+from flask import Flask, Response, make_response, render_template, stream_template, redirect, url_for, session, flash, request
+from flask import stream_with_context
 
-from config import SECRET_KEY
-from db import close_db, get_db
+from config import SECRET_KEY, PAGE_SIZE, WRITE_BEHIND_ENABLED
+from config import ADMISSION_ENABLED, ADMISSION_POLL_INTERVAL, CALENDAR_MAX_DAYS, SNAPSHOT_ENABLED
+from db import close_db, get_db, get_replicas, pool_stats, remember_writes, replica_stats, PoolExhaustedError
 from forms import RegistrationForm, LoginForm, PlayForm, PerformanceForm, BuyTicketForm
-from forms import ReviewForm
-from models import UserModel, PlayModel, PerformanceModel, TicketModel, ReviewModel
-from forms import AveragePriceForm, OccupancyRateForm, TotalTicketsSoldForm
+from forms import ReviewForm, SeatSelectionForm, SeatHoldForm
+from models import UserModel, PlayModel, PerformanceModel, TicketModel, ReviewModel, catalog_cache
+from models import ticket_writer, review_writer
+from forms import AveragePriceForm, OccupancyRateForm, TotalTicketsSoldForm, ImportForm
+from importer import import_file, detect_format
+from export import EXPORTS, iter_csv, filename as export_filename
 from utils import get_average_ticket_price, get_occupancy_rate, get_total_tickets_sold
+from schema import migrate
+from plans import check_plans
+from schedule import ScheduleConflictError
+from seatmap import SeatMapModel, SeatMapError, SeatHoldNotFoundError, make_layout
+from stats import get_dashboard, reconcile_sales, stats_cache
+from analytics import get_analytics
+import metrics
+from versions import conditional
+from fragments import FragmentCacheExtension, fragment_cache
+from passwords import hash_password, verify_password, PasswordBusyError
+import passwords
+from admission import admission, AdmissionFullError
+from snapshot import catalog_snapshot
+from pagination import PLAY_KEYSET, PERFORMANCE_KEYSET, REVIEW_KEYSET, TICKET_KEYSET
+from api import api
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
-bcrypt = Bcrypt(app)
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.register_blueprint(api)
+
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+
+@app.after_request
+def remember_primary_reads(response):
+    remember_writes()
+    return response
+
+
+@app.after_request
+def finish_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'не найден'
+    return metrics.finish_request(f'{request.method} {route}', response, app.logger)
 
 
 @app.teardown_appcontext
@@ -22,6 +63,109 @@ def teardown_db(exception):
     close_db()
 
 
+@app.errorhandler(PoolExhaustedError)
+def pool_exhausted(error):
+    # Все соединения с БД заняты дольше DB_POOL_TIMEOUT: 503 и повтор позже, а не 500
+    response = make_response(render_template('busy.html', error=str(error)), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Применить недостающие миграции схемы БД."""
+    applied = migrate(get_db())
+    for version, description in applied:
+        click.echo(f'{version}: {description}')
+    click.echo(f'Применено миграций: {len(applied)}')
+
+
+@app.cli.command('check-plans')
+@click.option('--verbose', is_flag=True, help='Печатать планы всех запросов, а не только проблемных')
+def check_plans_command(verbose):
+    """Проверить EXPLAIN запросов моделей: без полных сканирований и с объявленными индексами."""
+    report = check_plans()
+    for index in report['missing_indexes']:
+        click.echo(f"НЕТ ИНДЕКСА {index.table}.{index.name} ({', '.join(index.columns)}) - выполните flask migrate")
+    for name in report['silent']:
+        click.echo(f"{name}: НЕ ВЫПОЛНИЛ НИ ОДНОГО ЗАПРОСА - проверьте, что MODEL_READS вызывает _load_*")
+    for query in report['queries']:
+        if query['full_scans']:
+            status = 'ПОЛНОЕ СКАНИРОВАНИЕ ' + ', '.join(query['full_scans'])
+        else:
+            status = 'ok' + (' (filesort)' if query['filesort'] else '')
+        click.echo(f"{query['name']}: {status}")
+        if verbose or query['full_scans']:
+            click.echo(f"    {query['sql']}")
+            for row in query['plan']:
+                click.echo(f"    {row['table']}: type={row['type']} key={row['key']} rows={row['rows']} "
+                           f"{row.get('Extra') or ''}")
+    click.echo(f"Запросов: {len(report['queries'])}")
+    if not report['ok']:
+        raise click.ClickException('есть запросы с полным сканированием таблиц, непроверенные чтения или недостающие индексы')
+
+
+@app.cli.command('replicas')
+def replicas_command():
+    """Показать реплики для чтения и их отставание."""
+    replicas = get_replicas()
+    if not replicas:
+        click.echo('Реплики не настроены (MYSQL_REPLICAS)')
+    for replica in replicas:
+        replica.check()
+        state = 'используется' if replica.healthy else 'не используется'
+        click.echo(f'{replica.name}: отставание {replica.lag} с, {state}'
+                   + (f' ({replica.error})' if replica.error else ''))
+
+
+@app.cli.command('reconcile-sales')
+@click.option('--fix', is_flag=True, help='Пересчитать агрегаты по билетам')
+def reconcile_sales_command(fix):
+    """Сверить агрегаты продаж с таблицей Ticket."""
+    mismatches = reconcile_sales(fix=fix)
+    for table, row_id, field, expected, actual in mismatches:
+        click.echo(f'{table} {row_id} {field}: по билетам {expected}, в агрегате {actual}')
+    click.echo(f'Расхождений: {len(mismatches)}' + (' (исправлено)' if fix and mismatches else ''))
+    if mismatches and not fix:
+        raise SystemExit(1)
+
+
+@app.cli.command('import-catalog')
+@click.argument('kind', type=click.Choice(['plays', 'performances']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='По умолчанию - по расширению файла')
+def import_catalog_command(kind, path, fmt):
+    """Загрузить пьесы или представления из CSV/JSONL."""
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = import_file(stream, kind, fmt or detect_format(path))
+    for line_num, message in report['errors']:
+        click.echo(f'строка {line_num}: {message}')
+    click.echo(f"Строк: {report['rows']}, загружено: {report['inserted']}, с ошибками: {report['failed']}")
+    if report['failed']:
+        raise SystemExit(1)
+
+
+@app.cli.command('seatmap-init')
+@click.argument('performance_id', type=int)
+@click.option('--rows', type=int, required=True)
+@click.option('--seats', type=int, required=True, help='Мест в ряду')
+@click.option('--zones', required=True, help='Зоны: "Партер:1-10:1500,Балкон:11-15:500"')
+def seatmap_init_command(performance_id, rows, seats, zones):
+    """Создать схему зала с рядами и ценовыми зонами для представления."""
+    parsed = []
+    for zone in zones.split(','):
+        name, row_range, price = zone.rsplit(':', 2)
+        first, _, last = row_range.partition('-')
+        parsed.append((name.strip(), int(first), int(last or first), price))
+    try:
+        layout = SeatMapModel.create(performance_id, make_layout(rows, seats, parsed))
+    except SeatMapError as e:
+        raise click.ClickException(str(e))
+    perf = PerformanceModel.get_performance_by_id(performance_id)
+    PerformanceModel.invalidate_cache(perf['play_id'] if perf else None)
+    click.echo(f'Схема создана: {layout.total} мест, зоны: {", ".join(layout.zones)}')
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -33,10 +177,30 @@ def login_required(f):
     return decorated_function
 
 
+def busy_response(error, template, form):
+    # Пул bcrypt переполнен: 503 сразу, чтобы поток запроса не ждал в очереди
+    flash(str(error), 'danger')
+    response = make_response(render_template(template, form=form), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
 def is_admin():
     return 'username' in session and session['username'] == 'admin'
 
 
+def parse_date_arg(name):
+    try:
+        return date.fromisoformat(request.args.get(name, ''))
+    except ValueError:
+        return None
+
+
+def wants_stream():
+    # ?all=1 - отдать весь список потоком вместо одной страницы
+    return request.args.get('all') == '1'
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -53,8 +217,10 @@ def register():
         if user:
             flash('Имя пользователя уже занято', 'danger')
             return redirect(url_for('register'))
-        # hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
-        hashed_pw = password
+        try:
+            hashed_pw = hash_password(password)
+        except PasswordBusyError as e:
+            return busy_response(e, 'register.html', form)
         UserModel.create_user(username, email, hashed_pw)
         flash('Регистрация успешна', 'success')
         return redirect(url_for('login'))
@@ -66,7 +232,18 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = UserModel.get_user_by_username(form.username.data)
-        if user and user['password_hash'] == form.password.data:
+        try:
+            ok, needs_rehash = verify_password(form.password.data, user['password_hash'] if user else None)
+        except PasswordBusyError as e:
+            return busy_response(e, 'login.html', form)
+        if ok and needs_rehash:
+            # Открытый пароль или хэш с устаревшей стоимостью - пересчитываем, пока пароль известен.
+            # Пул занят - пароль уже проверен, так что пускаем без пересчёта: он будет при следующем входе
+            try:
+                UserModel.update_password_hash(user['user_id'], hash_password(form.password.data))
+            except PasswordBusyError:
+                app.logger.info('Пересчёт хэша пароля пользователя %s отложен: пул bcrypt занят', user['user_id'])
+        if ok:
             session['user_id'] = user['user_id']  # Сохраняем идентификатор пользователя в сессию
             session['username'] = user['username']  # Сохраняем имя пользователя в сессию
             flash('Вы успешно вошли в систему!', 'success')
@@ -92,9 +269,15 @@ def secret_page():
 # --- Пьесы ---
 
 @app.route('/plays')
+@conditional('play')
 def plays():
-    all_plays = PlayModel.get_all_plays()
-    return render_template('plays.html', plays=all_plays, admin=is_admin())
+    if wants_stream():
+        return Response(stream_template('plays.html', plays=PlayModel.iter_all_plays(), admin=is_admin(),
+                                        streaming=True))
+    after = PLAY_KEYSET.decode(request.args.get('after'))
+    all_plays = PlayModel.get_all_plays(after, PAGE_SIZE)
+    return render_template('plays.html', plays=all_plays, admin=is_admin(),
+                           next_cursor=PLAY_KEYSET.next_cursor(all_plays, PAGE_SIZE))
 
 
 @app.route('/play/<int:play_id>')
@@ -154,13 +337,41 @@ def delete_play(play_id):
 
 # --- Представления (спектакли) ---
 
+@app.route('/performances')
+def performances():
+    if wants_stream():
+        return Response(stream_template('performances.html', performances=PerformanceModel.iter_all_performances(),
+                                        admin=is_admin(), show_title=True, streaming=True))
+    after = PERFORMANCE_KEYSET.decode(request.args.get('after'))
+    rows = PerformanceModel.get_all_performances(after, PAGE_SIZE)
+    return render_template('performances.html', performances=rows, admin=is_admin(), show_title=True,
+                           next_cursor=PERFORMANCE_KEYSET.next_cursor(rows, PAGE_SIZE))
+
+
 @app.route('/play/<int:play_id>/performances')
+@conditional('performance')
 def play_performances(play_id):
     performances = PerformanceModel.get_performances_by_play(play_id)
     return render_template('performances.html', performances=performances, admin=is_admin())
 
 
+@app.route('/calendar')
+@conditional('performance', 'schedule')
+def calendar():
+    # Афиша за период: по умолчанию неделя с сегодняшнего дня, можно выбрать зал
+    start = parse_date_arg('start') or date.today()
+    days = max(1, min(request.args.get('days', 7, type=int), CALENDAR_MAX_DAYS))
+    venue = request.args.get('venue', '').strip() or None
+    begin = datetime.combine(start, datetime.min.time())
+    performances = PerformanceModel.get_schedule(begin, begin + timedelta(days=days), venue)
+    by_day = [(day, list(items)) for day, items in groupby(performances, key=lambda perf: perf['date_time'].date())]
+    return render_template('calendar.html', by_day=by_day, start=start, days=days, venue=venue,
+                           venues=PerformanceModel.schedule().venues(),
+                           previous=start - timedelta(days=days), next=start + timedelta(days=days))
+
+
 @app.route('/performance/<int:performance_id>')
+@conditional('performance')
 def performance_detail(performance_id):
     perf = PerformanceModel.get_performance_by_id(performance_id)
     if not perf:
@@ -171,7 +382,8 @@ def performance_detail(performance_id):
         return render_template('performance_detail_admin.html', performance=perf)
     else:
         # Для обычного пользователя скрываем тех. поля (performance_id, play_id), оставляем дату, место, доступные места
-        return render_template('performance_detail_user.html', performance=perf)
+        return render_template('performance_detail_user.html', performance=perf,
+                               seatmap=SeatMapModel.get(performance_id))
 
 
 @app.route('/performance/add', methods=['GET', 'POST'])
@@ -184,12 +396,16 @@ def add_performance():
 
     form = PerformanceForm()
     if form.validate_on_submit():
-        PerformanceModel.create_performance(
-            play_id=form.play_id.data,
-            date_time=form.date_time.data,
-            venue=form.venue.data,
-            available_seats=form.available_seats.data
-        )
+        try:
+            PerformanceModel.create_performance(
+                play_id=form.play_id.data,
+                date_time=form.date_time.data,
+                venue=form.venue.data,
+                available_seats=form.available_seats.data
+            )
+        except ScheduleConflictError as e:
+            flash(str(e), 'danger')
+            return render_template('performance_form.html', form=form, action='Добавить')
         flash('Представление добавлено!', 'success')
         return redirect(url_for('performances'))  # Предполагается, что у вас есть такой маршрут
     return render_template('performance_form.html', form=form, action='Добавить')
@@ -209,13 +425,17 @@ def edit_performance(performance_id):
 
     form = PerformanceForm(data=performance)
     if form.validate_on_submit():
-        PerformanceModel.update_performance(
-            performance_id=performance_id,
-            play_id=form.play_id.data,
-            date_time=form.date_time.data,
-            venue=form.venue.data,
-            available_seats=form.available_seats.data
-        )
+        try:
+            PerformanceModel.update_performance(
+                performance_id=performance_id,
+                play_id=form.play_id.data,
+                date_time=form.date_time.data,
+                venue=form.venue.data,
+                available_seats=form.available_seats.data
+            )
+        except ScheduleConflictError as e:
+            flash(str(e), 'danger')
+            return render_template('performance_form.html', form=form, action='Редактировать')
         flash('Представление обновлено!', 'success')
         return redirect(url_for('performances'))
     return render_template('performance_form.html', form=form, action='Редактировать')
@@ -236,14 +456,23 @@ def delete_performance(performance_id):
 @app.route('/performance/<int:performance_id>/buy', methods=['GET', 'POST'])
 @login_required
 def buy_ticket(performance_id):
+    # Допуск проверяется до первого обращения к БД: очередь и отказ ничего не стоят базе
+    if ADMISSION_ENABLED:
+        waiting = waiting_room(performance_id)
+        if waiting is not None:
+            return waiting
     perf = PerformanceModel.get_performance_by_id(performance_id)
     if not perf:
         flash('Представление не найдено', 'danger')
         return redirect(url_for('plays'))
+    seatmap = SeatMapModel.get(performance_id)
+    if seatmap:
+        return buy_seats(perf, seatmap)
     form = BuyTicketForm()
     if form.validate_on_submit():
         try:
             TicketModel.create_ticket(performance_id, form.price.data, session['user_id'])
+            admission.complete(performance_id, session['user_id'])
             flash('Билет успешно куплен!', 'success')
             return redirect(url_for('profile'))
         except Exception as e:
@@ -252,23 +481,91 @@ def buy_ticket(performance_id):
     return render_template('buy_ticket_form.html', form=form, performance=perf)
 
 
+def waiting_room(performance_id):
+    # None - покупателя пропустили; иначе страница ожидания или 503 при полной очереди
+    try:
+        ticket = admission.admit(performance_id, session['user_id'])
+    except AdmissionFullError as e:
+        response = make_response(render_template('waiting_room.html', performance_id=performance_id,
+                                                 full=True, error=str(e)), 503)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    if ticket.admitted:
+        return None
+    response = make_response(render_template('waiting_room.html', performance_id=performance_id, full=False,
+                                             position=ticket.position, eta=ticket.eta,
+                                             poll=ADMISSION_POLL_INTERVAL))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def buy_seats(perf, seatmap):
+    # Представление со схемой зала: места подбираются блоком в выбранной зоне и
+    # бронируются, пока пользователь не подтвердит покупку
+    form = SeatSelectionForm()
+    form.zone.choices = [(zone, f"{zone} - {price} руб. (свободно {seatmap['free'][zone]})")
+                         for zone, price in seatmap['layout'].zones.items()]
+    if form.validate_on_submit():
+        try:
+            hold = SeatMapModel.hold(perf['performance_id'], session['user_id'], form.zone.data, form.quantity.data)
+        except SeatMapError as e:
+            flash(str(e), 'danger')
+        else:
+            PerformanceModel.invalidate_cache(hold['play_id'])
+            admission.complete(perf['performance_id'], session['user_id'])
+            return redirect(url_for('seat_hold', hold_id=hold['hold_id']))
+    return render_template('buy_seats_form.html', form=form, performance=perf, seatmap=seatmap)
+
+
+@app.route('/hold/<int:hold_id>', methods=['GET', 'POST'])
+@login_required
+def seat_hold(hold_id):
+    hold = SeatMapModel.get_hold(hold_id, session['user_id'])
+    if not hold:
+        flash('Бронь не найдена или её срок истёк', 'danger')
+        return redirect(url_for('plays'))
+    form = SeatHoldForm()
+    if form.validate_on_submit():
+        try:
+            if form.confirm.data:
+                result = SeatMapModel.confirm(hold_id, session['user_id'])
+                flash('Билеты успешно куплены!', 'success')
+            else:
+                result = SeatMapModel.release(hold_id, session['user_id'])
+                flash('Бронь отменена', 'info')
+        except SeatHoldNotFoundError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('performance_detail', performance_id=hold['performance_id']))
+        PerformanceModel.invalidate_cache(result['play_id'])
+        if form.confirm.data:
+            UserModel.invalidate_summary(session['user_id'])
+            return redirect(url_for('profile'))
+        return redirect(url_for('performance_detail', performance_id=hold['performance_id']))
+    return render_template('seat_hold.html', form=form, hold=hold)
+
+
 # --- Профиль пользователя ---
 
 @app.route('/profile')
 @login_required
 def profile():
-    user = UserModel.get_user_by_id(session['user_id'])
-    tickets = UserModel.get_user_tickets(session['user_id'])
-    user_reviews = UserModel.get_user_reviews(session['user_id'])
-    return render_template('profile.html', user=user, tickets=tickets, reviews=user_reviews)
+    after = TICKET_KEYSET.decode(request.args.get('after'))
+    data = UserModel.get_profile(session['user_id'], after, PAGE_SIZE, session.get('last_write'))
+    return render_template('profile.html', user=data['user'], tickets=data['tickets'], reviews=data['reviews'],
+                           summary=data['summary'], next_cursor=TICKET_KEYSET.next_cursor(data['tickets'], PAGE_SIZE))
 
 
 # --- Отзывы о театре (все) ---
 
 @app.route('/reviews_all')
+@conditional('review')
 def reviews_all():
-    reviews = ReviewModel.get_all_reviews()
-    return render_template('reviews_all.html', reviews=reviews)
+    if wants_stream():
+        return Response(stream_template('reviews_all.html', reviews=ReviewModel.iter_all_reviews(), streaming=True))
+    after = REVIEW_KEYSET.decode(request.args.get('after'))
+    reviews = ReviewModel.get_all_reviews(after, PAGE_SIZE)
+    return render_template('reviews_all.html', reviews=reviews,
+                           next_cursor=REVIEW_KEYSET.next_cursor(reviews, PAGE_SIZE))
 
 
 @app.route('/reviews/add', methods=['GET', 'POST'])
@@ -294,6 +591,9 @@ def admin_statistics():
     result = None
     plays = PlayModel.get_all_plays()
     performances = PerformanceModel.get_all_performances()
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    dashboard = get_dashboard(date_from, date_to)
 
     if request.method == 'POST':
         stat_type = request.form.get('stat_type')
@@ -319,7 +619,82 @@ def admin_statistics():
     return render_template('admin_statistics.html',
                            plays=plays,
                            performances=performances,
-                           result=result)
+                           result=result,
+                           dashboard=dashboard,
+                           analytics=get_analytics(),
+                           date_from=date_from,
+                           date_to=date_to)
+
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if not is_admin():
+        flash('Доступ разрешен только для администраторов', 'danger')
+        return redirect(url_for('index'))
+    caches = {'Каталог': catalog_cache.stats(), 'Статистика': stats_cache.stats()}
+    return render_template('admin_metrics.html',
+                           routes=metrics.route_latency.report(),
+                           queries=metrics.query_latency.report(),
+                           pool=pool_stats(),
+                           replication=replica_stats(),
+                           caches=caches,
+                           fragments=fragment_cache.stats(),
+                           passwords=passwords.stats(),
+                           writers=[ticket_writer.stats(), review_writer.stats()],
+                           write_behind=WRITE_BEHIND_ENABLED,
+                           admission=admission.stats(),
+                           admission_enabled=ADMISSION_ENABLED,
+                           snapshot=catalog_snapshot.stats(),
+                           snapshot_enabled=SNAPSHOT_ENABLED)
+
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+def admin_import():
+    if not is_admin():
+        flash('Доступ разрешен только для администраторов', 'danger')
+        return redirect(url_for('index'))
+    form = ImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        # Загруженный файл читается потоком; большие файлы werkzeug держит на диске, а не в памяти
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = import_file(stream, form.kind.data, detect_format(upload.filename or ''))
+        flash(f"Загружено строк: {report['inserted']}, с ошибками: {report['failed']}",
+              'warning' if report['failed'] else 'success')
+    return render_template('admin_import.html', form=form, report=report)
+
+
+@app.route('/admin/export')
+@login_required
+def admin_export():
+    if not is_admin():
+        flash('Доступ разрешен только для администраторов', 'danger')
+        return redirect(url_for('index'))
+    return render_template('admin_export.html', kinds=EXPORTS)
+
+
+@app.route('/admin/export/<kind>')
+@login_required
+def admin_export_file(kind):
+    if not is_admin():
+        flash('Доступ разрешен только для администраторов', 'danger')
+        return redirect(url_for('index'))
+    if kind not in EXPORTS:
+        flash('Неизвестный тип выгрузки', 'danger')
+        return redirect(url_for('admin_export'))
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    compress = request.args.get('gzip') == '1'
+    # Файл отдаётся по мере чтения из БД; stream_with_context держит контекст запроса до конца выгрузки
+    response = Response(stream_with_context(iter_csv(kind, date_from, date_to, compress)),
+                        mimetype='application/gzip' if compress else 'text/csv')
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="{export_filename(kind, date_from, date_to, compress)}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 
 @app.route('/search', methods=['GET'])
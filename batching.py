@@ -0,0 +1,116 @@
+# batching.py
+# Групповая фиксация (group commit): вставки из параллельных запросов собираются
+# в короткие пакеты, пишутся одной транзакцией с одним commit(), после чего каждый
+# вызывающий получает свой результат или своё исключение. Не дождавшийся результата
+# вызывающий получает TimeoutError, только если его вставку удалось снять с очереди:
+# вставка, уже попавшая в пакет, может быть записана, и её результат дожидается всегда.
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import mysql.connector
+
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_CHARSET
+from config import WRITE_BATCH_MAX_SIZE, WRITE_BATCH_MAX_LINGER_MS, WRITE_BATCH_TIMEOUT
+
+
+class BatchWriter:
+    def __init__(self, name, flush, max_size=WRITE_BATCH_MAX_SIZE, max_linger=WRITE_BATCH_MAX_LINGER_MS / 1000.0):
+        # flush(conn, items) -> список результатов той же длины; элемент-исключение
+        # передаётся вызывающему как ошибка
+        self.name = name
+        self.flush = flush
+        self.max_size = max_size
+        self.max_linger = max_linger
+        self._queue = queue.Queue()
+        self._conn = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'items': 0, 'max_batch': 0, 'max_queue_depth': 0, 'failed_batches': 0,
+                       'cancelled': 0, 'flush_time_total': 0.0}
+
+    def submit(self, item, timeout=WRITE_BATCH_TIMEOUT):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # cancel() удаётся, только пока писатель не взял элемент в работу
+            # (set_running_or_notify_cancel в _run): тогда вставки не будет
+            if future.cancel():
+                raise
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f'batch-{self.name}', daemon=True)
+                    self._thread.start()
+
+    def _connection(self):
+        # Своё соединение, не из пула: иначе запросы, ждущие пакет и держащие
+        # соединения пула, могли бы не дать писателю ни одного
+        if self._conn is None or not self._conn.is_connected():
+            self._conn = mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                                                 database=MYSQL_DB, charset=MYSQL_CHARSET, buffered=True)
+        return self._conn
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_linger
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            collected = self._collect()
+            # Отменённые вызывающими (истекло ожидание) не пишутся; остальные с этого
+            # момента отменить уже нельзя
+            batch = [(item, future) for item, future in collected if future.set_running_or_notify_cancel()]
+            if len(batch) < len(collected):
+                with self._stats_lock:
+                    self._stats['cancelled'] += len(collected) - len(batch)
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.flush(self._connection(), items)
+            except Exception as e:
+                results = [e] * len(items)
+                self._conn = None
+                with self._stats_lock:
+                    self._stats['failed_batches'] += 1
+            with self._stats_lock:
+                self._stats['batches'] += 1
+                self._stats['items'] += len(items)
+                self._stats['flush_time_total'] += time.perf_counter() - started
+                if len(items) > self._stats['max_batch']:
+                    self._stats['max_batch'] = len(items)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['name'] = self.name
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        stats['avg_flush_ms'] = 1000 * stats['flush_time_total'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
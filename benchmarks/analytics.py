@@ -0,0 +1,81 @@
+# benchmarks/analytics.py
+# Расчёт аналитики /admin/statistics на синтетических данных, без БД. Генерируется то,
+# что вернули бы запросы analytics.load() для --tickets билетов: строки
+# (представление, день покупки, билетов) и (пьеса, цена, билетов). Замеряется только
+# analytics.compute() - выгрузка из MySQL зависит от сервера и сети.
+# Запуск: python -m benchmarks.analytics --tickets 5000000 --performances 5000
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import analytics
+
+
+def synthesize(args):
+    rng = np.random.default_rng(args.seed)
+    today = datetime(2025, 6, 1).toordinal() + 365   # в единицах TO_DAYS()
+    venues = [f'Зал {i}' for i in range(1, args.venues + 1)]
+    titles = {play_id: f'Пьеса {play_id}' for play_id in range(1, args.plays + 1)}
+
+    show_day = today + rng.integers(-180, 90, args.performances)
+    capacity = rng.integers(200, 1200, args.performances)
+    performances_play = rng.integers(1, args.plays + 1, args.performances)
+
+    # Билеты: представление и за сколько дней до показа куплен (экспоненциально к показу)
+    perf_of_ticket = rng.integers(0, args.performances, args.tickets)
+    days_before = np.minimum(rng.exponential(12, args.tickets).astype(np.int64), 120)
+    purchase_day = np.minimum(show_day[perf_of_ticket] - days_before, today)
+    keys, sold = np.unique(perf_of_ticket * 100000 + (purchase_day - today + 50000), return_counts=True)
+    sales = list(zip((keys // 100000 + 1).tolist(), (keys % 100000 - 50000 + today).tolist(), sold.tolist()))
+
+    sold_per_perf = np.bincount(perf_of_ticket, minlength=args.performances)
+    free = np.maximum(capacity - sold_per_perf, 0)
+    base = datetime(2025, 6, 1)
+    performances = []
+    for i in range(args.performances):
+        when = base + timedelta(days=int(show_day[i] - today), hours=19)
+        performances.append((i + 1, int(performances_play[i]), int(show_day[i]), when.weekday(),
+                             int(free[i]), random.Random(i).choice(venues), when))
+
+    price_levels = np.array([300, 500, 800, 1200, 1500, 2500], dtype=np.int64)
+    price = price_levels[rng.integers(0, len(price_levels), args.tickets)]
+    keys, sold = np.unique(performances_play[perf_of_ticket] * 10000 + price, return_counts=True)
+    prices = list(zip((keys // 10000).tolist(), (keys % 10000).tolist(), sold.tolist()))
+    return {'today': today, 'titles': titles, 'performances': performances, 'sales': sales, 'prices': prices}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickets', type=int, default=5_000_000)
+    parser.add_argument('--performances', type=int, default=5000)
+    parser.add_argument('--plays', type=int, default=200)
+    parser.add_argument('--venues', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    data = synthesize(args)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = analytics.compute(**data)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(json.dumps({
+        'tickets': args.tickets,
+        'performances': args.performances,
+        'sales_rows': len(data['sales']),
+        'price_rows': len(data['prices']),
+        'compute_ms': {'min': round(timings[0] * 1000, 1), 'median': round(timings[len(timings) // 2] * 1000, 1)},
+        'velocity_plays': len(result['velocity']),
+        'sellout_rows': len(result['sellout']),
+        'heatmap_venues': len(result['heatmap']['venues']),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
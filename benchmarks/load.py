@@ -0,0 +1,291 @@
+# benchmarks/load.py
+# Нагрузочный прогон всех основных маршрутов.
+#
+#   python -m benchmarks.load seed --plays 200 --performances 5000 --tickets 2000000 --reviews 300000
+#   python -m benchmarks.load run --concurrency 16 --duration 30 --output run.json
+#   python -m benchmarks.load compare base.json run.json --threshold 10
+#
+# seed заполняет базу из config.py детерминированными данными (тот же --seed - те же
+# строки), run гоняет маршруты внутри процесса через тестовый клиент Flask с
+# настраиваемой конкуренцией и пишет JSON с req/s и перцентилями, compare сравнивает
+# два прогона и завершается с кодом 1 при регрессии.
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_CHARSET
+
+GENRES = ['драма', 'комедия', 'трагедия', 'мюзикл', 'опера', 'балет', 'фарс', 'мелодрама']
+VENUES = ['Большая сцена', 'Малая сцена', 'Камерный зал', 'Новая сцена']
+WORDS = ['вишнёвый', 'сад', 'чайка', 'гроза', 'ревизор', 'горе', 'ума', 'души', 'сестры', 'лес', 'буря',
+         'гамлет', 'король', 'лир', 'отелло', 'ромео', 'сон', 'ночь', 'мера', 'дне', 'враги', 'дачники']
+PASSWORD = 'password'
+CHUNK = 10000
+
+# (имя, метод, шаблон URL, вес в сценарии, нужен ли вход, нужен ли админ)
+ROUTES = [
+    ('plays', 'GET', '/plays', 20, False, False),
+    ('play_performances', 'GET', '/play/{play_id}/performances', 20, False, False),
+    ('search', 'GET', '/search?keyword={word}', 10, False, False),
+    ('profile', 'GET', '/profile', 10, True, False),
+    ('reviews_all', 'GET', '/reviews_all', 15, False, False),
+    ('buy_ticket', 'POST', '/performance/{performance_id}/buy', 5, True, False),
+    ('admin_statistics', 'GET', '/admin/statistics', 2, True, True),
+]
+
+
+def connect():
+    return mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                                   database=MYSQL_DB, charset=MYSQL_CHARSET)
+
+
+def insert_chunks(conn, query, rows):
+    cursor = conn.cursor()
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            cursor.executemany(query, chunk)
+            conn.commit()
+            chunk = []
+    if chunk:
+        cursor.executemany(query, chunk)
+        conn.commit()
+    cursor.close()
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    conn = connect()
+    cursor = conn.cursor()
+    if args.reset:
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        for table in ('Ticket', 'Review', 'PerformanceSales', 'PlaySales', 'Performance', 'Play', 'User'):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+        conn.commit()
+
+    started = time.perf_counter()
+    users = [('admin', 'admin@example.com', PASSWORD)]
+    users += [(f'user{i}', f'user{i}@example.com', PASSWORD) for i in range(1, args.users + 1)]
+    insert_chunks(conn, "INSERT INTO User (username, email, password_hash) VALUES (%s, %s, %s)", users)
+    cursor.execute("SELECT MIN(user_id), MAX(user_id) FROM User WHERE username LIKE 'user%'")
+    first_user, last_user = cursor.fetchone()
+
+    plays = (((' '.join(rng.sample(WORDS, rng.randint(1, 3)))).capitalize(), ' '.join(rng.choices(WORDS, k=15)),
+              rng.choice(GENRES), rng.randint(60, 200)) for _ in range(args.plays))
+    insert_chunks(conn, "INSERT INTO Play (title, description, genre, duration) VALUES (%s, %s, %s, %s)", plays)
+    cursor.execute("SELECT MIN(play_id), MAX(play_id) FROM Play")
+    first_play, last_play = cursor.fetchone()
+
+    # Места: вместимость зала минус билеты, которые будут вставлены ниже
+    capacity = max(1, args.tickets // max(1, args.performances) * 2)
+    start_day = datetime(2024, 1, 1, 19, 0)
+    performances = [(rng.randint(first_play, last_play), start_day + timedelta(hours=rng.randint(0, 24 * 365)),
+                     rng.choice(VENUES), capacity) for _ in range(args.performances)]
+    insert_chunks(conn, "INSERT INTO Performance (Play_play_id, date_time, venue, available_seats) "
+                        "VALUES (%s, %s, %s, %s)", performances)
+    cursor.execute("SELECT MIN(performance_id), MAX(performance_id) FROM Performance")
+    first_perf, last_perf = cursor.fetchone()
+
+    sold = {}
+
+    def tickets():
+        for _ in range(args.tickets):
+            performance_id = rng.randint(first_perf, last_perf)
+            if sold.get(performance_id, 0) >= capacity:
+                continue
+            sold[performance_id] = sold.get(performance_id, 0) + 1
+            yield (performance_id, date(2023, 6, 1) + timedelta(days=rng.randint(0, 500)),
+                   rng.choice((300, 400, 500, 800, 1200)), rng.randint(first_user, last_user))
+
+    insert_chunks(conn, "INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id) "
+                        "VALUES (%s, %s, %s, %s)", tickets())
+    insert_chunks(conn, "UPDATE Performance SET available_seats = available_seats - %s WHERE performance_id = %s",
+                  ((count, performance_id) for performance_id, count in sold.items()))
+
+    reviews = ((rng.randint(1, 10), ' '.join(rng.choices(WORDS, k=20)),
+                date(2023, 6, 1) + timedelta(days=rng.randint(0, 500)), rng.randint(first_user, last_user))
+               for _ in range(args.reviews))
+    insert_chunks(conn, "INSERT INTO Review (rating, text, date_posted, User_user_id) VALUES (%s, %s, %s, %s)",
+                  reviews)
+    conn.close()
+
+    # Агрегаты продаж пересчитываются по вставленным билетам
+    from app import app
+    from stats import reconcile_sales
+    with app.app_context():
+        reconcile_sales(fix=True)
+
+    print(json.dumps({'seeded_seconds': round(time.perf_counter() - started, 1), 'users': len(users),
+                      'plays': args.plays, 'performances': args.performances,
+                      'tickets': sum(sold.values()), 'reviews': args.reviews}, ensure_ascii=False))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def id_ranges():
+    conn = connect()
+    cursor = conn.cursor()
+    ranges = {}
+    for name, query in (('play_id', "SELECT MIN(play_id), MAX(play_id) FROM Play"),
+                        ('performance_id', "SELECT MIN(performance_id), MAX(performance_id) FROM Performance"),
+                        ('user_id', "SELECT MIN(user_id), MAX(user_id) FROM User WHERE username <> 'admin'"),
+                        ('admin_id', "SELECT user_id, user_id FROM User WHERE username = 'admin'")):
+        cursor.execute(query)
+        ranges[name] = cursor.fetchone()
+    conn.close()
+    return ranges
+
+
+def run(args):
+    from app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    ranges = id_ranges()
+    selected = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    weights = [route[3] for route in selected]
+    samples = {route[0]: [] for route in selected}
+    errors = {route[0]: 0 for route in selected}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(number):
+        rng = random.Random(args.seed * 1000 + number)
+        client = app.test_client()
+        user_id = rng.randint(*ranges['user_id'])
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'user{user_id}'
+        admin = app.test_client()
+        with admin.session_transaction() as session:
+            session['user_id'] = ranges['admin_id'][0]
+            session['username'] = 'admin'
+
+        local_samples = {name: [] for name in samples}
+        local_errors = dict.fromkeys(samples, 0)
+        while time.perf_counter() < deadline:
+            name, method, template, _, needs_login, needs_admin = rng.choices(selected, weights)[0]
+            url = template.format(play_id=rng.randint(*ranges['play_id']),
+                                  performance_id=rng.randint(*ranges['performance_id']),
+                                  word=rng.choice(WORDS))
+            current = admin if needs_admin else client
+            t0 = time.perf_counter()
+            if method == 'POST':
+                response = current.post(url, data={'price': '400.00'})
+            else:
+                response = current.get(url)
+            elapsed = time.perf_counter() - t0
+            # Перенаправление после покупки - нормальный ответ
+            if response.status_code >= 400:
+                local_errors[name] += 1
+            local_samples[name].append(elapsed)
+        with lock:
+            for name in samples:
+                samples[name].extend(local_samples[name])
+                errors[name] += local_errors[name]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    report = {
+        'meta': {'started_at': datetime.now().isoformat(timespec='seconds'), 'concurrency': args.concurrency,
+                 'duration': round(wall, 2), 'seed': args.seed},
+        'routes': {},
+    }
+    total = 0
+    for name, values in samples.items():
+        values.sort()
+        total += len(values)
+        report['routes'][name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': round(len(values) / wall, 2),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2) if values else None,
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2) if values else None,
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2) if values else None,
+        }
+    report['total'] = {'requests': total, 'rps': round(total / wall, 2), 'errors': sum(errors.values())}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+def compare(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    regressions = []
+    print(f"{'маршрут':<20} {'rps':>18} {'p95, мс':>20} {'p99, мс':>20}")
+    for name, before in base['routes'].items():
+        after = current['routes'].get(name)
+        if not after or not before['requests'] or not after['requests']:
+            continue
+        cells = []
+        for metric, higher_is_better in (('rps', True), ('p95_ms', False), ('p99_ms', False)):
+            change = 100.0 * (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            cells.append(f'{before[metric]:>7} → {after[metric]:<7} {change:+5.0f}%')
+            worse = -change if higher_is_better else change
+            if worse > args.threshold:
+                regressions.append((name, metric, round(change, 1)))
+        print(f'{name:<20} ' + ' '.join(cells))
+
+    if regressions:
+        print(json.dumps({'regressions': regressions}, ensure_ascii=False))
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('seed', help='заполнить базу тестовыми данными')
+    p.add_argument('--users', type=int, default=10000)
+    p.add_argument('--plays', type=int, default=200)
+    p.add_argument('--performances', type=int, default=5000)
+    p.add_argument('--tickets', type=int, default=2000000)
+    p.add_argument('--reviews', type=int, default=300000)
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--reset', action='store_true', help='очистить таблицы перед заполнением')
+    p.set_defaults(func=seed)
+
+    p = commands.add_parser('run', help='нагрузочный прогон')
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--duration', type=float, default=30)
+    p.add_argument('--routes', nargs='*', help='только эти маршруты: ' + ', '.join(r[0] for r in ROUTES))
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--output')
+    p.set_defaults(func=run)
+
+    p = commands.add_parser('compare', help='сравнить два прогона')
+    p.add_argument('base')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=10.0, help='допустимое ухудшение, %%')
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
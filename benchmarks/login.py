@@ -0,0 +1,100 @@
+# benchmarks/login.py
+# Всплеск попыток входа (как при переборе украденных паролей) и отзывчивость остальных
+# запросов. Потоки-"воркеры" проверяют пароли, параллельно зонд раз в --probe-interval
+# запрашивает главную страницу через тестовый клиент Flask и замеряет задержку.
+# Режим --inline считает bcrypt прямо в потоке запроса, как до passwords.py, для сравнения.
+# Запуск: python -m benchmarks.login --attempts 400 --request-threads 64
+import argparse
+import json
+import threading
+import time
+
+import bcrypt
+
+import passwords
+from app import app
+from config import BCRYPT_LOG_ROUNDS
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=400)
+    parser.add_argument('--request-threads', type=int, default=64)
+    parser.add_argument('--rounds', type=int, default=BCRYPT_LOG_ROUNDS)
+    parser.add_argument('--probe-interval', type=float, default=0.01)
+    parser.add_argument('--inline', action='store_true', help='bcrypt в потоке запроса, без пула')
+    args = parser.parse_args()
+
+    stored = bcrypt.hashpw(b'correct horse', bcrypt.gensalt(args.rounds)).decode('ascii')
+    remaining = iter(range(args.attempts))
+    lock = threading.Lock()
+    results = {'ok': 0, 'rejected': 0, 'shed': 0}
+    done = threading.Event()
+
+    def attempt(i):
+        password = 'correct horse' if i % 10 == 0 else f'guess-{i}'
+        if args.inline:
+            return bcrypt.checkpw(password.encode(), stored.encode())
+        return passwords.verify_password(password, stored)[0]
+
+    def worker():
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                return
+            try:
+                outcome = 'ok' if attempt(i) else 'rejected'
+            except passwords.PasswordBusyError:
+                outcome = 'shed'
+            with lock:
+                results[outcome] += 1
+
+    probe_latency = []
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            t0 = time.perf_counter()
+            client.get('/')
+            probe_latency.append(time.perf_counter() - t0)
+            time.sleep(args.probe_interval)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.request_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    probe_latency.sort()
+    verified = results['ok'] + results['rejected']
+    print(json.dumps({
+        'mode': 'inline' if args.inline else 'pool',
+        'rounds': args.rounds,
+        'attempts': args.attempts,
+        'elapsed_seconds': round(elapsed, 3),
+        'verified_per_second': round(verified / elapsed, 1),
+        'results': results,
+        'probe': {
+            'requests': len(probe_latency),
+            'p50_ms': round(percentile(probe_latency, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(probe_latency, 0.99) * 1000, 2),
+            'max_ms': round(percentile(probe_latency, 1.0) * 1000, 2),
+        },
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/prepared.py
+# Частые чтения моделей: текстовый протокол (курсор dictionary=True, как было) против
+# подготовленных выражений из реестра db.PreparedStatements. Нужна база, заполненная
+# python -m benchmarks.load seed.
+# Запуск: python -m benchmarks.prepared --iterations 5000
+import argparse
+import json
+import random
+import time
+
+import mysql.connector
+
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_CHARSET
+from db import PreparedStatements
+
+QUERIES = {
+    'get_performance_by_id': ("""SELECT p.performance_id, p.Play_play_id AS play_id, p.date_time, p.venue, p.available_seats, pl.title
+                   FROM Performance p
+                   JOIN Play pl ON p.Play_play_id = pl.play_id
+                   WHERE p.performance_id=%s""", "SELECT performance_id FROM Performance"),
+    'get_user_by_username': ("SELECT * FROM User WHERE username=%s", "SELECT username FROM User LIMIT 10000"),
+}
+
+
+def connect():
+    return mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                                   database=MYSQL_DB, charset=MYSQL_CHARSET, buffered=True)
+
+
+def text_fetch(conn):
+    def fetch(query, params):
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    return fetch
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(fetch, query, keys, iterations, rng):
+    timings = []
+    for _ in range(iterations):
+        params = (rng.choice(keys),)
+        t0 = time.perf_counter()
+        fetch(query, params)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return {
+        'p50_us': round(percentile(timings, 0.5) * 1e6, 1),
+        'p99_us': round(percentile(timings, 0.99) * 1e6, 1),
+        'per_second': round(iterations / sum(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    conn = connect()
+    text = text_fetch(conn)
+    statements = PreparedStatements(conn)
+    report = {}
+    for name, (query, keys_query) in QUERIES.items():
+        keys = [row[keys_query.split()[1]] for row in text(keys_query, ())]
+        if not keys:
+            raise SystemExit(f'{name}: нет данных, сначала python -m benchmarks.load seed')
+        # Прогрев: подготовка выражения и кэши сервера не должны попасть в замер
+        measure(text, query, keys, 100, random.Random(args.seed))
+        measure(statements.fetch, query, keys, 100, random.Random(args.seed))
+        report[name] = {
+            'text': measure(text, query, keys, args.iterations, random.Random(args.seed)),
+            'prepared': measure(statements.fetch, query, keys, args.iterations, random.Random(args.seed)),
+        }
+    conn.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
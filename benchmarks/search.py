@@ -0,0 +1,91 @@
+# benchmarks/search.py
+# Скорость поиска по SearchIndex на синтетическом каталоге.
+# Запуск: python -m benchmarks.search --plays 100000
+import argparse
+import itertools
+import json
+import random
+import time
+
+from search_index import SearchIndex
+
+WORDS = ['вишнёвый', 'сад', 'чайка', 'гроза', 'ревизор', 'горе', 'от', 'ума', 'мёртвые', 'души', 'три', 'сестры',
+         'дядя', 'ваня', 'бесприданница', 'лес', 'буря', 'гамлет', 'король', 'лир', 'отелло', 'макбет', 'ромео',
+         'джульетта', 'сон', 'летнюю', 'ночь', 'двенадцатая', 'мера', 'за', 'меру', 'на', 'дне', 'мещане',
+         'дачники', 'враги', 'последние', 'night', 'summer', 'winter', 'tale', 'love', 'city', 'house', 'garden']
+GENRES = ['драма', 'комедия', 'трагедия', 'мюзикл', 'опера', 'балет', 'фарс', 'мелодрама', 'водевиль', 'мистерия']
+
+QUERIES = [
+    ('точное слово', 'чайка', ''),
+    ('два слова', 'вишнёвый сад', ''),
+    ('префикс', 'бесприд', ''),
+    ('опечатка', 'ревезор', ''),
+    ('заглавные буквы', 'ГАМЛЕТ', ''),
+    ('слово и жанр', 'король', 'трагедия'),
+    ('только жанр', '', 'водевиль'),
+]
+
+
+SYLLABLES = ['ба', 'ве', 'го', 'ды', 'жу', 'зе', 'ки', 'ло', 'ми', 'не', 'пу', 'ра', 'со', 'ти', 'фа', 'хо',
+             'це', 'чу', 'ша', 'ще']
+
+
+def make_vocabulary(rng, size):
+    # Словарь с распределением Ципфа: знакомые слова - частые, синтетические - длинный хвост
+    words = list(WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 5))))
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+
+def make_plays(count, seed, vocabulary_size=50000):
+    rng = random.Random(seed)
+    words, cum_weights = make_vocabulary(rng, vocabulary_size)
+    for play_id in range(1, count + 1):
+        title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4)))
+        yield {
+            'play_id': play_id,
+            'title': title.capitalize(),
+            'genre': rng.choice(GENRES),
+            'description': ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 20))),
+            'duration': rng.randint(60, 240),
+        }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plays', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.rebuild(make_plays(args.plays, args.seed))
+    report = {'plays': len(index), 'build_seconds': round(time.perf_counter() - started, 3), 'queries': {}}
+
+    for name, keyword, genre in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            results = index.search(keyword, genre, limit=args.limit)
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        report['queries'][name] = {
+            'keyword': keyword,
+            'genre': genre,
+            'results': len(results),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
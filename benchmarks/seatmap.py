@@ -0,0 +1,99 @@
+# benchmarks/seatmap.py
+# Подбор мест по битовой карте под конкурентной нагрузкой, без БД. Потоки-покупатели
+# запрашивают блоки из 1..--max-block соседних мест в случайной зоне; общая блокировка
+# играет роль SELECT ... FOR UPDATE на строке SeatMap. В конце проверяется, что ни одно
+# место не выдано дважды и что блоки не переходят через ряд.
+# Запуск: python -m benchmarks.seatmap --rows 40 --seats 50 --threads 16
+import argparse
+import json
+import random
+import threading
+import time
+
+from seatmap import SeatLayout, make_layout
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=40)
+    parser.add_argument('--seats', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--max-block', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    third = max(1, args.rows // 3)
+    zones = [('Партер', 1, third, 1500), ('Амфитеатр', third + 1, 2 * third, 900),
+             ('Балкон', 2 * third + 1, args.rows, 500)]
+    layout = SeatLayout(make_layout(args.rows, args.seats, zones))
+    lock = threading.Lock()
+    state = {'taken': 0}
+    allocated = []            # (первое место, количество)
+    latency = []
+    failed = {zone: 0 for zone in layout.zones}
+    sold_out = threading.Event()
+
+    def buyer(seed):
+        rng = random.Random(seed)
+        zone_names = list(layout.zones)
+        while not sold_out.is_set():
+            zone = rng.choice(zone_names)
+            n = rng.randint(1, args.max_block)
+            t0 = time.perf_counter()
+            with lock:
+                start = layout.find_block(state['taken'], zone, n)
+                if start is not None:
+                    state['taken'] |= layout.block_bits(start, n)
+                    allocated.append((start, n))
+                else:
+                    failed[zone] += 1
+                    # Зал считается распроданным, когда не найти даже одного места
+                    if all(layout.find_block(state['taken'], z, 1) is None for z in zone_names):
+                        sold_out.set()
+            latency.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=buyer, args=(args.seed + i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    seen = set()
+    double = 0
+    crossing = 0
+    for start, n in allocated:
+        rows = {layout.seat(index)[0] for index in range(start, start + n)}
+        crossing += len(rows) > 1
+        for index in range(start, start + n):
+            double += index in seen
+            seen.add(index)
+
+    latency.sort()
+    print(json.dumps({
+        'seats': layout.total,
+        'threads': args.threads,
+        'allocations': len(allocated),
+        'seats_allocated': len(seen),
+        'failed_requests': failed,
+        'elapsed_seconds': round(elapsed, 3),
+        'allocations_per_second': round(len(allocated) / elapsed, 1),
+        'latency': {
+            'p50_us': round(percentile(latency, 0.5) * 1e6, 1),
+            'p99_us': round(percentile(latency, 0.99) * 1e6, 1),
+            'max_us': round(percentile(latency, 1.0) * 1e6, 1),
+        },
+        'double_allocated': double,
+        'blocks_crossing_rows': crossing,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
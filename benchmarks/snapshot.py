@@ -0,0 +1,126 @@
+# benchmarks/snapshot.py
+# Память воркеров с общим снимком каталога и без него, без БД. Синтетический каталог
+# (--plays пьес, --performances представлений) читается --workers процессами одновременно:
+#   без снимка - каждый держит свою копию строк, как заполненный catalog_cache;
+#   со снимком - каждый отображает один файл snapshot.build() и обходит все записи.
+# Для каждого воркера снимается прирост RSS и частной (не разделяемой с другими процессами)
+# памяти по /proc/self/smaps_rollup (только Linux); со снимком - ещё и время обхода каталога.
+# Запуск: python -m benchmarks.snapshot --workers 8 --performances 200000
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import snapshot
+
+
+def synthesize(args):
+    rnd = random.Random(args.seed)
+    genres = ['Драма', 'Комедия', 'Трагедия', 'Мюзикл', 'Опера', 'Балет']
+    venues = [f'Зал {i}' for i in range(1, 9)]
+    plays = [{'play_id': play_id, 'title': f'Пьеса {play_id}',
+              'description': ' '.join(rnd.choice(['акт', 'сцена', 'герой', 'любовь', 'судьба', 'город'])
+                                      for _ in range(60)),
+              'genre': rnd.choice(genres), 'duration': rnd.choice([90, 120, 150, 180])}
+             for play_id in range(1, args.plays + 1)]
+    base = datetime(2025, 1, 1, 19, 0)
+    performances = [{'performance_id': performance_id, 'play_id': rnd.randint(1, args.plays),
+                     'date_time': base + timedelta(days=rnd.randint(0, 730), hours=rnd.choice([-7, -4, 0])),
+                     'venue': rnd.choice(venues), 'available_seats': rnd.randint(0, 800)}
+                    for performance_id in range(1, args.performances + 1)]
+    return plays, performances
+
+
+def memory():
+    # КБ: RSS и частные страницы
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss_kb': fields['Rss'], 'private_kb': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def worker(mode, path, args, barrier, results):
+    before = memory()
+    report = {}
+    if mode == 'snapshot':
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            view = snapshot.SnapshotView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        # Весь каталог страницами, как его листают маршруты; в памяти - только текущая страница
+        plays = performances = 0
+        after = None
+        while page := view.plays(after, 100):
+            plays += len(page)
+            after = (page[-1]['play_id'],)
+        after = None
+        while page := view.performances(after, 100):
+            performances += len(page)
+            after = (page[-1]['date_time'], page[-1]['performance_id'])
+        report['scan_ms'] = (time.perf_counter() - started) * 1000
+        keep = view
+    else:
+        # Копия в памяти процесса: то, что воркер держит, прочитав каталог из БД
+        plays, performances = synthesize(args)
+        keep = (plays, performances)
+    del plays, performances
+    barrier.wait()      # все воркеры живы одновременно - общие страницы делятся между ними
+    after = memory()
+    report.update(rss_kb=after['rss_kb'] - before['rss_kb'], private_kb=after['private_kb'] - before['private_kb'])
+    results.put(report)
+    barrier.wait()
+    del keep
+
+
+def run(mode, path, args):
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(mode, path, args, barrier, results)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: round(sum(row[key] for row in rows) / len(rows), 1) for key in rows[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--plays', type=int, default=2000)
+    parser.add_argument('--performances', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    plays, performances = synthesize(args)
+    started = time.perf_counter()
+    data = snapshot.build(plays, performances)
+    build_ms = (time.perf_counter() - started) * 1000
+    del plays, performances
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog.snapshot')
+        with open(path, 'wb') as f:
+            f.write(data)
+        report = {
+            'workers': args.workers,
+            'plays': args.plays,
+            'performances': args.performances,
+            'snapshot_kb': round(len(data) / 1024, 1),
+            'build_ms': round(build_ms, 1),
+            # Прирост памяти одного воркера после загрузки каталога, в среднем по воркерам
+            'per_worker_without_snapshot': run('copy', path, args),
+            'per_worker_with_snapshot': run('snapshot', path, args),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,110 @@ MYSQL_PASSWORD = '1234'
 MYSQL_DB = 'theater'
 MYSQL_CHARSET = 'utf8mb4'
 SECRET_KEY = 'your_secret_key'
+
+# Пул соединений с MySQL
+DB_POOL_SIZE = 10             # максимальное число открытых соединений
+DB_POOL_TIMEOUT = 5.0         # сколько секунд ждать свободное соединение
+DB_POOL_RECYCLE = 1800        # пересоздавать соединение старше N секунд
+DB_POOL_PING_INTERVAL = 30    # проверять соединение, если оно простаивало дольше N секунд
+
+# Кэш каталога (пьесы и представления)
+CATALOG_CACHE_SIZE = 2048     # максимальное число записей, дальше вытесняются по LRU
+CATALOG_CACHE_TTL = 300       # время жизни записи, секунд
+
+# Постраничный вывод длинных списков
+PAGE_SIZE = 50                # строк на странице
+STREAM_CHUNK_SIZE = 500       # строк за один запрос при потоковой отдаче
+
+# Поисковый индекс по пьесам
+SEARCH_INDEX_REFRESH = 300    # полная перестройка не реже, чем раз в N секунд (изменения из других процессов)
+SEARCH_RESULTS_LIMIT = 100    # сколько результатов показывать на /search
+
+# Расписание залов и афиша (schedule.py, /calendar)
+DEFAULT_PERFORMANCE_MINUTES = 180  # продолжительность, если у пьесы она не указана
+VENUE_CHANGEOVER_MINUTES = 30  # минимальный перерыв в зале между представлениями
+SCHEDULE_REFRESH = 600        # полная перестройка расписания не реже, чем раз в N секунд
+SCHEDULE_LOCK_TIMEOUT = 10    # сколько секунд ждать блокировку расписания при записи представления
+CALENDAR_MAX_DAYS = 62        # самый длинный период на странице афиши
+
+# Сводная статистика для администратора
+STATS_CACHE_TTL = 30          # сколько секунд показывать посчитанную сводку без пересчёта
+
+# Аналитика продаж на /admin/statistics (analytics.py, нужен numpy)
+ANALYTICS_HORIZON_DAYS = 60   # кривые продаж строятся за столько дней до представления
+ANALYTICS_VELOCITY_WINDOW = 7  # темп продаж для прогноза - средний за последние N дней
+ANALYTICS_PRICE_BINS = 10     # столбцов в гистограмме цен
+ANALYTICS_SELLOUT_LIMIT = 20  # сколько ближайших к распродаже представлений показывать
+
+# Метрики SQL-запросов и маршрутов (/admin/metrics, заголовок Server-Timing)
+SQL_INSTRUMENTATION = True
+N_PLUS_ONE_THRESHOLD = 5      # столько одинаковых запросов за один HTTP-запрос считаем N+1
+METRICS_SAMPLES = 1000        # сколько последних замеров хранить для перцентилей
+
+# Групповая фиксация вставок билетов и отзывов (batching.py)
+WRITE_BEHIND_ENABLED = False  # собирать вставки параллельных запросов в пакеты с одним commit
+WRITE_BATCH_MAX_SIZE = 100    # максимум вставок в одном пакете
+WRITE_BATCH_MAX_LINGER_MS = 5  # сколько миллисекунд ждать попутчиков после первой вставки
+WRITE_BATCH_TIMEOUT = 10      # сколько секунд запрос ждёт подтверждения своей вставки
+
+# Массовый импорт пьес и представлений (/admin/import, flask import-catalog)
+IMPORT_CHUNK_SIZE = 1000      # строк в одном executemany, после каждой пачки - commit
+IMPORT_MAX_ERRORS = 200       # сколько ошибочных строк перечислять в отчёте
+
+# Счётчики версий данных для ETag / Last-Modified (versions.py)
+VERSIONS_FILE = 'versions.bin'  # файл рядом с приложением, общий для всех воркеров
+
+# Общий снимок каталога для всех воркеров (snapshot.py)
+SNAPSHOT_ENABLED = True
+SNAPSHOT_FILE = 'catalog.snapshot'  # файл рядом с приложением; рядом же .lock обновителя
+SNAPSHOT_POLL_INTERVAL = 0.5  # секунд между проверками версий в потоке-обновителе
+SNAPSHOT_MIN_INTERVAL = 1.0   # не перестраивать чаще, секунд
+
+# Кэш отрисованных фрагментов шаблонов (fragments.py)
+FRAGMENT_CACHE_BYTES = 64 * 1024 * 1024  # суммарный размер фрагментов, дальше вытеснение по LRU
+FRAGMENT_CACHE_MAX_ENTRY = 4 * 1024 * 1024  # фрагменты крупнее не кэшируются
+
+# Хэширование паролей (passwords.py)
+BCRYPT_LOG_ROUNDS = 12        # стоимость bcrypt; более дешёвые хэши пересчитываются при входе
+BCRYPT_WORKERS = 4            # сколько хэшей считается одновременно
+BCRYPT_QUEUE_LIMIT = 32       # сколько ещё запросов может ждать в очереди, дальше - 503
+BCRYPT_TIMEOUT = 5            # секунд ожидания результата
+
+# Допуск к покупке билетов при наплыве покупателей (admission.py). Лимиты - на одно
+# представление в одном процессе-воркере; остальной сайт они не затрагивают
+ADMISSION_ENABLED = True
+ADMISSION_RATE = 5.0          # сколько покупателей в секунду допускается к покупке
+ADMISSION_BURST = 20          # столько допускается сразу, пока очереди нет
+ADMISSION_QUEUE_LIMIT = 1000  # мест в очереди ожидания, дальше - 503 с Retry-After
+ADMISSION_PASS_TTL = 300      # секунд на покупку после допуска
+ADMISSION_POLL_INTERVAL = 3   # как часто страница ожидания обновляется, секунд
+ADMISSION_STALE_AFTER = 20    # кто не обновлял страницу ожидания дольше N секунд, покинул очередь
+
+# Потоковая выгрузка CSV для бухгалтерии (/admin/export, export.py)
+EXPORT_FETCH_SIZE = 1000      # строк за один fetchmany из небуферизованного курсора
+EXPORT_NET_WRITE_TIMEOUT = 600  # секунд, которые MySQL ждёт, пока медленный клиент заберёт строки
+
+# Подготовленные выражения на сервере для частых чтений моделей (db.fetch_prepared)
+PREPARED_STATEMENTS = True
+PREPARED_CACHE_SIZE = 64      # выражений на одно соединение, дальше закрываются по LRU
+
+# Параллельные чтения одной страницы на нескольких соединениях пула (db.fetch_parallel)
+PARALLEL_READ_THREADS = 16    # потоков на процесс; соединения берутся из пула только свободные
+
+# Страница профиля (UserModel.get_profile)
+PROFILE_REVIEWS_LIMIT = 20    # сколько последних отзывов показывать
+PROFILE_SUMMARY_CACHE_SIZE = 10000  # пользователей, чья сводка (потрачено, билетов, спектаклей) в кэше
+PROFILE_SUMMARY_TTL = 600     # время жизни сводки, секунд
+
+# JSON API для мобильного приложения и киосков (/api/v1, api.py)
+API_PAGE_LIMIT = 100          # максимальный limit страницы списка
+API_BATCH_LIMIT = 100         # сколько id можно запросить одним вызовом
+API_GZIP_MIN_SIZE = 1024      # ответы короче, байт, не сжимаются
+
+# Реплики для чтения каталога и отзывов (db.get_read_db, db.fetch_prepared(replica=...)).
+# Каждая - словарь параметров mysql.connector поверх основных, например {'host': '10.0.0.2'}
+# или {'port': 3307} для второго локального экземпляра
+MYSQL_REPLICAS = []
+REPLICA_MAX_LAG = 2           # реплика с отставанием больше N секунд не используется
+REPLICA_CHECK_INTERVAL = 5    # как часто проверять отставание реплики, секунд
+READ_AFTER_WRITE_WINDOW = 5   # сколько секунд после записи читать с первичного сервера
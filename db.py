@@ -1,22 +1,523 @@
 # db.py
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import mysql.connector
-from flask import g
+from mysql.connector import errorcode
+from flask import current_app, g, has_request_context, request, session
 from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_CHARSET
+from config import DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_INTERVAL
+from config import SQL_INSTRUMENTATION, PREPARED_STATEMENTS, PREPARED_CACHE_SIZE, PARALLEL_READ_THREADS
+from config import MYSQL_REPLICAS, REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL, READ_AFTER_WRITE_WINDOW
+from metrics import InstrumentedConnection, InstrumentedCursor
+from versions import versions
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+_statement_stats = {'prepared': 0, 'executed': 0, 'reprepared': 0, 'closed': 0}
+_statement_lock = threading.Lock()
+
+
+def _count(name):
+    with _statement_lock:
+        _statement_stats[name] += 1
+
+
+class PreparedStatements:
+    # Подготовленные на сервере выражения одного соединения: текст SQL -> курсор с prepared=True.
+    # Живёт столько же, сколько соединение: при переподключении или пересоздании соединения
+    # пул создаёт новый _PooledConnection, а с ним и пустой реестр.
+    def __init__(self, conn, maxsize=PREPARED_CACHE_SIZE):
+        self.conn = conn
+        self.maxsize = maxsize
+        self._cursors = OrderedDict()  # sql -> (sql, курсор), порядок = LRU
+
+    def _cursor(self, sql):
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            return entry
+        # buffered=False обязателен: буферизованных prepared-курсоров в коннекторе нет,
+        # строки дочитываются сразу в fetch()
+        cursor = self.conn.cursor(prepared=True, dictionary=True, buffered=False)
+        if SQL_INSTRUMENTATION:
+            cursor = InstrumentedCursor(cursor)
+        # Курсор коннектора сравнивает текст запроса по ссылке (is), поэтому храним
+        # и всегда передаём один и тот же объект строки
+        entry = self._cursors[sql] = (sql, cursor)
+        while len(self._cursors) > self.maxsize:
+            _, (_, evicted) = self._cursors.popitem(last=False)
+            self._close(evicted)
+        _count('prepared')
+        return entry
+
+    def _discard(self, sql):
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            self._close(entry[1])
+
+    @staticmethod
+    def _close(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        _count('closed')
+
+    def fetch(self, sql, params=()):
+        for attempt in range(2):
+            sql, cursor = self._cursor(sql)
+            try:
+                cursor.execute(sql, tuple(params))
+                rows = cursor.fetchall() if cursor.description else []
+                _count('executed')
+                return rows
+            except mysql.connector.DatabaseError as e:
+                self._discard(sql)
+                # Сервер забыл выражение (например, после сброса сессии) - готовим заново один раз
+                if e.errno != errorcode.ER_UNKNOWN_STMT_HANDLER or attempt:
+                    raise
+                _count('reprepared')
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'last_used', 'statements')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = PreparedStatements(conn)
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout, recycle, ping_interval, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.connect_args = connect_args
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+            'exhausted': 0,
+            'created': 0,
+            'reconnects': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self):
+        # buffered=True: курсоры моделей не всегда дочитывают результат (fetchone),
+        # а соединение из пула должно возвращаться без непрочитанных строк
+        conn = mysql.connector.connect(buffered=True, **self.connect_args)
+        with self._cond:
+            self._stats['created'] += 1
+        return _PooledConnection(conn)
+
+    def acquire(self, timeout=None):
+        # timeout=0 - не ждать: нет свободного соединения - сразу PoolExhaustedError
+        started = time.perf_counter()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        slot = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    slot = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['exhausted'] += 1
+                    raise PoolExhaustedError('Нет свободных соединений с базой данных')
+                self._cond.wait(remaining)
+
+        try:
+            if slot is None:
+                slot = self._connect()
+            else:
+                slot = self._validate(slot)
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['checkout_time_total'] += elapsed
+            if elapsed > self._stats['checkout_time_max']:
+                self._stats['checkout_time_max'] = elapsed
+        return slot
+
+    def _validate(self, slot):
+        now = time.monotonic()
+        if now - slot.created_at > self.recycle:
+            self._close_quietly(slot.conn)
+            with self._cond:
+                self._stats['recycled'] += 1
+            return self._connect()
+        if now - slot.last_used > self.ping_interval:
+            try:
+                slot.conn.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._close_quietly(slot.conn)
+                with self._cond:
+                    self._stats['reconnects'] += 1
+                return self._connect()
+        return slot
+
+    def release(self, slot):
+        try:
+            # Незакоммиченная транзакция не должна перейти к следующему запросу
+            if slot.conn.unread_result:
+                slot.conn.consume_results()
+            slot.conn.rollback()
+        except Exception:
+            self._close_quietly(slot.conn)
+            with self._cond:
+                self._opened -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+            return
+        slot.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['opened'] = self._opened
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._opened - len(self._idle)
+        checkouts = stats['checkouts']
+        stats['checkout_time_avg'] = stats['checkout_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_INTERVAL,
+                    host=MYSQL_HOST,
+                    user=MYSQL_USER,
+                    password=MYSQL_PASSWORD,
+                    database=MYSQL_DB,
+                    charset=MYSQL_CHARSET
+                )
+    return _pool
+
+
+def pool_stats():
+    stats = get_pool().stats()
+    with _statement_lock:
+        stats['statements'] = dict(_statement_stats)
+    return stats
+
+
+class Replica:
+    # Пул соединений к реплике и её последнее известное отставание
+    def __init__(self, settings):
+        connect_args = dict(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                            database=MYSQL_DB, charset=MYSQL_CHARSET)
+        connect_args.update(settings)
+        self.name = f"{connect_args['host']}:{connect_args.get('port', 3306)}"
+        self.pool = ConnectionPool(DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_INTERVAL,
+                                   **connect_args)
+        self.lag = None
+        self.healthy = False
+        self.checked_at = None
+        self.error = None
+        self.reads = 0
+        self._check_lock = threading.Lock()
+
+    def usable(self):
+        if self.checked_at is None or time.monotonic() - self.checked_at > REPLICA_CHECK_INTERVAL:
+            # Проверяет один поток, остальные пока пользуются прошлым результатом
+            if self._check_lock.acquire(blocking=False):
+                try:
+                    self.check()
+                finally:
+                    self._check_lock.release()
+        return self.healthy
+
+    def check(self):
+        slot = None
+        try:
+            slot = self.pool.acquire()
+            cursor = slot.conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.ProgrammingError:
+                cursor.execute("SHOW SLAVE STATUS")  # MySQL до 8.0.22
+            status = cursor.fetchone()
+            cursor.close()
+            if status is None:
+                # Сервер не реплицирует (стенд, где реплика - тот же сервер или его копия)
+                self.lag = 0
+            else:
+                self.lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            # NULL - репликация остановлена
+            self.healthy = self.lag is not None and self.lag <= REPLICA_MAX_LAG
+            self.error = None
+        except Exception as e:
+            self.healthy = False
+            self.error = str(e)
+        finally:
+            if slot is not None:
+                self.pool.release(slot)
+            self.checked_at = time.monotonic()
+
+    def stats(self):
+        return {'name': self.name, 'lag': self.lag, 'healthy': self.healthy, 'error': self.error,
+                'reads': self.reads, 'pool': self.pool.stats()}
+
+
+_replicas = None
+_replica_turn = 0
+_read_stats = {'replica': 0, 'primary_fallback': 0, 'primary_fresh': 0}
+_read_lock = threading.Lock()
+
+
+def _count_read(name, replica=None):
+    # Счётчики меняются из потоков всех запросов сразу, поэтому только под _read_lock
+    with _read_lock:
+        _read_stats[name] += 1
+        if replica is not None:
+            replica.reads += 1
+
+
+def get_replicas():
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = [Replica(settings) for settings in MYSQL_REPLICAS]
+    return _replicas
+
+
+def replica_stats():
+    with _read_lock:
+        reads = dict(_read_stats)
+    return {'replicas': [replica.stats() for replica in get_replicas()], 'reads': reads}
+
+
+def connect_for_export():
+    # Отдельное соединение вне пулов для долгого потокового чтения: выгрузка может идти
+    # минутами и не должна занимать слот пула, а оборванную на середине выгрузку проще
+    # всего прекратить, закрыв соединение. Берётся реплика, если она догнала первичный сервер
+    for replica in get_replicas():
+        if replica.usable():
+            try:
+                conn = mysql.connector.connect(**replica.pool.connect_args)
+            except mysql.connector.Error:
+                continue
+            _count_read('replica')
+            return conn
+    return mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                                   database=MYSQL_DB, charset=MYSQL_CHARSET)
 
 
 def get_db():
     if 'db' not in g:
-        g.db = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset=MYSQL_CHARSET
-        )
+        g.db_slot = get_pool().acquire()
+        g.db = InstrumentedConnection(g.db_slot.conn) if SQL_INSTRUMENTATION else g.db_slot.conn
     return g.db
 
 
+def _must_read_primary(fresh_keys):
+    if not has_request_context():
+        return False
+    # Изменяющий запрос и недавно писавший пользователь читают свои же записи
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return True
+    last_write = session.get('last_write')
+    if last_write and time.time() - last_write < READ_AFTER_WRITE_WINDOW:
+        return True
+    # Данные недавно менялись у кого угодно: реплика могла не догнать, а прочитанное
+    # ещё и попадёт в кэш каталога
+    if fresh_keys:
+        _, slots = versions.snapshot(fresh_keys)
+        if any(time.time() - modified < READ_AFTER_WRITE_WINDOW for _, modified in slots.values()):
+            return True
+    return False
+
+
+def _read_slot(fresh_keys=()):
+    # (слот, соединение) для чтения: реплика, если она есть, догнала первичный сервер
+    # и чтение не должно видеть только что сделанные записи; иначе - первичный сервер
+    global _replica_turn
+    if 'read_db' in g:
+        # Реплика уже взята этим запросом, но свежесть проверяется заново: данные,
+        # которые читаются сейчас, могли только что измениться
+        if not _must_read_primary(fresh_keys):
+            return g.read_slot, g.read_db
+        _count_read('primary_fresh')
+        get_db()
+        return g.db_slot, g.db
+    replicas = get_replicas()
+    if replicas and not _must_read_primary(fresh_keys):
+        with _read_lock:
+            turn = _replica_turn
+            _replica_turn += 1
+        for i in range(len(replicas)):
+            replica = replicas[(turn + i) % len(replicas)]
+            if not replica.usable():
+                continue
+            try:
+                slot = replica.pool.acquire()
+            except (PoolExhaustedError, mysql.connector.Error):
+                continue
+            _count_read('replica', replica)
+            g.read_replica, g.read_slot = replica, slot
+            g.read_db = InstrumentedConnection(slot.conn) if SQL_INSTRUMENTATION else slot.conn
+            return g.read_slot, g.read_db
+        _count_read('primary_fallback')
+    elif replicas:
+        _count_read('primary_fresh')
+    get_db()
+    return g.db_slot, g.db
+
+
+def get_read_db(*fresh_keys):
+    # Соединение только для чтения; fresh_keys - ключи versions читаемых данных
+    return _read_slot(fresh_keys)[1]
+
+
+def remember_writes():
+    # Вызывается из after_request: после изменяющего запроса этот пользователь
+    # ещё READ_AFTER_WRITE_WINDOW секунд читает с первичного сервера
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and 'db_slot' in g:
+        session['last_write'] = time.time()
+
+
 def close_db(e=None):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    g.pop('db', None)
+    slot = g.pop('db_slot', None)
+    if slot is not None:
+        get_pool().release(slot)
+    g.pop('read_db', None)
+    read_slot = g.pop('read_slot', None)
+    replica = g.pop('read_replica', None)
+    if replica is not None and read_slot is not None:
+        replica.pool.release(read_slot)
+
+
+def fetch_prepared(query, params=(), replica=False):
+    # Чтение через подготовленное выражение; строки - словари. Результат всегда дочитывается
+    # целиком, чтобы соединение не осталось с непрочитанными строками.
+    # replica: False - только первичный сервер; True - можно с реплики; кортеж ключей
+    # versions - можно с реплики, если эти данные не менялись последние READ_AFTER_WRITE_WINDOW секунд
+    slot = getattr(_parallel, 'slot', None)
+    if slot is not None:
+        # Внутри fetch_parallel: у потока своё соединение, выбранное заранее
+        db = InstrumentedConnection(slot.conn) if SQL_INSTRUMENTATION else slot.conn
+    elif replica:
+        slot, db = _read_slot(replica if isinstance(replica, tuple) else ())
+    else:
+        db = get_db()
+        slot = g.db_slot
+    if not PREPARED_STATEMENTS:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    return slot.statements.fetch(query, params)
+
+
+# Параллельные чтения одного запроса (fetch_parallel)
+_parallel = threading.local()
+_parallel_executor = ThreadPoolExecutor(max_workers=PARALLEL_READ_THREADS, thread_name_prefix='parallel-read')
+
+
+def _parallel_slot(replica):
+    # (пул, слот) для чтения в соседнем потоке по тем же правилам, что _read_slot, но без
+    # ожидания: занимать последнее соединение пула под второстепенное чтение нельзя
+    pools = []
+    if replica and not _must_read_primary(replica if isinstance(replica, tuple) else ()):
+        pools = [r.pool for r in get_replicas() if r.usable()]
+    pools.append(get_pool())
+    for pool in pools:
+        try:
+            return pool, pool.acquire(timeout=0)
+        except (PoolExhaustedError, mysql.connector.Error):
+            continue
+    return None
+
+
+def _run_parallel(app, log, capture, slot, read):
+    with app.app_context():
+        # Запросы потока попадают в метрики и check-plans того же HTTP-запроса
+        if log is not None:
+            g.sql_log = log
+        if capture is not None:
+            g.sql_capture = capture
+        _parallel.slot = slot
+        try:
+            return read()
+        finally:
+            _parallel.slot = None
+
+
+def fetch_parallel(*reads, replica=False):
+    # Чтения моделей (функции без аргументов, читающие через fetch_prepared) одновременно:
+    # первое - на соединении запроса, остальные - в соседних потоках, каждое на своём
+    # соединении из пула. Если свободных соединений не хватило, оставшиеся чтения идут
+    # по очереди на соединении запроса. Результаты - в порядке reads
+    results = [None] * len(reads)
+    # Сначала своё соединение, иначе соседние потоки могли бы забрать последние свободные
+    if replica:
+        _read_slot(replica if isinstance(replica, tuple) else ())
+    else:
+        get_db()
+    taken = []
+    for _ in reads[1:]:
+        pair = _parallel_slot(replica)
+        if pair is None:
+            break
+        taken.append(pair)
+    app = current_app._get_current_object()
+    log, capture = g.get('sql_log'), g.get('sql_capture')
+    futures = [_parallel_executor.submit(_run_parallel, app, log, capture, slot, read)
+               for (_, slot), read in zip(taken, reads[1:])]
+    try:
+        results[0] = reads[0]()
+        for i in range(len(taken) + 1, len(reads)):
+            results[i] = reads[i]()
+        for i, future in enumerate(futures, 1):
+            results[i] = future.result()
+    finally:
+        # Соединение возвращается в пул только после того, как поток с ним закончил
+        wait(futures)
+        for pool, slot in taken:
+            pool.release(slot)
+    return results
@@ -0,0 +1,125 @@
+# export.py
+# Потоковая выгрузка билетов, представлений и отзывов в CSV. Строки читаются из
+# небуферизованного курсора по EXPORT_FETCH_SIZE (MySQL отдаёт их по мере чтения, весь
+# результат в памяти не собирается) и сразу уходят клиенту - память воркера не зависит
+# от размера выгрузки. Соединение отдельное, вне пула: закрыть его - единственный
+# дешёвый способ прервать недочитанный результат, если клиент ушёл на середине.
+import csv
+import io
+import zlib
+
+from config import EXPORT_FETCH_SIZE, EXPORT_NET_WRITE_TIMEOUT
+from db import connect_for_export
+
+EXPORTS = {
+    # Те же связи, что в UserModel.get_user_tickets, но по всем пользователям
+    'tickets': {
+        'date_column': 't.purchase_date',
+        'header': ('ticket_id', 'user_id', 'username', 'play', 'performance_id', 'date_time', 'venue',
+                   'seat_index', 'price', 'purchase_date'),
+        'query': """SELECT t.ticket_id, t.User_user_id, u.username, pl.title, p.performance_id, p.date_time,
+                           p.venue, t.seat_index, t.price, t.purchase_date
+                    FROM Ticket t
+                    JOIN Performance p ON t.Performance_performance_id = p.performance_id
+                    JOIN Play pl ON p.Play_play_id = pl.play_id
+                    JOIN User u ON t.User_user_id = u.user_id""",
+        'order': 't.ticket_id',
+    },
+    'performances': {
+        'date_column': 'p.date_time',
+        'header': ('performance_id', 'play_id', 'play', 'date_time', 'venue', 'available_seats',
+                   'tickets_sold', 'seats_sold', 'revenue', 'min_price', 'max_price'),
+        'query': """SELECT p.performance_id, pl.play_id, pl.title, p.date_time, p.venue, p.available_seats,
+                           COALESCE(s.tickets_sold, 0), COALESCE(s.seats_sold, 0), COALESCE(s.revenue, 0),
+                           s.min_price, s.max_price
+                    FROM Performance p
+                    JOIN Play pl ON p.Play_play_id = pl.play_id
+                    LEFT JOIN PerformanceSales s ON s.Performance_performance_id = p.performance_id""",
+        'order': 'p.performance_id',
+    },
+    'reviews': {
+        'date_column': 'r.date_posted',
+        'header': ('review_id', 'user_id', 'username', 'rating', 'text', 'date_posted'),
+        'query': """SELECT r.review_id, r.User_user_id, u.username, r.rating, r.text, r.date_posted
+                    FROM Review r
+                    JOIN User u ON r.User_user_id = u.user_id""",
+        'order': 'r.review_id',
+    },
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def build_query(kind, date_from=None, date_to=None):
+    if kind not in EXPORTS:
+        raise ExportError(f'Неизвестный тип выгрузки: {kind}')
+    spec = EXPORTS[kind]
+    conditions, params = [], []
+    # Границы - даты включительно; для DATETIME-столбца верхняя граница - начало следующего дня
+    if date_from:
+        conditions.append(f"{spec['date_column']} >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{spec['date_column']} < %s + INTERVAL 1 DAY")
+        params.append(date_to)
+    query = spec['query']
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + f" ORDER BY {spec['order']}", tuple(params)
+
+
+def iter_rows(kind, date_from=None, date_to=None, fetch_size=EXPORT_FETCH_SIZE):
+    # Пачки строк из небуферизованного курсора; соединение закрывается и при обрыве
+    # (GeneratorExit от WSGI-сервера, когда клиент отключился)
+    query, params = build_query(kind, date_from, date_to)
+    conn = connect_for_export()
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def iter_csv(kind, date_from=None, date_to=None, compress=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - чтобы Excel открыл кириллицу в UTF-8 без мастера импорта
+    buffer.write('\ufeff')
+    writer.writerow(EXPORTS[kind]['header'])
+    # wbits=31: формат gzip (заголовок и CRC), а не «голый» zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def take():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    header = take()
+    if header:
+        yield header
+    for rows in iter_rows(kind, date_from, date_to):
+        writer.writerows(rows)
+        chunk = take()
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+def filename(kind, date_from=None, date_to=None, compress=False):
+    name = kind
+    if date_from or date_to:
+        name += f"_{date_from or ''}_{date_to or ''}"
+    return name + ('.csv.gz' if compress else '.csv')
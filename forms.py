@@ -1,5 +1,6 @@
 # forms.py
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, IntegerField, DecimalField
 from wtforms.fields.choices import SelectField
 from wtforms.fields.datetime import DateTimeField
@@ -40,6 +41,17 @@ class BuyTicketForm(FlaskForm):
     submit = SubmitField('Купить билет')
 
 
+class SeatSelectionForm(FlaskForm):
+    zone = SelectField('Зона', choices=[])
+    quantity = IntegerField('Количество мест рядом', validators=[DataRequired(), NumberRange(min=1, max=10)], default=2)
+    submit = SubmitField('Выбрать места')
+
+
+class SeatHoldForm(FlaskForm):
+    confirm = SubmitField('Оплатить')
+    release = SubmitField('Отменить бронь')
+
+
 class ReviewForm(FlaskForm):
     rating = IntegerField('Оценка', validators=[DataRequired(), NumberRange(min=1, max=10)])
     text = TextAreaField('Текст отзыва', validators=[DataRequired()])
@@ -59,3 +71,9 @@ class OccupancyRateForm(FlaskForm):
 class TotalTicketsSoldForm(FlaskForm):
     play_id = SelectField('Выберите пьесу:', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Получить количество проданных билетов')
+
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Что загружаем', choices=[('performances', 'Представления'), ('plays', 'Пьесы')])
+    file = FileField('Файл CSV или JSONL', validators=[FileRequired()])
+    submit = SubmitField('Загрузить')
@@ -0,0 +1,110 @@
+# fragments.py
+# Кэш отрисованных фрагментов шаблонов. Ключ - имя фрагмента, версии данных, от которых
+# он зависит (versions.py), роль посетителя и дополнительные значения (например, курсор
+# страницы). Изменение данных меняет версию, и старые фрагменты просто перестают
+# запрашиваться и вытесняются по LRU. Ограничение - по суммарному размеру строк.
+#
+# В шаблоне:   {% cache 'plays', 'play', request.args.get('after') %} ... {% endcache %}
+# Во view:     fragment_cache.render('plays', ('play',), (after,), lambda: render_template(...))
+import copy
+import sys
+import threading
+from collections import OrderedDict
+
+from flask import session
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from config import FRAGMENT_CACHE_BYTES, FRAGMENT_CACHE_MAX_ENTRY
+from versions import versions
+
+
+def current_role():
+    # То же условие, что в шаблонах для админских кнопок; у гостя и пользователя разметка тоже разная
+    if session.get('username') == 'admin':
+        return 'admin'
+    return 'user' if session.get('user_id') else 'guest'
+
+
+class FragmentCache:
+    def __init__(self, maxbytes=FRAGMENT_CACHE_BYTES, max_entry=FRAGMENT_CACHE_MAX_ENTRY):
+        self.maxbytes = maxbytes
+        self.max_entry = max_entry
+        self._data = OrderedDict()  # key -> (размер, Markup), порядок = LRU
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'oversized': 0}
+
+    def key(self, name, keys, vary):
+        if isinstance(keys, str):
+            keys = (keys,)
+        epoch, slots = versions.snapshot(keys)
+        return (name, epoch, tuple(slots[key][0] for key in keys), current_role(), tuple(vary))
+
+    def render(self, name, keys, vary, render):
+        key = self.key(name, keys, vary)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+                self._stats['hits'] += 1
+                return item[1]
+            self._stats['misses'] += 1
+        value = Markup(render())
+        self._set(key, value)
+        return value
+
+    def _set(self, key, value):
+        size = sys.getsizeof(value)
+        with self._lock:
+            if size > self.max_entry:
+                self._stats['oversized'] += 1
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._data[key] = (size, value)
+            self._bytes += size
+            while self._bytes > self.maxbytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+            stats['bytes'] = self._bytes
+            stats['maxbytes'] = self.maxbytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache имя, версии[, доп. значения...] %} ... {% endcache %}
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        cached = nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+        # При потоковой отдаче (streaming=True в контексте) тело выводится как есть: CallBlock
+        # собрал бы весь список в одну строку и лишил stream_template смысла
+        streaming = nodes.Name('streaming', 'load').set_lineno(lineno)
+        return nodes.If(streaming, copy.deepcopy(body), [], [cached]).set_lineno(lineno)
+
+    def _render(self, name, keys=(), *vary, caller):
+        return fragment_cache.render(name, keys, vary, caller)
@@ -0,0 +1,198 @@
+# importer.py
+# Массовая загрузка пьес и представлений из CSV или JSONL. Файл читается построчно,
+# каждая строка проверяется теми же правилами, что PlayForm/PerformanceForm, а прошедшие
+# проверку строки вставляются пачками через executemany с commit() после каждой пачки.
+# Представления проверяются на пересечение залов пачками под той же блокировкой
+# расписания, что и create_performance, и по общему расписанию процесса, а не по копии.
+import csv
+import json
+
+from werkzeug.datastructures import MultiDict
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from db import get_db
+from forms import PlayForm, PerformanceForm
+import models
+from models import PlayModel, PerformanceModel
+from schedule import ScheduleConflictError, ScheduleIndex
+
+KINDS = {
+    'plays': {
+        'form': PlayForm,
+        'columns': ('title', 'description', 'genre', 'duration'),
+        'query': "INSERT INTO Play (title, description, genre, duration) VALUES (%s, %s, %s, %s)",
+    },
+    'performances': {
+        'form': PerformanceForm,
+        'columns': ('play_id', 'date_time', 'venue', 'available_seats'),
+        'query': """INSERT INTO Performance (Play_play_id, date_time, venue, available_seats)
+                    VALUES (%s, %s, %s, %s)""",
+    },
+}
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def read_rows(stream, fmt):
+    # (номер строки в файле, dict) по одной строке, без чтения файла целиком
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, e
+                continue
+            yield line_num, row if isinstance(row, dict) else ValueError('ожидается JSON-объект')
+    else:
+        raise ImportFileError(f'Неизвестный формат: {fmt}')
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+class Importer:
+    def __init__(self, kind, chunk_size=IMPORT_CHUNK_SIZE, max_errors=IMPORT_MAX_ERRORS):
+        if kind not in KINDS:
+            raise ImportFileError(f'Неизвестный тип данных: {kind}')
+        self.kind = kind
+        self.spec = KINDS[kind]
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        # Одна форма на весь импорт: process() дешевле, чем создавать форму на каждую строку
+        self.form = self.spec['form'](formdata=None, meta={'csrf': False})
+        self.plays = None          # play_id -> (название, продолжительность), для представлений
+        self.placeholder = 0
+        self.touched_plays = set()
+        self.report = {'kind': kind, 'rows': 0, 'inserted': 0, 'failed': 0, 'errors': []}
+
+    def error(self, line_num, message):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append((line_num, message))
+
+    def validate(self, row):
+        # Значения в CSV - строки, в JSONL - любые JSON-типы; форма принимает строки
+        formdata = MultiDict({key: '' if value is None else str(value)
+                              for key, value in row.items() if key in self.spec['columns']})
+        self.form.process(formdata)
+        if not self.form.validate():
+            return None, '; '.join(f'{field}: {", ".join(messages)}'
+                                   for field, messages in self.form.errors.items())
+        values = tuple(self.form.data[column] for column in self.spec['columns'])
+        if self.kind == 'performances' and values[0] not in self.plays:
+            return None, f'play_id: пьесы {values[0]} нет'
+        return values, None
+
+    def check_schedule(self, schedule, pending, values):
+        play_id, date_time, venue, _ = values
+        title, duration = self.plays[play_id]
+        try:
+            schedule.check(venue, date_time, duration)
+            pending.check(venue, date_time, duration)
+        except ScheduleConflictError as e:
+            return str(e)
+        # Строки пачки не должны пересекаться и между собой: принятая строка занимает зал
+        # в pending под временным отрицательным id; после commit() расписание перечитывается
+        self.placeholder -= 1
+        pending.add({'performance_id': self.placeholder, 'play_id': play_id, 'title': title,
+                     'date_time': date_time, 'venue': venue, 'duration': duration})
+        return None
+
+    def run(self, rows):
+        db = get_db()
+        cursor = db.cursor()
+        if self.kind == 'performances':
+            # Проверка внешнего ключа заранее: одна ошибочная строка не должна срывать всю пачку
+            cursor.execute("SELECT play_id, title, duration FROM Play")
+            self.plays = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+        chunk = []
+        try:
+            for line_num, row in rows:
+                self.report['rows'] += 1
+                if isinstance(row, Exception):
+                    self.error(line_num, str(row))
+                    continue
+                values, message = self.validate(row)
+                if message:
+                    self.error(line_num, message)
+                    continue
+                chunk.append((line_num, values))
+                if len(chunk) >= self.chunk_size:
+                    self.flush(db, cursor, chunk)
+                    chunk = []
+            if chunk:
+                self.flush(db, cursor, chunk)
+        finally:
+            cursor.close()
+            self.invalidate()
+        return self.report
+
+    def flush(self, db, cursor, chunk):
+        if self.kind != 'performances':
+            self.write(db, cursor, chunk)
+            return
+        # Проверка и запись пачки - под блокировкой расписания (GET_LOCK), как у
+        # create_performance: иначе представление, созданное другим процессом во время
+        # импорта, могло бы занять тот же зал. PerformanceModel.schedule() под блокировкой
+        # сверяет versions 'schedule' и видит записи других процессов и прошлых пачек
+        with models._schedule_write_lock(db):
+            schedule = PerformanceModel.schedule()
+            pending = ScheduleIndex()
+            accepted = []
+            for line_num, values in chunk:
+                message = self.check_schedule(schedule, pending, values)
+                if message:
+                    self.error(line_num, message)
+                else:
+                    accepted.append((line_num, values))
+            if accepted:
+                self.write(db, cursor, accepted)
+                # До снятия блокировки: следующий писатель должен увидеть эти представления
+                PerformanceModel.invalidate_schedule()
+
+    def write(self, db, cursor, chunk):
+        try:
+            cursor.executemany(self.spec['query'], [values for _, values in chunk])
+            db.commit()
+            self.inserted(chunk)
+            return
+        except Exception:
+            db.rollback()
+        # Пачка не прошла целиком - вставляем поштучно, чтобы найти виноватые строки
+        for line_num, values in chunk:
+            try:
+                cursor.execute(self.spec['query'], values)
+                db.commit()
+                self.inserted([(line_num, values)])
+            except Exception as e:
+                db.rollback()
+                self.error(line_num, str(e))
+
+    def inserted(self, chunk):
+        self.report['inserted'] += len(chunk)
+        if self.kind == 'performances':
+            self.touched_plays.update(values[0] for _, values in chunk)
+
+    def invalidate(self):
+        if not self.report['inserted']:
+            return
+        if self.kind == 'plays':
+            PlayModel.invalidate_cache()
+            # Новые пьесы попадут в поиск при ближайшей перестройке индекса
+            models.search_index.built_at = None
+        else:
+            PerformanceModel.invalidate_cache(*self.touched_plays)
+
+
+def import_file(stream, kind, fmt):
+    return Importer(kind).run(read_rows(stream, fmt))
@@ -0,0 +1,173 @@
+# metrics.py
+# Замеры SQL-запросов: соединение из get_db оборачивается, каждый execute/callproc
+# записывается в журнал текущего HTTP-запроса (нормализованный текст, время, строки).
+# По журналу строится заголовок Server-Timing, ищутся N+1 и копятся перцентили
+# по маршрутам и формам запросов для /admin/metrics.
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from flask import g, has_app_context
+
+from config import N_PLUS_ONE_THRESHOLD, METRICS_SAMPLES
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    shape = _IN_LIST_RE.sub('IN (...)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+def _record(shape, started, rowcount):
+    if has_app_context():
+        log = g.get('sql_log')
+        if log is not None:
+            log.append((shape, time.perf_counter() - started, rowcount))
+
+
+def _capture(operation, params):
+    # Полный текст и параметры запросов - только когда их собирают (flask check-plans)
+    if has_app_context():
+        captured = g.get('sql_capture')
+        if captured is not None:
+            captured.append((operation, params))
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        _capture(operation, params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            _record(normalize_sql(operation), started, self._cursor.rowcount)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _record(normalize_sql(operation), started, self._cursor.rowcount)
+
+    def callproc(self, procname, args=()):
+        started = time.perf_counter()
+        try:
+            return self._cursor.callproc(procname, args)
+        finally:
+            _record(f'CALL {procname}(...)', started, self._cursor.rowcount)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class LatencyRecorder:
+    # Последние METRICS_SAMPLES замеров по каждому ключу + общие счётчики
+    def __init__(self, samples=METRICS_SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _entry(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            entry = self._data[key] = {'samples': deque(maxlen=self.samples), 'count': 0, 'total': 0.0}
+        return entry
+
+    def add(self, key, seconds, **counters):
+        with self._lock:
+            entry = self._entry(key)
+            entry['samples'].append(seconds)
+            entry['count'] += 1
+            entry['total'] += seconds
+            for name, value in counters.items():
+                entry[name] = entry.get(name, 0) + value
+
+    def bump(self, key, **counters):
+        with self._lock:
+            entry = self._entry(key)
+            for name, value in counters.items():
+                entry[name] = entry.get(name, 0) + value
+
+    def report(self):
+        with self._lock:
+            snapshot = [(key, dict(entry, samples=sorted(entry['samples']))) for key, entry in self._data.items()]
+        rows = []
+        for key, entry in snapshot:
+            samples = entry.pop('samples')
+            if not samples:
+                continue
+            row = dict(entry, key=key, avg=entry['total'] / entry['count'])
+            for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+                row[name] = samples[min(len(samples) - 1, int(len(samples) * fraction))]
+            rows.append(row)
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+
+route_latency = LatencyRecorder()
+query_latency = LatencyRecorder()
+
+
+def start_request():
+    g.sql_log = []
+    g.request_started = time.perf_counter()
+
+
+def finish_request(route, response, logger=None):
+    log = g.pop('sql_log', None)
+    started = g.pop('request_started', None)
+    if log is None or started is None:
+        return response
+    elapsed = time.perf_counter() - started
+
+    shapes = {}
+    db_time = 0.0
+    for shape, seconds, rowcount in log:
+        db_time += seconds
+        shapes[shape] = shapes.get(shape, 0) + 1
+        query_latency.add(shape, seconds, rows=max(rowcount or 0, 0))
+
+    repeated = {shape: count for shape, count in shapes.items() if count >= N_PLUS_ONE_THRESHOLD}
+    for shape, count in repeated.items():
+        query_latency.bump(shape, n_plus_one=1)
+        if logger is not None:
+            logger.warning('Вероятный N+1 на %s: %d раз %s', route, count, shape)
+
+    route_latency.add(route, elapsed, queries=len(log), db_time=db_time, n_plus_one=len(repeated))
+    response.headers['Server-Timing'] = (f'db;dur={db_time * 1000:.2f};desc="{len(log)} queries", '
+                                         f'app;dur={(elapsed - db_time) * 1000:.2f}, '
+                                         f'total;dur={elapsed * 1000:.2f}')
+    return response
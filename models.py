@@ -1,5 +1,62 @@
 # models.py
-from db import get_db
+import threading
+import time
+from contextlib import contextmanager
+
+from batching import BatchWriter
+from cache import TTLCache
+from config import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL, SEARCH_INDEX_REFRESH, SEARCH_RESULTS_LIMIT
+from config import MYSQL_DB, WRITE_BEHIND_ENABLED, SCHEDULE_REFRESH, SCHEDULE_LOCK_TIMEOUT
+from config import PROFILE_REVIEWS_LIMIT, PROFILE_SUMMARY_CACHE_SIZE, PROFILE_SUMMARY_TTL
+from db import get_db, get_read_db, fetch_prepared, fetch_parallel
+from pagination import PLAY_KEYSET, PERFORMANCE_KEYSET, REVIEW_KEYSET, TICKET_KEYSET
+from reservations import ReservationModel
+from schedule import ScheduleConflictError, ScheduleIndex
+from search_index import SearchIndex
+from snapshot import catalog_snapshot
+from versions import versions
+
+# Кэш чтений каталога. Ключи:
+#   ('plays', after, limit)   - список пьес (или его страница)
+#   ('play', play_id)         - одна пьеса
+#   ('performances', play_id) - представления пьесы
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+# Сводка по пользователю для профиля: ('summary', user_id) -> (когда прочитана, сводка)
+profile_cache = TTLCache(maxsize=PROFILE_SUMMARY_CACHE_SIZE, ttl=PROFILE_SUMMARY_TTL)
+
+# Поисковый индекс по пьесам; строится при первом поиске, а не при импорте модуля (CLI и
+# тесты не ходят в БД), перестраивается целиком и подменяется, чтобы поиск не ждал
+search_index = SearchIndex()
+_search_rebuild_lock = threading.Lock()
+
+# Расписание залов для проверки пересечений и афиши; перестраивается так же
+schedule_index = ScheduleIndex()
+# Проверка пересечения и запись представления - под одной блокировкой, иначе два
+# параллельных запроса могли бы занять один зал в одно время. Блокировка - именованная
+# блокировка MySQL (GET_LOCK): она общая для всех процессов приложения, а не только для
+# потоков одного. Имя включает базу: блокировки GET_LOCK общие для всего сервера MySQL
+SCHEDULE_LOCK = f'{MYSQL_DB}.schedule'
+
+
+@contextmanager
+def _schedule_write_lock(db):
+    # Под блокировкой PerformanceModel.schedule() сверяет versions 'schedule' и
+    # перестраивает расписание, если его изменил другой процесс, - проверка видит и его записи
+    cursor = db.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (SCHEDULE_LOCK, SCHEDULE_LOCK_TIMEOUT))
+    acquired, = cursor.fetchone()
+    cursor.close()
+    if acquired != 1:
+        raise ScheduleConflictError('Расписание сейчас меняется другим запросом, попробуйте ещё раз')
+    try:
+        yield
+    finally:
+        # Соединение возвращается в пул: блокировку нужно снять явно, rollback её не снимает
+        cursor = db.cursor()
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEDULE_LOCK,))
+        cursor.fetchone()
+        cursor.close()
 
 
 class UserModel:
@@ -12,25 +69,27 @@ class UserModel:
         db.commit()
 
     @staticmethod
-    def get_user_by_username(username):
+    def update_password_hash(user_id, password_hash):
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor()
+        query = "UPDATE User SET password_hash=%s WHERE user_id=%s"
+        cursor.execute(query, (password_hash, user_id))
+        db.commit()
+
+    @staticmethod
+    def get_user_by_username(username):
         query = "SELECT * FROM User WHERE username=%s"
-        cursor.execute(query, (username,))
-        return cursor.fetchone()
+        rows = fetch_prepared(query, (username,))
+        return rows[0] if rows else None
 
     @staticmethod
     def get_user_by_id(user_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
         query = "SELECT * FROM User WHERE user_id=%s"
-        cursor.execute(query, (user_id,))
-        return cursor.fetchone()
+        rows = fetch_prepared(query, (user_id,), replica=True)
+        return rows[0] if rows else None
 
     @staticmethod
-    def get_user_tickets(user_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+    def get_user_tickets(user_id, after=None, limit=None):
         # Так как в Ticket у нас Performance_performance_id и User_user_id
         # Связь к Play через Performance: p.Play_play_id -> Play.play_id
         query = """SELECT t.ticket_id, pl.title AS play_title, p.date_time, p.venue, t.price, t.purchase_date
@@ -38,37 +97,129 @@ class UserModel:
                    JOIN Performance p ON t.Performance_performance_id = p.performance_id
                    JOIN Play pl ON p.Play_play_id = pl.play_id
                    WHERE t.User_user_id = %s"""
-        cursor.execute(query, (user_id,))
-        return cursor.fetchall()
+        params = [user_id]
+        # after = (purchase_date, ticket_id) последней строки предыдущей страницы
+        if after:
+            query += " AND (t.purchase_date < %s OR (t.purchase_date = %s AND t.ticket_id < %s))"
+            params += [after[0], after[0], after[1]]
+        query += " ORDER BY t.purchase_date DESC, t.ticket_id DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return fetch_prepared(query, tuple(params), replica=True)
 
     @staticmethod
-    def get_user_reviews(user_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+    def iter_user_tickets(user_id):
+        return TICKET_KEYSET.iterate(lambda after, limit: UserModel.get_user_tickets(user_id, after, limit))
+
+    @staticmethod
+    def get_user_reviews(user_id, limit=None):
         query = """SELECT r.review_id, r.rating, r.text, r.date_posted
                    FROM Review r
                    WHERE r.User_user_id = %s
                    ORDER BY r.date_posted DESC"""
-        cursor.execute(query, (user_id,))
-        return cursor.fetchall()
+        params = [user_id]
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return fetch_prepared(query, tuple(params), replica=True)
+
+    @staticmethod
+    def get_user_summary(user_id, written_at=None):
+        # Потрачено всего, билетов, представлений и отзывов. Кэшируется: у постоянных
+        # покупателей это агрегат по тысячам билетов. written_at - время последней записи
+        # этого пользователя (session['last_write']): сводка, прочитанная раньше, устарела,
+        # даже если запись прошла в другом процессе и сюда инвалидация не дошла
+        summary = UserModel._cached_summary(user_id, written_at)
+        if summary is None:
+            loaded_at = time.time()
+            summary = UserModel._load_user_summary(user_id)
+            profile_cache.set(('summary', user_id), (loaded_at, summary))
+        return summary
+
+    @staticmethod
+    def _cached_summary(user_id, written_at=None):
+        cached = profile_cache.get(('summary', user_id))
+        if cached is not None and (written_at is None or written_at < cached[0]):
+            return cached[1]
+        return None
+
+    @staticmethod
+    def _load_user_summary(user_id):
+        query = """SELECT COUNT(*) AS tickets, COALESCE(SUM(t.price), 0) AS spent,
+                          COUNT(DISTINCT t.Performance_performance_id) AS performances,
+                          (SELECT COUNT(*) FROM Review r WHERE r.User_user_id = %s) AS reviews
+                   FROM Ticket t
+                   WHERE t.User_user_id = %s"""
+        return fetch_prepared(query, (user_id, user_id), replica=True)[0]
+
+    @staticmethod
+    def invalidate_summary(user_id):
+        profile_cache.delete(('summary', user_id))
+
+    @staticmethod
+    def get_profile(user_id, after=None, limit=None, written_at=None):
+        # Всё для /profile за время самого долгого из чтений, а не их суммы: пользователь,
+        # страница билетов и последние отзывы читаются одновременно на разных соединениях,
+        # сводка обычно берётся из кэша и соединения не занимает
+        reads = [lambda: UserModel.get_user_by_id(user_id),
+                 lambda: UserModel.get_user_tickets(user_id, after, limit),
+                 lambda: UserModel.get_user_reviews(user_id, PROFILE_REVIEWS_LIMIT)]
+        summary = UserModel._cached_summary(user_id, written_at)
+        if summary is None:
+            reads.append(lambda: UserModel.get_user_summary(user_id, written_at))
+        user, tickets, reviews, *loaded = fetch_parallel(*reads, replica=True)
+        return {'user': user, 'tickets': tickets, 'reviews': reviews, 'summary': loaded[0] if loaded else summary}
 
 
 class PlayModel:
     @staticmethod
-    def get_all_plays():
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+    def get_all_plays(after=None, limit=None):
+        # Пока общий снимок каталога актуален, читаем из него; иначе - кэш и БД
+        view = catalog_snapshot.view()
+        if view is not None:
+            return view.plays(after, limit)
+        return catalog_cache.get_or_load(('plays', after, limit), lambda: PlayModel._load_all_plays(after, limit))
+
+    @staticmethod
+    def _load_all_plays(after=None, limit=None):
         query = "SELECT * FROM Play"
-        cursor.execute(query)
-        return cursor.fetchall()
+        params = []
+        if after:
+            query += " WHERE play_id > %s"
+            params.append(after[0])
+        query += " ORDER BY play_id"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return fetch_prepared(query, tuple(params), replica=('play',))
+
+    @staticmethod
+    def iter_all_plays():
+        return PLAY_KEYSET.iterate(PlayModel._load_all_plays)
 
     @staticmethod
     def get_play_by_id(play_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+        view = catalog_snapshot.view()
+        if view is not None:
+            return view.play(play_id)
+        return catalog_cache.get_or_load(('play', play_id), lambda: PlayModel._load_play(play_id))
+
+    @staticmethod
+    def _load_play(play_id):
         query = "SELECT * FROM Play WHERE play_id=%s"
-        cursor.execute(query, (play_id,))
-        return cursor.fetchone()
+        rows = fetch_prepared(query, (play_id,), replica=('play',))
+        return rows[0] if rows else None
+
+    @staticmethod
+    def invalidate_cache(play_id=None):
+        catalog_cache.delete_prefix(('plays',))
+        if play_id is not None:
+            catalog_cache.delete(('play', play_id), ('performances', play_id))
+        # Название пьесы выводится и на страницах представлений; продолжительность задаёт
+        # конец представлений в расписании залов
+        schedule_index.built_at = None
+        versions.bump('play', 'performance', 'schedule')
 
     @staticmethod
     def create_play(title, description, genre, duration):
@@ -77,6 +228,22 @@ class PlayModel:
         # Хранимая процедура AddPlay предполагается без изменений.
         cursor.callproc('AddPlay', [title, description, genre, duration])
         db.commit()
+        PlayModel.invalidate_cache()
+        play = PlayModel._load_last_inserted()
+        if play and len(search_index):
+            search_index.add(play)
+        else:
+            # AddPlay не сообщил id новой строки или индекс ещё не строился - он
+            # перестроится при следующем поиске
+            search_index.built_at = None
+
+    @staticmethod
+    def _load_last_inserted():
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        query = "SELECT * FROM Play WHERE play_id=LAST_INSERT_ID()"
+        cursor.execute(query)
+        return cursor.fetchone()
 
     @staticmethod
     def update_play(play_id, title, description, genre, duration):
@@ -85,6 +252,10 @@ class PlayModel:
         query = """UPDATE Play SET title=%s, description=%s, genre=%s, duration=%s WHERE play_id=%s"""
         cursor.execute(query, (title, description, genre, duration, play_id))
         db.commit()
+        PlayModel.invalidate_cache(play_id)
+        if len(search_index):
+            search_index.add({'play_id': play_id, 'title': title, 'description': description,
+                              'genre': genre, 'duration': duration})
 
     @staticmethod
     def delete_play(play_id):
@@ -93,128 +264,376 @@ class PlayModel:
         query = "DELETE FROM Play WHERE play_id=%s"
         cursor.execute(query, (play_id,))
         db.commit()
+        PlayModel.invalidate_cache(play_id)
+        search_index.remove(play_id)
 
     @staticmethod
     def search_plays(keyword, genre):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+        # Результаты упорядочены по релевантности; учитываются префиксы и опечатки
+        PlayModel.build_search_index()
+        return search_index.search(keyword, genre, limit=SEARCH_RESULTS_LIMIT)
 
-        # Базовый запрос
-        query = "SELECT * FROM Play WHERE 1=1"
-        params = []
+    @staticmethod
+    def build_search_index(force=False):
+        # Устаревший индекс перестраивает один поток, остальные тем временем ищут по старому.
+        # Ждут перестройки только force и поиск по пустому (ещё не построенному) индексу
+        global search_index
 
-        # Если есть ключевое слово, добавляем фильтр по названию
-        if keyword:
-            query += " AND title LIKE %s"
-            params.append('%' + keyword + '%')
+        def fresh():
+            built_at = search_index.built_at
+            return built_at is not None and time.monotonic() - built_at < SEARCH_INDEX_REFRESH
 
-        # Если есть жанр, добавляем фильтр по жанру
-        if genre:
-            query += " AND genre LIKE %s"
-            params.append('%' + genre + '%')
+        if not force and fresh():
+            return search_index
+        if not _search_rebuild_lock.acquire(blocking=force or not len(search_index)):
+            return search_index
+        try:
+            # Пока ждали блокировку, индекс мог перестроить другой поток
+            if not force and fresh():
+                return search_index
+            index = SearchIndex()
+            index.rebuild(PlayModel.iter_all_plays())
+            search_index = index
+            return index
+        finally:
+            _search_rebuild_lock.release()
 
-        cursor.execute(query, tuple(params))
-        return cursor.fetchall()
 
 class PerformanceModel:
     @staticmethod
     def get_performances_by_play(play_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+        view = catalog_snapshot.view()
+        if view is not None:
+            return view.performances_by_play(play_id)
+        return catalog_cache.get_or_load(('performances', play_id),
+                                         lambda: PerformanceModel._load_performances_by_play(play_id))
+
+    @staticmethod
+    def _load_performances_by_play(play_id):
         # Здесь нужно использовать p.Play_play_id вместо p.play_id
         query = """SELECT p.performance_id, p.Play_play_id AS play_id, p.date_time, p.venue, p.available_seats
                    FROM Performance p
                    WHERE p.Play_play_id=%s
                    ORDER BY p.date_time"""
-        cursor.execute(query, (play_id,))
-        return cursor.fetchall()
+        return fetch_prepared(query, (play_id,), replica=('performance',))
 
     @staticmethod
     def get_performance_by_id(performance_id):
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+        view = catalog_snapshot.view()
+        if view is not None:
+            return view.performance(performance_id)
+        return PerformanceModel._load_performance(performance_id)
+
+    @staticmethod
+    def _load_performance(performance_id):
         # Соединение с Play: p.Play_play_id = pl.play_id
         query = """SELECT p.performance_id, p.Play_play_id AS play_id, p.date_time, p.venue, p.available_seats, pl.title
                    FROM Performance p
                    JOIN Play pl ON p.Play_play_id = pl.play_id
                    WHERE p.performance_id=%s"""
-        cursor.execute(query, (performance_id,))
-        return cursor.fetchone()
+        rows = fetch_prepared(query, (performance_id,), replica=('performance',))
+        return rows[0] if rows else None
 
     @staticmethod
     def create_performance(play_id, date_time, venue, available_seats):
+        # Зал на это время уже занят - ScheduleConflictError, в БД ничего не пишется
+        play = PlayModel.get_play_by_id(play_id)
         db = get_db()
-        cursor = db.cursor()
-        # Используем Play_play_id
-        query = """INSERT INTO Performance (Play_play_id, date_time, venue, available_seats)
-                   VALUES (%s, %s, %s, %s)"""
-        cursor.execute(query, (play_id, date_time, venue, available_seats))
-        db.commit()
+        with _schedule_write_lock(db):
+            schedule = PerformanceModel.schedule()
+            schedule.check(venue, date_time, play['duration'] if play else None)
+            cursor = db.cursor()
+            # Используем Play_play_id
+            query = """INSERT INTO Performance (Play_play_id, date_time, venue, available_seats)
+                       VALUES (%s, %s, %s, %s)"""
+            cursor.execute(query, (play_id, date_time, venue, available_seats))
+            db.commit()
+            PerformanceModel._schedule_add(schedule, cursor.lastrowid, play_id, play, date_time, venue)
+        PerformanceModel.invalidate_cache(play_id)
 
     @staticmethod
     def update_performance(performance_id, play_id, date_time, venue, available_seats):
+        # Представление могло переехать к другой пьесе - сбрасываем оба списка, а его
+        # продажи переносим в PlaySales новой пьесы в той же транзакции
+        play = PlayModel.get_play_by_id(play_id)
         db = get_db()
-        cursor = db.cursor()
-        query = """UPDATE Performance
-                   SET Play_play_id=%s, date_time=%s, venue=%s, available_seats=%s
-                   WHERE performance_id=%s"""
-        cursor.execute(query, (play_id, date_time, venue, available_seats, performance_id))
-        db.commit()
+        with _schedule_write_lock(db):
+            schedule = PerformanceModel.schedule()
+            schedule.check(venue, date_time, play['duration'] if play else None, exclude=performance_id)
+            cursor = db.cursor(dictionary=True)
+            sales = PerformanceModel._lock_sales(cursor, performance_id)
+            old_play_id = sales['Play_play_id'] if sales else None
+            query = """UPDATE Performance
+                       SET Play_play_id=%s, date_time=%s, venue=%s, available_seats=%s
+                       WHERE performance_id=%s"""
+            cursor.execute(query, (play_id, date_time, venue, available_seats, performance_id))
+            if old_play_id is not None and old_play_id != play_id and sales['tickets_sold'] is not None:
+                PerformanceModel._subtract_play_sales(cursor, old_play_id, sales)
+                PerformanceModel._add_play_sales(cursor, play_id, sales)
+            db.commit()
+            PerformanceModel._schedule_add(schedule, performance_id, play_id, play, date_time, venue)
+        PerformanceModel.invalidate_cache(old_play_id, play_id)
 
     @staticmethod
     def delete_performance(performance_id):
+        # PerformanceSales удаляется каскадом, PlaySales пьесы уменьшается в той же транзакции
         db = get_db()
-        cursor = db.cursor()
-        query = "DELETE FROM Performance WHERE performance_id=%s"
+        with _schedule_write_lock(db):
+            schedule = PerformanceModel.schedule()
+            cursor = db.cursor(dictionary=True)
+            sales = PerformanceModel._lock_sales(cursor, performance_id)
+            play_id = sales['Play_play_id'] if sales else None
+            query = "DELETE FROM Performance WHERE performance_id=%s"
+            cursor.execute(query, (performance_id,))
+            if play_id is not None and sales['tickets_sold'] is not None:
+                PerformanceModel._subtract_play_sales(cursor, play_id, sales)
+            db.commit()
+            schedule.remove(performance_id)
+            versions.bump('schedule')
+        PerformanceModel.invalidate_cache(play_id)
+
+    @staticmethod
+    def _lock_sales(cursor, performance_id):
+        # Пьеса представления и его агрегат продаж под блокировкой до конца транзакции.
+        # Порядок блокировок - Performance, PerformanceSales, PlaySales, как в ReserveSeats
+        query = """SELECT p.Play_play_id, s.tickets_sold, s.seats_sold, s.revenue, s.min_price, s.max_price
+                   FROM Performance p
+                   LEFT JOIN PerformanceSales s ON s.Performance_performance_id = p.performance_id
+                   WHERE p.performance_id=%s
+                   FOR UPDATE"""
         cursor.execute(query, (performance_id,))
-        db.commit()
+        return cursor.fetchone()
+
+    @staticmethod
+    def _subtract_play_sales(cursor, play_id, sales):
+        # Вызывается после UPDATE/DELETE представления: минимум и максимум цены пересчитываются
+        # по оставшимся представлениям пьесы, вычесть их из агрегата нельзя
+        query = """UPDATE PlaySales
+                   SET tickets_sold = tickets_sold - %s,
+                       seats_sold = seats_sold - %s,
+                       revenue = revenue - %s,
+                       min_price = (SELECT MIN(s.min_price) FROM PerformanceSales s
+                                    JOIN Performance p ON s.Performance_performance_id = p.performance_id
+                                    WHERE p.Play_play_id = %s),
+                       max_price = (SELECT MAX(s.max_price) FROM PerformanceSales s
+                                    JOIN Performance p ON s.Performance_performance_id = p.performance_id
+                                    WHERE p.Play_play_id = %s)
+                   WHERE Play_play_id=%s"""
+        cursor.execute(query, (sales['tickets_sold'], sales['seats_sold'], sales['revenue'],
+                               play_id, play_id, play_id))
+
+    @staticmethod
+    def _add_play_sales(cursor, play_id, sales):
+        # Как RecordSale, но сразу всеми продажами представления
+        query = """INSERT INTO PlaySales (Play_play_id, tickets_sold, seats_sold, revenue, min_price, max_price)
+                   VALUES (%s, %s, %s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE
+                       tickets_sold = tickets_sold + VALUES(tickets_sold),
+                       seats_sold = seats_sold + VALUES(seats_sold),
+                       revenue = revenue + VALUES(revenue),
+                       min_price = LEAST(COALESCE(min_price, VALUES(min_price)), VALUES(min_price)),
+                       max_price = GREATEST(COALESCE(max_price, VALUES(max_price)), VALUES(max_price))"""
+        cursor.execute(query, (play_id, sales['tickets_sold'], sales['seats_sold'], sales['revenue'],
+                               sales['min_price'], sales['max_price']))
+
+    @staticmethod
+    def _schedule_add(schedule, performance_id, play_id, play, date_time, venue):
+        schedule.add({'performance_id': performance_id, 'play_id': play_id, 'title': play['title'] if play else '',
+                      'date_time': date_time, 'venue': venue, 'duration': play['duration'] if play else None})
+        versions.bump('schedule')
+
+    @staticmethod
+    def schedule():
+        # Расписание залов; изменения из других процессов (versions 'schedule') сбрасывают его
+        global schedule_index
+        versions.snapshot(('schedule',))
+        built_at = schedule_index.built_at
+        if built_at is not None and time.monotonic() - built_at < SCHEDULE_REFRESH:
+            return schedule_index
+        index = ScheduleIndex()
+        index.rebuild(PerformanceModel._load_schedule())
+        schedule_index = index
+        return index
+
+    @staticmethod
+    def _load_schedule():
+        # С первичного сервера: по этим данным проверяются пересечения при записи
+        query = """SELECT p.performance_id, p.Play_play_id AS play_id, pl.title, p.date_time, p.venue, pl.duration
+                   FROM Performance p
+                   JOIN Play pl ON p.Play_play_id = pl.play_id"""
+        return fetch_prepared(query)
+
+    @staticmethod
+    def invalidate_schedule():
+        schedule_index.built_at = None
+        versions.bump('schedule')
+
+    @staticmethod
+    def get_schedule(start, end, venue=None):
+        # Представления, идущие в [start, end), по времени начала, с текущим числом свободных мест
+        items = PerformanceModel.schedule().between(start, end, venue)
+        seats = PerformanceModel.get_availability([item['performance_id'] for item in items])
+        return [dict(item, available_seats=seats[item['performance_id']])
+                for item in items if item['performance_id'] in seats]
+
+    @staticmethod
+    def get_availability(performance_ids):
+        # {performance_id: свободных мест} для многих представлений сразу: из снимка каталога,
+        # если он актуален, иначе одним запросом IN (...). Несуществующих id в ответе нет
+        if not performance_ids:
+            return {}
+        view = catalog_snapshot.view()
+        if view is not None:
+            found = (view.performance(performance_id) for performance_id in performance_ids)
+            return {perf['performance_id']: perf['available_seats'] for perf in found if perf is not None}
+        return PerformanceModel._load_availability(performance_ids)
+
+    @staticmethod
+    def _load_availability(performance_ids):
+        db = get_read_db('performance')
+        cursor = db.cursor()
+        # Не подготовленное выражение: текст запроса зависит от числа id
+        placeholders = ', '.join(['%s'] * len(performance_ids))
+        cursor.execute(f"SELECT performance_id, available_seats FROM Performance WHERE performance_id IN ({placeholders})",
+                       tuple(performance_ids))
+        seats = dict(cursor.fetchall())
+        cursor.close()
+        return seats
+
+    @staticmethod
+    def invalidate_cache(*play_ids):
+        catalog_cache.delete(*[('performances', play_id) for play_id in play_ids if play_id is not None])
+        versions.bump('performance')
 
     @staticmethod
-    def get_all_performances():
-        conn = get_db()  # Если у вас есть функция get_db() для получения соединения
-        cursor = conn.cursor(dictionary=True)
+    def get_all_performances(after=None, limit=None):
         # Предположим, что таблица называется Performance
         # и имеет поля performance_id, date_time, venue, available_seats
         # а также связь через Play_play_id -> Play.play_id
+        view = catalog_snapshot.view()
+        if view is not None:
+            return view.performances(after, limit)
+        return PerformanceModel._load_all_performances(after, limit)
+
+    @staticmethod
+    def _load_all_performances(after=None, limit=None):
         query = """
         SELECT p.performance_id, p.date_time, p.venue, p.available_seats, pl.title
         FROM Performance p
         JOIN Play pl ON p.Play_play_id = pl.play_id
-        ORDER BY p.date_time
         """
-        cursor.execute(query)
-        performances = cursor.fetchall()
-        cursor.close()
-        return performances
+        params = []
+        # after = (date_time, performance_id) последней строки предыдущей страницы
+        if after:
+            query += " WHERE p.date_time > %s OR (p.date_time = %s AND p.performance_id > %s)"
+            params += [after[0], after[0], after[1]]
+        query += " ORDER BY p.date_time, p.performance_id"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return fetch_prepared(query, tuple(params), replica=('performance',))
+
+    @staticmethod
+    def iter_all_performances():
+        return PERFORMANCE_KEYSET.iterate(PerformanceModel.get_all_performances)
 
 class TicketModel:
     @staticmethod
     def create_ticket(performance_id, price, user_id):
-        db = get_db()
-        cursor = db.cursor()
-        # В таблице Ticket колонка: Performance_performance_id и User_user_id
-        query = """INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id) 
-                   VALUES (%s, CURDATE(), %s, %s)"""
-        cursor.execute(query, (performance_id, price, user_id))
-        db.commit()
+        # Места списываются атомарно вместе со вставкой билета (процедура ReserveSeats);
+        # при нехватке мест поднимается SoldOutError. С WRITE_BEHIND_ENABLED покупка
+        # уходит в общий пакет, и номер билета не возвращается (None)
+        if WRITE_BEHIND_ENABLED:
+            reservation = ticket_writer.submit((performance_id, user_id, price))
+        else:
+            reservation = ReservationModel.reserve(performance_id, user_id, price)
+        PerformanceModel.invalidate_cache(reservation['play_id'])
+        UserModel.invalidate_summary(user_id)
+        return reservation['ticket_id']
+
+
+REVIEW_INSERT = "INSERT INTO Review (rating, text, date_posted, User_user_id) VALUES (%s, %s, CURDATE(), %s)"
 
 
 class ReviewModel:
     @staticmethod
-    def get_all_reviews():
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+    def get_all_reviews(after=None, limit=None):
         query = """SELECT r.review_id, r.rating, r.text, r.date_posted, u.username
                    FROM Review r
-                   JOIN User u ON r.User_user_id = u.user_id
-                   ORDER BY r.date_posted DESC"""
-        cursor.execute(query)
-        return cursor.fetchall()
+                   JOIN User u ON r.User_user_id = u.user_id"""
+        params = []
+        # after = (date_posted, review_id) последней строки предыдущей страницы
+        if after:
+            query += " WHERE r.date_posted < %s OR (r.date_posted = %s AND r.review_id < %s)"
+            params += [after[0], after[0], after[1]]
+        query += " ORDER BY r.date_posted DESC, r.review_id DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return fetch_prepared(query, tuple(params), replica=('review',))
+
+    @staticmethod
+    def iter_all_reviews():
+        return REVIEW_KEYSET.iterate(ReviewModel.get_all_reviews)
 
     @staticmethod
     def add_review(rating, text, user_id):
-        db = get_db()
-        cursor = db.cursor()
-        query = "INSERT INTO Review (rating, text, date_posted, User_user_id) VALUES (%s, %s, CURDATE(), %s)"
-        cursor.execute(query, (rating, text, user_id))
-        db.commit()
+        if WRITE_BEHIND_ENABLED:
+            review_writer.submit((rating, text, user_id))
+        else:
+            db = get_db()
+            cursor = db.cursor()
+            cursor.execute(REVIEW_INSERT, (rating, text, user_id))
+            db.commit()
+        versions.bump('review')
+        UserModel.invalidate_summary(user_id)
+
+    @staticmethod
+    def add_reviews_batch(conn, items):
+        # Пакет для BatchWriter: один executemany и один commit(); если пакет не прошёл,
+        # отзывы вставляются поштучно, чтобы ошибка досталась только своему автору
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(REVIEW_INSERT, items)
+            conn.commit()
+            return [None] * len(items)
+        except Exception:
+            conn.rollback()
+        results = []
+        for item in items:
+            try:
+                cursor.execute(REVIEW_INSERT, item)
+                conn.commit()
+                results.append(None)
+            except Exception as e:
+                conn.rollback()
+                results.append(e)
+        cursor.close()
+        return results
+
+
+# Очереди групповой фиксации (включаются WRITE_BEHIND_ENABLED); поток-писатель стартует при первой вставке
+ticket_writer = BatchWriter('tickets', ReservationModel.reserve_batch)
+review_writer = BatchWriter('reviews', ReviewModel.add_reviews_batch)
+
+
+def _drop_stale_catalog(*prefixes):
+    def callback():
+        for prefix in prefixes:
+            catalog_cache.delete_prefix(prefix)
+    return callback
+
+
+def _schedule_search_rebuild():
+    search_index.built_at = None
+
+
+def _drop_stale_schedule():
+    schedule_index.built_at = None
+
+
+# Данные изменил другой процесс: его инвалидация сюда не дошла, сбрасываем затронутое целиком
+versions.on_change('play', _drop_stale_catalog(('plays',), ('play',)))
+versions.on_change('play', _schedule_search_rebuild)
+versions.on_change('schedule', _drop_stale_schedule)
+versions.on_change('performance', _drop_stale_catalog(('performances',)))
@@ -0,0 +1,58 @@
+# pagination.py
+# Курсорная (keyset) пагинация: вместо OFFSET страница начинается после последней
+# строки предыдущей, поэтому стоимость запроса не растёт с номером страницы.
+from datetime import date, datetime
+
+from config import STREAM_CHUNK_SIZE
+
+_SEPARATOR = '_'
+
+
+class Keyset:
+    def __init__(self, *columns):
+        # columns - пары (имя колонки в строке результата, функция разбора из строки)
+        self.columns = columns
+        self.keys = tuple(name for name, _ in columns)
+
+    def after(self, row):
+        return tuple(row[key] for key in self.keys)
+
+    def encode(self, row):
+        parts = []
+        for value in self.after(row):
+            parts.append(value.isoformat() if isinstance(value, (date, datetime)) else str(value))
+        return _SEPARATOR.join(parts)
+
+    def decode(self, cursor):
+        # Испорченный курсор из URL просто означает первую страницу
+        if not cursor:
+            return None
+        parts = cursor.split(_SEPARATOR)
+        if len(parts) != len(self.columns):
+            return None
+        try:
+            return tuple(parse(part) for (_, parse), part in zip(self.columns, parts))
+        except ValueError:
+            return None
+
+    def next_cursor(self, rows, limit):
+        # Неполная страница - значит, дальше строк нет
+        if not rows or len(rows) < limit:
+            return None
+        return self.encode(rows[-1])
+
+    def iterate(self, fetch_page, chunk_size=STREAM_CHUNK_SIZE):
+        # Генератор по всей выборке: в памяти одновременно не больше chunk_size строк
+        after = None
+        while True:
+            rows = fetch_page(after, chunk_size)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = self.after(rows[-1])
+
+
+PLAY_KEYSET = Keyset(('play_id', int))
+PERFORMANCE_KEYSET = Keyset(('date_time', datetime.fromisoformat), ('performance_id', int))
+REVIEW_KEYSET = Keyset(('date_posted', date.fromisoformat), ('review_id', int))
+TICKET_KEYSET = Keyset(('purchase_date', date.fromisoformat), ('ticket_id', int))
@@ -0,0 +1,105 @@
+# passwords.py
+# Хэширование паролей bcrypt в отдельном ограниченном пуле потоков. bcrypt отпускает GIL,
+# поэтому расчёт идёт параллельно с обработкой запросов, но одновременно считается не
+# больше BCRYPT_WORKERS хэшей: поток запроса только ждёт результат. Когда очередь
+# заполнена, вызов сразу получает PasswordBusyError, а не ждёт секунды за спиной у
+# сотен попыток перебора паролей.
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
+import bcrypt
+
+from config import BCRYPT_LOG_ROUNDS, BCRYPT_WORKERS, BCRYPT_QUEUE_LIMIT, BCRYPT_TIMEOUT
+
+# bcrypt учитывает только первые 72 байта пароля; новые версии библиотеки на длинный
+# пароль поднимают ошибку, поэтому обрезаем сами
+_MAX_BYTES = 72
+
+
+class PasswordBusyError(Exception):
+    pass
+
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_QUEUE_LIMIT)
+_stats_lock = threading.Lock()
+_stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'timeouts': 0}
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats['rejected'] += 1
+        raise PasswordBusyError('Сервер перегружен попытками входа, повторите позже')
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(BCRYPT_TIMEOUT)
+    except TimeoutError:
+        with _stats_lock:
+            _stats['timeouts'] += 1
+        raise PasswordBusyError('Сервер перегружен попытками входа, повторите позже')
+
+
+def _encode(password):
+    return password.encode('utf-8')[:_MAX_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _check(password, stored):
+    return bcrypt.checkpw(_encode(password), stored.encode('ascii'))
+
+
+@lru_cache(maxsize=None)
+def _dummy_hash():
+    return _hash('dummy-password', BCRYPT_LOG_ROUNDS)
+
+
+def _check_dummy(password):
+    return _check(password, _dummy_hash())
+
+
+def is_bcrypt_hash(stored):
+    return stored.startswith(('$2a$', '$2b$', '$2y$'))
+
+
+def hash_rounds(stored):
+    # $2b$12$... -> 12
+    return int(stored[4:6]) if is_bcrypt_hash(stored) else 0
+
+
+def hash_password(password, rounds=BCRYPT_LOG_ROUNDS):
+    result = _run(_hash, password, rounds)
+    with _stats_lock:
+        _stats['hashed'] += 1
+    return result
+
+
+def verify_password(password, stored):
+    # (пароль верен, хэш нужно пересчитать). stored=None - пользователя нет: хэш всё равно
+    # считается, чтобы время ответа не выдавало, существует ли такое имя
+    if stored is None:
+        _run(_check_dummy, password)
+        return False, False
+    if is_bcrypt_hash(stored):
+        ok = _run(_check, password, stored)
+        with _stats_lock:
+            _stats['verified'] += 1
+        return ok, ok and hash_rounds(stored) < BCRYPT_LOG_ROUNDS
+    # Пароль из времён до хэширования хранится открытым текстом
+    ok = hmac.compare_digest(_encode(stored), _encode(password))
+    return ok, ok
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats, workers=BCRYPT_WORKERS, rounds=BCRYPT_LOG_ROUNDS)
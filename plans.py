@@ -0,0 +1,134 @@
+# plans.py
+# Проверка планов запросов моделей (flask check-plans). Методы чтения моделей вызываются
+# с образцовыми параметрами, их SQL перехватывается инструментированным курсором
+# (metrics._capture), и для каждого запроса выполняется EXPLAIN. Проверка не проходит,
+# если какая-то таблица читается полным сканированием (type = ALL) или в базе нет
+# индекса, объявленного в schema.py.
+# Сводка /admin/statistics, аналитика и выгрузки читают таблицы целиком намеренно и
+# здесь не проверяются. Каждый открытый метод чтения моделей (get_*, iter_*, search_*)
+# должен быть либо в MODEL_READS, либо в UNCHECKED_READS с причиной - это проверяет
+# tests/test_plans.py. Чтения идут через _load_*, мимо кэша и снимка каталога: иначе
+# запрос мог бы не выполниться вовсе.
+from datetime import date, datetime
+
+from flask import g
+
+from config import PAGE_SIZE, PROFILE_REVIEWS_LIMIT, SQL_INSTRUMENTATION
+from db import get_db
+from models import UserModel, PlayModel, PerformanceModel, ReviewModel
+from schema import declared_indexes
+from seatmap import SeatMapModel
+from utils import get_average_ticket_price, get_occupancy_rate, get_total_tickets_sold
+
+# Существование строк для EXPLAIN не нужно, поэтому идентификаторы условные
+SAMPLE_ID = 1
+SAMPLE_DATE = date(2025, 1, 1)
+SAMPLE_DATETIME = datetime(2025, 1, 1, 19, 0)
+
+
+def _stats_cursor():
+    return get_db().cursor(dictionary=True)
+
+
+MODEL_READS = [
+    ('UserModel.get_user_by_username', lambda: UserModel.get_user_by_username('admin')),
+    ('UserModel.get_user_by_id', lambda: UserModel.get_user_by_id(SAMPLE_ID)),
+    ('UserModel.get_user_tickets', lambda: UserModel.get_user_tickets(SAMPLE_ID, None, PAGE_SIZE)),
+    ('UserModel.get_user_tickets (страница)',
+     lambda: UserModel.get_user_tickets(SAMPLE_ID, (SAMPLE_DATE, SAMPLE_ID), PAGE_SIZE)),
+    ('UserModel.get_user_reviews', lambda: UserModel.get_user_reviews(SAMPLE_ID, PROFILE_REVIEWS_LIMIT)),
+    ('UserModel.get_user_summary', lambda: UserModel._load_user_summary(SAMPLE_ID)),
+    ('PlayModel.get_all_plays', lambda: PlayModel._load_all_plays(None, PAGE_SIZE)),
+    ('PlayModel.get_all_plays (страница)', lambda: PlayModel._load_all_plays((SAMPLE_ID,), PAGE_SIZE)),
+    ('PlayModel.get_play_by_id', lambda: PlayModel._load_play(SAMPLE_ID)),
+    ('PerformanceModel.get_performances_by_play', lambda: PerformanceModel._load_performances_by_play(SAMPLE_ID)),
+    ('PerformanceModel.get_performance_by_id', lambda: PerformanceModel._load_performance(SAMPLE_ID)),
+    ('PerformanceModel.schedule', lambda: PerformanceModel._load_schedule()),
+    ('PerformanceModel.get_all_performances', lambda: PerformanceModel._load_all_performances(None, PAGE_SIZE)),
+    ('PerformanceModel.get_all_performances (страница)',
+     lambda: PerformanceModel._load_all_performances((SAMPLE_DATETIME, SAMPLE_ID), PAGE_SIZE)),
+    ('PerformanceModel.get_availability',
+     lambda: PerformanceModel._load_availability([SAMPLE_ID, SAMPLE_ID + 1, SAMPLE_ID + 2])),
+    ('ReviewModel.get_all_reviews', lambda: ReviewModel.get_all_reviews(None, PAGE_SIZE)),
+    ('ReviewModel.get_all_reviews (страница)',
+     lambda: ReviewModel.get_all_reviews((SAMPLE_DATE, SAMPLE_ID), PAGE_SIZE)),
+    ('SeatMapModel.get', lambda: SeatMapModel.get(SAMPLE_ID)),
+    ('SeatMapModel.get_hold', lambda: SeatMapModel.get_hold(SAMPLE_ID, SAMPLE_ID)),
+    # Показатели - вызовы функций миграции 4; их тела читают PlaySales/PerformanceSales
+    # по первичному ключу, а в EXPLAIN видно только сам вызов
+    ('utils.get_average_ticket_price', lambda: get_average_ticket_price(SAMPLE_ID, _stats_cursor())),
+    ('utils.get_occupancy_rate', lambda: get_occupancy_rate(SAMPLE_ID, _stats_cursor())),
+    ('utils.get_total_tickets_sold', lambda: get_total_tickets_sold(SAMPLE_ID, _stats_cursor())),
+]
+
+# Открытые методы чтения, которых нет в MODEL_READS, и почему
+UNCHECKED_READS = {
+    'UserModel.iter_user_tickets': 'страницы UserModel.get_user_tickets',
+    'UserModel.get_profile': 'get_user_by_id, get_user_tickets, get_user_reviews и get_user_summary',
+    'PlayModel.iter_all_plays': 'страницы PlayModel.get_all_plays',
+    'PlayModel.search_plays': 'поиск по индексу в памяти; индекс строится через iter_all_plays',
+    'PerformanceModel.get_schedule': 'расписание в памяти и PerformanceModel.get_availability',
+    'PerformanceModel.iter_all_performances': 'страницы PerformanceModel.get_all_performances',
+    'ReviewModel.iter_all_reviews': 'страницы ReviewModel.get_all_reviews',
+}
+
+
+def capture_queries():
+    # ([(имя метода, SQL, параметры)] без повторов одного и того же текста запроса,
+    #  [имена чтений, не выполнивших ни одного SELECT])
+    seen = set()
+    queries = []
+    silent = []
+    for name, read in MODEL_READS:
+        g.sql_capture = []
+        try:
+            read()
+            captured = g.sql_capture
+        finally:
+            g.pop('sql_capture', None)
+        selects = [(sql, params) for sql, params in captured if sql.lstrip().upper().startswith('SELECT')]
+        if not selects:
+            silent.append(name)
+        for sql, params in selects:
+            if sql not in seen:
+                seen.add(sql)
+                queries.append((name, sql, params))
+    return queries, silent
+
+
+def missing_indexes():
+    cursor = get_db().cursor()
+    cursor.execute("""SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE()""")
+    existing = {(table.lower(), name) for table, name in cursor.fetchall()}
+    cursor.close()
+    return [index for index in declared_indexes() if (index.table.lower(), index.name) not in existing]
+
+
+def check_plans():
+    # {'queries': [{'name', 'sql', 'plan', 'full_scans', 'filesort'}], 'missing_indexes': [...],
+    #  'silent': [...], 'ok': bool}
+    if not SQL_INSTRUMENTATION:
+        raise RuntimeError('Для перехвата запросов нужен SQL_INSTRUMENTATION = True')
+    results = []
+    captured, silent = capture_queries()
+    cursor = get_db().cursor(dictionary=True)
+    for name, sql, params in captured:
+        cursor.execute('EXPLAIN ' + sql, params or ())
+        plan = cursor.fetchall()
+        results.append({
+            'name': name,
+            'sql': ' '.join(sql.split()),
+            'plan': plan,
+            'full_scans': [row['table'] for row in plan if row['type'] == 'ALL'],
+            'filesort': any('filesort' in (row.get('Extra') or '') for row in plan),
+        })
+    cursor.close()
+    missing = missing_indexes()
+    return {
+        'queries': results,
+        'missing_indexes': missing,
+        # Чтение, не дошедшее до БД, не проверено - значит, проверка не пройдена
+        'silent': silent,
+        'ok': not missing and not silent and not any(result['full_scans'] for result in results),
+    }
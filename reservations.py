@@ -0,0 +1,76 @@
+# reservations.py
+from collections import Counter
+
+from db import get_db
+
+
+class SoldOutError(Exception):
+    pass
+
+
+def _call(procname, args, conn=None):
+    # Процедуры сами открывают и фиксируют транзакцию, поэтому commit() здесь не нужен
+    db = conn or get_db()
+    cursor = db.cursor()
+    cursor.callproc(procname, args)
+    row = None
+    for result in cursor.stored_results():
+        row = result.fetchone()
+    cursor.close()
+    return row
+
+
+class ReservationModel:
+    @staticmethod
+    def reserve(performance_id, user_id, price, quantity=1, conn=None):
+        ticket_id, play_id, available_seats = _call('ReserveSeats', [performance_id, user_id, price, quantity], conn)
+        if not ticket_id:
+            raise SoldOutError('Свободных мест на это представление нет')
+        return {'ticket_id': ticket_id, 'play_id': play_id, 'available_seats': available_seats}
+
+    @staticmethod
+    def reserve_batch(conn, items):
+        # Пакетная покупка по одному месту для BatchWriter: items - [(performance_id, user_id, price)].
+        # Все списания, билеты и агрегаты продаж фиксируются одним commit(). Номера билетов
+        # при вставке через executemany не возвращаются, поэтому ticket_id в результате - None.
+        # Покупки, которым не хватило мест (возможно, их держат истёкшие брони), и весь пакет
+        # при ошибке повторяются поштучно через ReserveSeats.
+        results = [None] * len(items)
+        # Строки Performance блокируются в порядке performance_id, чтобы пакеты не взаимоблокировались
+        order = sorted(range(len(items)), key=lambda i: items[i][0])
+        sold, retry, plays = [], [], {}
+        cursor = conn.cursor()
+        try:
+            for i in order:
+                cursor.execute("""UPDATE Performance SET available_seats = available_seats - 1
+                                  WHERE performance_id = %s AND available_seats >= 1""", (items[i][0],))
+                (sold if cursor.rowcount == 1 else retry).append(i)
+            if sold:
+                cursor.executemany("""INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id)
+                                      VALUES (%s, CURDATE(), %s, %s)""",
+                                   [(items[i][0], items[i][2], items[i][1]) for i in sold])
+                performance_ids = sorted({items[i][0] for i in sold})
+                placeholders = ', '.join(['%s'] * len(performance_ids))
+                cursor.execute(f"SELECT performance_id, Play_play_id, available_seats FROM Performance "
+                               f"WHERE performance_id IN ({placeholders})", tuple(performance_ids))
+                plays = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+                sales = Counter((items[i][0], items[i][2]) for i in sold)
+                for (performance_id, price), quantity in sorted(sales.items()):
+                    cursor.callproc('RecordSale', [performance_id, plays[performance_id][0], price, quantity])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            sold, retry = [], order
+        finally:
+            cursor.close()
+
+        for i in sold:
+            play_id, available_seats = plays[items[i][0]]
+            results[i] = {'ticket_id': None, 'play_id': play_id, 'available_seats': available_seats}
+        for i in retry:
+            performance_id, user_id, price = items[i]
+            try:
+                results[i] = ReservationModel.reserve(performance_id, user_id, price, conn=conn)
+            except Exception as e:
+                results[i] = e
+        return results
@@ -0,0 +1,142 @@
+# schedule.py
+# Расписание залов в памяти процесса: интервалы [начало, конец) представлений, где конец =
+# начало + продолжительность пьесы. По каждому залу и по всем залам вместе хранятся
+# списки (начало, id), отсортированные по началу, - отдельный список на каждую
+# продолжительность; поиск - двоичный (bisect). Интервал длины d, пересекающий [x, y),
+# обязан начинаться в [x - d, y), поэтому и проверка пересечений при записи, и выборка
+# «что идёт с x по y» просматривают в каждом списке только этот отрезок, а не все
+# представления. Одно очень длинное представление не расширяет поиск по остальным.
+# Строится из PerformanceModel и обновляется его методами записи.
+import bisect
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from config import DEFAULT_PERFORMANCE_MINUTES, VENUE_CHANGEOVER_MINUTES
+
+
+class ScheduleConflictError(Exception):
+    pass
+
+
+def venue_key(venue):
+    # «Малая сцена» и «малая сцена » - один зал
+    return ' '.join((venue or '').casefold().replace('ё', 'е').split())
+
+
+def performance_end(start, duration):
+    return start + timedelta(minutes=duration or DEFAULT_PERFORMANCE_MINUTES)
+
+
+class _Timeline:
+    # Интервалы, сгруппированные по продолжительности; в группе - отсортированы по началу
+    def __init__(self):
+        self.groups = {}           # продолжительность -> [(начало, id)]
+
+    def add(self, key, start, end):
+        bisect.insort(self.groups.setdefault(end - start, []), (start, key))
+
+    def remove(self, key, start, end):
+        duration = end - start
+        starts = self.groups.get(duration)
+        if starts is None:
+            return
+        i = bisect.bisect_left(starts, (start, key))
+        if i < len(starts) and starts[i] == (start, key):
+            del starts[i]
+            if not starts:
+                del self.groups[duration]
+
+    def candidates(self, start, end):
+        # id интервалов, которые могут пересекать [start, end), по времени начала
+        found = []
+        for duration, starts in self.groups.items():
+            lo = bisect.bisect_left(starts, (start - duration,))
+            hi = bisect.bisect_left(starts, (end,))
+            found.append(starts[lo:hi])
+        return [key for _, key in heapq.merge(*found)]
+
+
+class ScheduleIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._items = {}           # id -> строка: performance_id, play_id, title, date_time, end, venue
+        self._venues = {}          # venue_key -> _Timeline
+        self._all = _Timeline()
+        self.built_at = None
+
+    def rebuild(self, rows):
+        # rows: performance_id, play_id, title, date_time, venue, duration
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+
+    def add(self, row):
+        with self._lock:
+            self._remove(row['performance_id'])
+            self._add(row)
+
+    def _add(self, row):
+        item = dict(row, end=performance_end(row['date_time'], row.get('duration')))
+        key = item['performance_id']
+        self._items[key] = item
+        self._venues.setdefault(venue_key(item['venue']), _Timeline()).add(key, item['date_time'], item['end'])
+        self._all.add(key, item['date_time'], item['end'])
+
+    def remove(self, performance_id):
+        with self._lock:
+            self._remove(performance_id)
+
+    def _remove(self, performance_id):
+        item = self._items.pop(performance_id, None)
+        if item is None:
+            return
+        timeline = self._venues.get(venue_key(item['venue']))
+        if timeline is not None:
+            timeline.remove(performance_id, item['date_time'], item['end'])
+        self._all.remove(performance_id, item['date_time'], item['end'])
+
+    def conflicts(self, venue, start, duration, exclude=None):
+        # Представления в том же зале, пересекающиеся с новым с учётом перерыва на смену декораций
+        gap = timedelta(minutes=VENUE_CHANGEOVER_MINUTES)
+        begin, end = start - gap, performance_end(start, duration) + gap
+        with self._lock:
+            timeline = self._venues.get(venue_key(venue))
+            if timeline is None:
+                return []
+            found = []
+            for key in timeline.candidates(begin, end):
+                item = self._items[key]
+                if key != exclude and item['date_time'] < end and item['end'] > begin:
+                    found.append(item)
+            return found
+
+    def check(self, venue, start, duration, exclude=None):
+        conflicts = self.conflicts(venue, start, duration, exclude)
+        if conflicts:
+            other = conflicts[0]
+            raise ScheduleConflictError(
+                f"Зал «{other['venue']}» занят: {other['title']} "
+                f"{other['date_time']:%d.%m.%Y %H:%M}–{other['end']:%H:%M}")
+
+    def between(self, start, end, venue=None):
+        # Представления, идущие в [start, end), по времени начала
+        with self._lock:
+            timeline = self._all if venue is None else self._venues.get(venue_key(venue))
+            if timeline is None:
+                return []
+            items = [self._items[key] for key in timeline.candidates(start, end)]
+        return [item for item in items if item['end'] > start]
+
+    def venues(self):
+        with self._lock:
+            names = {}
+            for item in self._items.values():
+                names.setdefault(venue_key(item['venue']), item['venue'])
+            return sorted(names.values())
@@ -0,0 +1,389 @@
+# schema.py
+# Изменения схемы БД, которые нужны приложению. Применяются командой `flask migrate`.
+# Каждая миграция - (версия, описание, список SQL-операторов); применённые версии
+# записываются в таблицу SchemaVersion, поэтому повторный запуск безопасен.
+# Вместо оператора можно указать Index(...): индекс создаётся, только если в таблице
+# ещё нет индекса с таким именем (его могли завести вручную до появления миграции).
+# Так же Column(...) добавляет столбец, которого ещё нет, а Routine(...) создаёт процедуру
+# или функцию, которой ещё нет, и не трогает существующую. Миграция, прерванная на
+# середине, повторяется целиком, поэтому каждый её оператор можно выполнить повторно.
+from collections import namedtuple
+
+Index = namedtuple('Index', 'table name columns')
+Column = namedtuple('Column', 'table name definition')
+Routine = namedtuple('Routine', 'kind name definition')
+
+MIGRATIONS = [
+    # Версия 0 - исходные таблицы и процедура AddPlay, на которые рассчитан код. В базе,
+    # созданной до миграций, CREATE ... IF NOT EXISTS ничего не меняет, а AddPlay
+    # остаётся рабочим: создаётся, только если его нет
+    (0, 'Базовые таблицы Play, Performance, User, Ticket, Review и процедура AddPlay', [
+        """CREATE TABLE IF NOT EXISTS Play (
+               play_id INT AUTO_INCREMENT PRIMARY KEY,
+               title VARCHAR(255) NOT NULL,
+               description TEXT,
+               genre VARCHAR(100),
+               duration INT
+           )""",
+        """CREATE TABLE IF NOT EXISTS Performance (
+               performance_id INT AUTO_INCREMENT PRIMARY KEY,
+               Play_play_id INT NOT NULL,
+               date_time DATETIME NOT NULL,
+               venue VARCHAR(255) NOT NULL,
+               available_seats INT NOT NULL DEFAULT 0,
+               FOREIGN KEY (Play_play_id) REFERENCES Play (play_id) ON DELETE CASCADE
+           )""",
+        # password_hash - не короче 60 символов: столько занимает хэш bcrypt
+        """CREATE TABLE IF NOT EXISTS User (
+               user_id INT AUTO_INCREMENT PRIMARY KEY,
+               username VARCHAR(100) NOT NULL UNIQUE,
+               email VARCHAR(255) NOT NULL,
+               password_hash VARCHAR(255) NOT NULL
+           )""",
+        """CREATE TABLE IF NOT EXISTS Ticket (
+               ticket_id INT AUTO_INCREMENT PRIMARY KEY,
+               Performance_performance_id INT NOT NULL,
+               purchase_date DATE NOT NULL,
+               price DECIMAL(10, 2) NOT NULL,
+               User_user_id INT NOT NULL,
+               FOREIGN KEY (Performance_performance_id) REFERENCES Performance (performance_id) ON DELETE CASCADE,
+               FOREIGN KEY (User_user_id) REFERENCES User (user_id) ON DELETE CASCADE
+           )""",
+        """CREATE TABLE IF NOT EXISTS Review (
+               review_id INT AUTO_INCREMENT PRIMARY KEY,
+               rating INT NOT NULL,
+               text TEXT NOT NULL,
+               date_posted DATE NOT NULL,
+               User_user_id INT NOT NULL,
+               FOREIGN KEY (User_user_id) REFERENCES User (user_id) ON DELETE CASCADE
+           )""",
+
+        # PlayModel.create_play читает новую пьесу по LAST_INSERT_ID()
+        Routine('PROCEDURE', 'AddPlay',
+                """CREATE PROCEDURE AddPlay(IN p_title VARCHAR(255), IN p_description TEXT,
+                                            IN p_genre VARCHAR(100), IN p_duration INT)
+                   BEGIN
+                       INSERT INTO Play (title, description, genre, duration)
+                       VALUES (p_title, p_description, p_genre, p_duration);
+                   END"""),
+    ]),
+
+    (1, 'Покупка билетов: процедура ReserveSeats', [
+        "DROP PROCEDURE IF EXISTS ReserveSeats",
+        # Условное списание мест и вставка билетов за один вызов. Блокировка строки
+        # Performance держится только внутри процедуры, без сетевых задержек.
+        """CREATE PROCEDURE ReserveSeats(IN p_performance_id INT, IN p_user_id INT,
+                                         IN p_price DECIMAL(10, 2), IN p_quantity INT)
+           BEGIN
+               DECLARE v_rows INT DEFAULT 0;
+               DECLARE v_play_id INT DEFAULT NULL;
+               DECLARE v_left INT DEFAULT NULL;
+               DECLARE v_ticket_id INT DEFAULT 0;
+               DECLARE i INT DEFAULT 0;
+               DECLARE EXIT HANDLER FOR SQLEXCEPTION BEGIN ROLLBACK; RESIGNAL; END;
+
+               START TRANSACTION;
+               UPDATE Performance SET available_seats = available_seats - p_quantity
+                WHERE performance_id = p_performance_id AND available_seats >= p_quantity;
+               SET v_rows = ROW_COUNT();
+
+               IF v_rows = 1 THEN
+                   SELECT Play_play_id, available_seats INTO v_play_id, v_left
+                     FROM Performance WHERE performance_id = p_performance_id;
+                   WHILE i < p_quantity DO
+                       INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id)
+                       VALUES (p_performance_id, CURDATE(), p_price, p_user_id);
+                       IF i = 0 THEN SET v_ticket_id = LAST_INSERT_ID(); END IF;
+                       SET i = i + 1;
+                   END WHILE;
+                   COMMIT;
+               ELSE
+                   ROLLBACK;
+               END IF;
+               SELECT v_ticket_id AS ticket_id, v_play_id AS play_id, v_left AS available_seats;
+           END""",
+    ]),
+    (2, 'Агрегаты продаж PerformanceSales/PlaySales, обновляемые при покупке', [
+        """CREATE TABLE IF NOT EXISTS PerformanceSales (
+               Performance_performance_id INT PRIMARY KEY,
+               tickets_sold INT NOT NULL DEFAULT 0,
+               seats_sold INT NOT NULL DEFAULT 0,
+               revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+               min_price DECIMAL(10, 2) NULL,
+               max_price DECIMAL(10, 2) NULL,
+               FOREIGN KEY (Performance_performance_id) REFERENCES Performance (performance_id) ON DELETE CASCADE
+           )""",
+        """CREATE TABLE IF NOT EXISTS PlaySales (
+               Play_play_id INT PRIMARY KEY,
+               tickets_sold INT NOT NULL DEFAULT 0,
+               seats_sold INT NOT NULL DEFAULT 0,
+               revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+               min_price DECIMAL(10, 2) NULL,
+               max_price DECIMAL(10, 2) NULL,
+               FOREIGN KEY (Play_play_id) REFERENCES Play (play_id) ON DELETE CASCADE
+           )""",
+
+        "DROP PROCEDURE IF EXISTS RecordSale",
+        # Вызывается внутри транзакции покупки: агрегаты меняются вместе с билетами
+        """CREATE PROCEDURE RecordSale(IN p_performance_id INT, IN p_play_id INT,
+                                       IN p_price DECIMAL(10, 2), IN p_quantity INT)
+           BEGIN
+               INSERT INTO PerformanceSales (Performance_performance_id, tickets_sold, seats_sold, revenue,
+                                             min_price, max_price)
+               VALUES (p_performance_id, p_quantity, p_quantity, p_price * p_quantity, p_price, p_price)
+               ON DUPLICATE KEY UPDATE
+                   tickets_sold = tickets_sold + VALUES(tickets_sold),
+                   seats_sold = seats_sold + VALUES(seats_sold),
+                   revenue = revenue + VALUES(revenue),
+                   min_price = LEAST(COALESCE(min_price, VALUES(min_price)), VALUES(min_price)),
+                   max_price = GREATEST(COALESCE(max_price, VALUES(max_price)), VALUES(max_price));
+               INSERT INTO PlaySales (Play_play_id, tickets_sold, seats_sold, revenue, min_price, max_price)
+               VALUES (p_play_id, p_quantity, p_quantity, p_price * p_quantity, p_price, p_price)
+               ON DUPLICATE KEY UPDATE
+                   tickets_sold = tickets_sold + VALUES(tickets_sold),
+                   seats_sold = seats_sold + VALUES(seats_sold),
+                   revenue = revenue + VALUES(revenue),
+                   min_price = LEAST(COALESCE(min_price, VALUES(min_price)), VALUES(min_price)),
+                   max_price = GREATEST(COALESCE(max_price, VALUES(max_price)), VALUES(max_price));
+           END""",
+
+        "DROP PROCEDURE IF EXISTS ReserveSeats",
+        """CREATE PROCEDURE ReserveSeats(IN p_performance_id INT, IN p_user_id INT,
+                                         IN p_price DECIMAL(10, 2), IN p_quantity INT)
+           BEGIN
+               DECLARE v_rows INT DEFAULT 0;
+               DECLARE v_play_id INT DEFAULT NULL;
+               DECLARE v_left INT DEFAULT NULL;
+               DECLARE v_ticket_id INT DEFAULT 0;
+               DECLARE i INT DEFAULT 0;
+               DECLARE EXIT HANDLER FOR SQLEXCEPTION BEGIN ROLLBACK; RESIGNAL; END;
+
+               START TRANSACTION;
+               UPDATE Performance SET available_seats = available_seats - p_quantity
+                WHERE performance_id = p_performance_id AND available_seats >= p_quantity;
+               SET v_rows = ROW_COUNT();
+
+               IF v_rows = 1 THEN
+                   SELECT Play_play_id, available_seats INTO v_play_id, v_left
+                     FROM Performance WHERE performance_id = p_performance_id;
+                   WHILE i < p_quantity DO
+                       INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id)
+                       VALUES (p_performance_id, CURDATE(), p_price, p_user_id);
+                       IF i = 0 THEN SET v_ticket_id = LAST_INSERT_ID(); END IF;
+                       SET i = i + 1;
+                   END WHILE;
+                   CALL RecordSale(p_performance_id, v_play_id, p_price, p_quantity);
+                   COMMIT;
+               ELSE
+                   ROLLBACK;
+               END IF;
+               SELECT v_ticket_id AS ticket_id, v_play_id AS play_id, v_left AS available_seats;
+           END""",
+
+        # Начальное заполнение по уже проданным билетам. Строки, оставшиеся от прерванного
+        # запуска или записанные RecordSale после него, заменяются подсчётом по Ticket, а не
+        # складываются с ним
+        """INSERT INTO PerformanceSales (Performance_performance_id, tickets_sold, seats_sold, revenue,
+                                       min_price, max_price)
+           SELECT t.Performance_performance_id, COUNT(*), COUNT(*), SUM(t.price), MIN(t.price), MAX(t.price)
+             FROM Ticket t
+            GROUP BY t.Performance_performance_id
+           ON DUPLICATE KEY UPDATE
+               tickets_sold = VALUES(tickets_sold), seats_sold = VALUES(seats_sold), revenue = VALUES(revenue),
+               min_price = VALUES(min_price), max_price = VALUES(max_price)""",
+        """INSERT INTO PlaySales (Play_play_id, tickets_sold, seats_sold, revenue, min_price, max_price)
+           SELECT p.Play_play_id, COUNT(*), COUNT(*), SUM(t.price), MIN(t.price), MAX(t.price)
+             FROM Ticket t
+             JOIN Performance p ON t.Performance_performance_id = p.performance_id
+            GROUP BY p.Play_play_id
+           ON DUPLICATE KEY UPDATE
+               tickets_sold = VALUES(tickets_sold), seats_sold = VALUES(seats_sold), revenue = VALUES(revenue),
+               min_price = VALUES(min_price), max_price = VALUES(max_price)""",
+    ]),
+
+    (3, 'Схема зала: SeatMap с битовыми картами мест, SeatMapHold и их истечение, номер места в Ticket', [
+        # layout - ряды и ценовые зоны (JSON, см. seatmap.py); sold и held - битовые карты,
+        # бит i = место i в порядке рядов, младший байт первым
+        """CREATE TABLE IF NOT EXISTS SeatMap (
+               Performance_performance_id INT PRIMARY KEY,
+               layout JSON NOT NULL,
+               sold BLOB NOT NULL,
+               held BLOB NOT NULL,
+               FOREIGN KEY (Performance_performance_id) REFERENCES Performance (performance_id) ON DELETE CASCADE
+           )""",
+        """CREATE TABLE IF NOT EXISTS SeatMapHold (
+               hold_id INT AUTO_INCREMENT PRIMARY KEY,
+               Performance_performance_id INT NOT NULL,
+               User_user_id INT NOT NULL,
+               zone VARCHAR(64) NOT NULL,
+               seats TEXT NOT NULL,
+               expires_at DATETIME NOT NULL,
+               INDEX idx_seatmaphold_performance_expires (Performance_performance_id, expires_at),
+               INDEX idx_seatmaphold_expires (expires_at),
+               FOREIGN KEY (Performance_performance_id) REFERENCES Performance (performance_id) ON DELETE CASCADE
+           )""",
+        Column('Ticket', 'seat_index', 'INT NULL'),
+
+        "DROP PROCEDURE IF EXISTS ReleaseExpiredSeatMapHolds",
+        # То же, что SeatMapModel._expire, для всех представлений: снимает биты мест истёкших
+        # броней в SeatMap.held и возвращает их в available_seats. Одна бронь - одна транзакция;
+        # порядок блокировок тот же, что в seatmap.py: сначала SeatMap, потом SeatMapHold
+        """CREATE PROCEDURE ReleaseExpiredSeatMapHolds()
+           BEGIN
+               DECLARE v_hold_id INT;
+               DECLARE v_performance_id INT;
+               DECLARE v_held BLOB;
+               DECLARE v_seats TEXT;
+               DECLARE v_seat INT;
+               DECLARE v_byte INT;
+               DECLARE v_freed INT;
+               DECLARE v_found INT;
+               DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_found = 0;
+               DECLARE EXIT HANDLER FOR SQLEXCEPTION BEGIN ROLLBACK; RESIGNAL; END;
+
+               expired: LOOP
+                   SET v_hold_id = NULL;
+                   SELECT hold_id, Performance_performance_id INTO v_hold_id, v_performance_id
+                     FROM SeatMapHold WHERE expires_at <= NOW() ORDER BY expires_at LIMIT 1;
+                   IF v_hold_id IS NULL THEN
+                       LEAVE expired;
+                   END IF;
+
+                   START TRANSACTION;
+                   SET v_found = 1;
+                   SELECT held INTO v_held FROM SeatMap WHERE Performance_performance_id = v_performance_id FOR UPDATE;
+                   IF v_found = 0 THEN
+                       -- Схему зала пересоздали или удалили: возвращать места некуда
+                       DELETE FROM SeatMapHold WHERE hold_id = v_hold_id;
+                       COMMIT;
+                       ITERATE expired;
+                   END IF;
+                   -- Перечитываем под блокировкой: бронь могли подтвердить или снять параллельно
+                   SET v_found = 1;
+                   SELECT seats INTO v_seats FROM SeatMapHold
+                    WHERE hold_id = v_hold_id AND expires_at <= NOW() FOR UPDATE;
+                   IF v_found = 0 THEN
+                       COMMIT;
+                       ITERATE expired;
+                   END IF;
+
+                   -- seats - номера мест через запятую; бит i лежит в байте i DIV 8, младший байт первым
+                   SET v_freed = 0;
+                   WHILE v_seats <> '' DO
+                       SET v_seat = CAST(SUBSTRING_INDEX(v_seats, ',', 1) AS UNSIGNED);
+                       SET v_seats = IF(LOCATE(',', v_seats) > 0, SUBSTRING(v_seats, LOCATE(',', v_seats) + 1), '');
+                       SET v_byte = v_seat DIV 8 + 1;
+                       SET v_held = INSERT(v_held, v_byte, 1,
+                                           CHAR(ASCII(SUBSTRING(v_held, v_byte, 1)) & ~(1 << (v_seat MOD 8)) & 255));
+                       SET v_freed = v_freed + 1;
+                   END WHILE;
+                   UPDATE SeatMap SET held = v_held WHERE Performance_performance_id = v_performance_id;
+                   UPDATE Performance SET available_seats = available_seats + v_freed
+                    WHERE performance_id = v_performance_id;
+                   DELETE FROM SeatMapHold WHERE hold_id = v_hold_id;
+                   COMMIT;
+               END LOOP;
+           END""",
+        # Места истёкших броней возвращаются, даже если по представлению больше никто не
+        # бронирует (нужен event_scheduler=ON; без него - только лениво, в SeatMapModel.hold)
+        """CREATE EVENT IF NOT EXISTS ExpireSeatMapHolds
+           ON SCHEDULE EVERY 10 SECOND
+           DO CALL ReleaseExpiredSeatMapHolds()""",
+    ]),
+
+    (4, 'Индексы под запросы моделей; функции AverageTicketPrice/OccupancyRate/TotalTicketsSold', [
+        # Билеты пользователя в профиле: WHERE User_user_id ORDER BY purchase_date DESC, ticket_id DESC
+        Index('Ticket', 'idx_ticket_user_purchase', ('User_user_id', 'purchase_date', 'ticket_id')),
+        # Соединение Ticket -> Performance и продажи по дням (analytics.py) без чтения строк таблицы
+        Index('Ticket', 'idx_ticket_performance_purchase', ('Performance_performance_id', 'purchase_date')),
+        # Представления пьесы по дате и соединение Performance -> Play
+        Index('Performance', 'idx_performance_play_date', ('Play_play_id', 'date_time')),
+        # Общий список представлений: ORDER BY date_time, performance_id и курсор страницы
+        Index('Performance', 'idx_performance_date', ('date_time', 'performance_id')),
+        # Отзывы: ORDER BY date_posted DESC, review_id DESC и курсор страницы
+        Index('Review', 'idx_review_date', ('date_posted', 'review_id')),
+        # Отзывы пользователя в профиле
+        Index('Review', 'idx_review_user_date', ('User_user_id', 'date_posted')),
+        # Вход по имени; в старых базах UNIQUE на username мог отсутствовать
+        Index('User', 'idx_user_username', ('username',)),
+
+        "DROP FUNCTION IF EXISTS AverageTicketPrice",
+        """CREATE FUNCTION AverageTicketPrice(p_play_id INT) RETURNS DECIMAL(10, 2)
+           READS SQL DATA
+           RETURN (SELECT revenue / NULLIF(tickets_sold, 0) FROM PlaySales WHERE Play_play_id = p_play_id)""",
+        "DROP FUNCTION IF EXISTS OccupancyRate",
+        """CREATE FUNCTION OccupancyRate(p_performance_id INT) RETURNS DECIMAL(5, 2)
+           READS SQL DATA
+           RETURN (SELECT 100 * COALESCE(s.seats_sold, 0) / NULLIF(COALESCE(s.seats_sold, 0) + p.available_seats, 0)
+                     FROM Performance p
+                     LEFT JOIN PerformanceSales s ON s.Performance_performance_id = p.performance_id
+                    WHERE p.performance_id = p_performance_id)""",
+        "DROP FUNCTION IF EXISTS TotalTicketsSold",
+        """CREATE FUNCTION TotalTicketsSold(p_play_id INT) RETURNS INT
+           READS SQL DATA
+           RETURN COALESCE((SELECT tickets_sold FROM PlaySales WHERE Play_play_id = p_play_id), 0)""",
+    ]),
+]
+
+
+def _index_exists(cursor, table, name):
+    cursor.execute("""SELECT 1 FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1""",
+                   (table, name))
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, name):
+    cursor.execute("""SELECT 1 FROM information_schema.COLUMNS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s LIMIT 1""",
+                   (table, name))
+    return cursor.fetchone() is not None
+
+
+def _routine_exists(cursor, kind, name):
+    cursor.execute("""SELECT 1 FROM information_schema.ROUTINES
+                      WHERE ROUTINE_SCHEMA = DATABASE() AND ROUTINE_TYPE = %s AND ROUTINE_NAME = %s LIMIT 1""",
+                   (kind, name))
+    return cursor.fetchone() is not None
+
+
+def _apply(cursor, statement):
+    if isinstance(statement, Index):
+        if not _index_exists(cursor, statement.table, statement.name):
+            cursor.execute(f"ALTER TABLE {statement.table} ADD INDEX {statement.name} ({', '.join(statement.columns)})")
+    elif isinstance(statement, Column):
+        if not _column_exists(cursor, statement.table, statement.name):
+            cursor.execute(f"ALTER TABLE {statement.table} ADD COLUMN {statement.name} {statement.definition}")
+    elif isinstance(statement, Routine):
+        if not _routine_exists(cursor, statement.kind, statement.name):
+            cursor.execute(statement.definition)
+    else:
+        cursor.execute(statement)
+
+
+def declared_indexes():
+    return [statement for _, _, statements in MIGRATIONS for statement in statements if isinstance(statement, Index)]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    cursor.execute("""CREATE TABLE IF NOT EXISTS SchemaVersion (
+                          version INT PRIMARY KEY,
+                          description VARCHAR(255) NOT NULL,
+                          applied_at DATETIME NOT NULL
+                      )""")
+    cursor.execute("SELECT version FROM SchemaVersion")
+    applied = {row[0] for row in cursor.fetchall()}
+
+    done = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        for statement in statements:
+            _apply(cursor, statement)
+        cursor.execute("INSERT INTO SchemaVersion (version, description, applied_at) VALUES (%s, %s, NOW())",
+                       (version, description))
+        conn.commit()
+        done.append((version, description))
+    cursor.close()
+    return done
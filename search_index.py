@@ -0,0 +1,263 @@
+# search_index.py
+# Инвертированный индекс по пьесам для /search: термы из названия, жанра и описания,
+# префиксный поиск по отсортированному словарю и поиск с опечатками по триграммам
+# термов. Живёт в памяти процесса, строится из PlayModel и обновляется его методами записи.
+import bisect
+import heapq
+import re
+import threading
+import time
+
+_TOKEN_RE = re.compile(r'\w+')
+
+FIELD_WEIGHTS = {'title': 3.0, 'genre': 2.0, 'description': 1.0}
+PREFIX_SIMILARITY = 0.9       # вес совпадения по префиксу относительно точного
+FUZZY_SIMILARITY = 0.8        # множитель для совпадения с опечаткой
+FUZZY_MIN_DICE = 0.5          # минимальное сходство триграмм для опечатки
+MAX_EXPANSIONS = 64           # сколько термов максимум подставлять вместо одного слова запроса
+
+
+def normalize(text):
+    # casefold корректно приводит и кириллицу; ё и е пользователи не различают
+    return (text or '').casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(term):
+    padded = f'^{term}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}            # play_id -> строка Play
+        self._doc_terms = {}       # play_id -> {терм: вес}
+        self._postings = {}        # терм -> {play_id: вес}, вес = сумма весов полей
+        self._genre_postings = {}  # терм -> {play_id}, только поле genre
+        self._vocab = []           # отсортированный список термов для префиксов
+        self._grams = {}           # триграмма -> {терм}
+        self._tiers = {}           # терм -> [(вес, [play_id по возрастанию])] по убыванию веса
+        self._genre_tiers = {}     # терм жанра -> [play_id по возрастанию]
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(row)
+            for term in self._postings:
+                self._term_tiers(term)
+            self.built_at = time.monotonic()
+
+    def add(self, row):
+        with self._lock:
+            self._remove(row['play_id'])
+            self._add(row)
+
+    def remove(self, play_id):
+        with self._lock:
+            self._remove(play_id)
+
+    def _add(self, row):
+        play_id = row['play_id']
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in set(tokenize(row.get(field))):
+                weights[term] = weights.get(term, 0.0) + weight
+        genre_terms = set(tokenize(row.get('genre')))
+
+        self._docs[play_id] = row
+        self._doc_terms[play_id] = weights
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[play_id] = weight
+            self._tiers.pop(term, None)
+        for term in genre_terms:
+            self._genre_postings.setdefault(term, set()).add(play_id)
+            self._genre_tiers.pop(term, None)
+
+    def _remove(self, play_id):
+        if self._docs.pop(play_id, None) is None:
+            return
+        for term in self._doc_terms.pop(play_id):
+            postings = self._postings[term]
+            del postings[play_id]
+            self._tiers.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+            genre = self._genre_postings.get(term)
+            if genre is not None:
+                genre.discard(play_id)
+                self._genre_tiers.pop(term, None)
+                if not genre:
+                    del self._genre_postings[term]
+
+    def _add_term(self, term):
+        bisect.insort(self._vocab, term)
+        for gram in trigrams(term):
+            self._grams.setdefault(gram, set()).add(term)
+
+    def _remove_term(self, term):
+        i = bisect.bisect_left(self._vocab, term)
+        if i < len(self._vocab) and self._vocab[i] == term:
+            del self._vocab[i]
+        for gram in trigrams(term):
+            terms = self._grams.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._grams[gram]
+
+    def _expand(self, token):
+        # Термы словаря, подходящие под слово запроса, со степенью сходства
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        if len(token) >= 2:
+            i = bisect.bisect_left(self._vocab, token)
+            while i < len(self._vocab) and len(matches) < MAX_EXPANSIONS:
+                term = self._vocab[i]
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX_SIMILARITY)
+                i += 1
+        if not matches and len(token) >= 3:
+            grams = trigrams(token)
+            shared = {}
+            for gram in grams:
+                for term in self._grams.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            candidates = []
+            for term, count in shared.items():
+                dice = 2.0 * count / (len(grams) + len(term) + 1)  # у терма len+1 триграмм
+                if dice >= FUZZY_MIN_DICE:
+                    candidates.append((dice, term))
+            for dice, term in heapq.nlargest(MAX_EXPANSIONS, candidates):
+                matches[term] = dice * FUZZY_SIMILARITY
+        return matches
+
+    def _term_tiers(self, term):
+        # Постинги, сгруппированные по весу: лучшие документы терма берутся без полного обхода
+        tiers = self._tiers.get(term)
+        if tiers is None:
+            groups = {}
+            for play_id, weight in self._postings[term].items():
+                groups.setdefault(weight, []).append(play_id)
+            tiers = self._tiers[term] = [(weight, sorted(groups[weight])) for weight in sorted(groups, reverse=True)]
+        return tiers
+
+    def _groups(self, matches):
+        # Группы документов с одинаковой оценкой, по убыванию оценки; внутри группы -
+        # списки play_id по возрастанию от разных термов
+        scored = []
+        for term, similarity in matches.items():
+            for weight, play_ids in self._term_tiers(term):
+                scored.append((similarity * weight, play_ids))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        groups = []
+        for score, play_ids in scored:
+            if groups and groups[-1][0] == score:
+                groups[-1][1].append(play_ids)
+            else:
+                groups.append((score, [play_ids]))
+        return groups
+
+    def _best_score(self, matches, play_id):
+        best = 0.0
+        for term, similarity in matches.items():
+            weight = self._postings[term].get(play_id)
+            if weight is not None and similarity * weight > best:
+                best = similarity * weight
+        return best
+
+    def _genre_sorted(self, term):
+        play_ids = self._genre_tiers.get(term)
+        if play_ids is None:
+            play_ids = self._genre_tiers[term] = sorted(self._genre_postings[term])
+        return play_ids
+
+    def _in_genre(self, genre_matches, play_id):
+        for terms in genre_matches:
+            if not any(play_id in self._genre_postings[term] for term in terms):
+                return False
+        return True
+
+    def search(self, keyword='', genre='', limit=None):
+        keyword_tokens = tokenize(keyword)
+        genre_tokens = tokenize(genre)
+        if not keyword_tokens and not genre_tokens:
+            return []
+
+        with self._lock:
+            genre_matches = [[term for term in self._expand(token) if term in self._genre_postings]
+                             for token in genre_tokens]
+            if not all(genre_matches):
+                return []
+
+            if not keyword_tokens:
+                # Только жанр: все совпадения равнозначны, порядок по play_id
+                ranked = []
+                merged = heapq.merge(*(self._genre_sorted(term) for term in genre_matches[0]))
+                for play_id in merged:
+                    if (not ranked or ranked[-1] != play_id) and self._in_genre(genre_matches, play_id):
+                        ranked.append(play_id)
+                        if len(ranked) == limit:
+                            break
+                return [self._docs[play_id] for play_id in ranked]
+
+            token_matches = [self._expand(token) for token in keyword_tokens]
+            if not all(token_matches):
+                return []
+
+            # Все слова запроса должны совпасть (AND), оценки складываются. Документы
+            # перебираются по убыванию оценки самого редкого слова; остальные слова
+            # проверяются точечно. Перебор останавливается, когда ни один следующий
+            # документ уже не может попасть в первые limit (алгоритм с порогом).
+            token_matches.sort(key=lambda matches: sum(len(self._postings[term]) for term in matches))
+            driver, others = token_matches[0], token_matches[1:]
+            others_max = sum(max(similarity * self._term_tiers(term)[0][0] for term, similarity in matches.items())
+                             for matches in others)
+
+            # top - куча из limit лучших (оценка, -play_id); top[0] - худший из них
+            top, seen = [], set()
+            for score, lists in self._groups(driver):
+                if limit and len(top) == limit and top[0][0] >= score + others_max:
+                    break
+                for play_id in heapq.merge(*lists):
+                    if play_id in seen:
+                        continue
+                    seen.add(play_id)
+                    if genre_matches and not self._in_genre(genre_matches, play_id):
+                        continue
+                    total = score
+                    for matches in others:
+                        best = self._best_score(matches, play_id)
+                        if not best:
+                            break
+                        total += best
+                    else:
+                        if not limit:
+                            top.append((total, -play_id))
+                        elif len(top) < limit:
+                            heapq.heappush(top, (total, -play_id))
+                        elif (total, -play_id) > top[0]:
+                            heapq.heapreplace(top, (total, -play_id))
+                        if limit and len(top) == limit and top[0][0] >= score + others_max:
+                            break
+
+            top.sort(reverse=True)
+            return [self._docs[-play_id] for _, play_id in top]
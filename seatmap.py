@@ -0,0 +1,355 @@
+# seatmap.py
+# Схема зала представления: ряды, места и ценовые зоны. Занятость хранится битовыми
+# картами (SeatMap.sold / SeatMap.held), в Python - как целое число, где бит i - место i
+# в порядке рядов. Поиск N соседних свободных мест в зоне сводится к нескольким
+# операциям над этим числом и не зависит от того, сколько мест уже занято.
+#
+# layout = {
+#     'zones': {'Партер': '1500.00', 'Балкон': '500.00'},
+#     'rows': [{'label': '1', 'seats': 30, 'zone': 'Партер'}, ...],
+# }
+# Ряды перечислены в порядке предпочтения: лучший блок - в самом раннем ряду зоны,
+# где он помещается, и как можно ближе к центру ряда.
+import json
+import threading
+from decimal import Decimal
+
+from db import get_db
+
+HOLD_TTL_SECONDS = 600
+MAX_BLOCK = 10                # больше мест одним блоком не продаём
+
+
+class SeatMapError(Exception):
+    pass
+
+
+class NoSeatsError(SeatMapError):
+    pass
+
+
+class SeatHoldNotFoundError(SeatMapError):
+    pass
+
+
+def runs_of(free, n):
+    # Бит p результата установлен, если свободны места p..p+n-1. Сдвиги удваиваются,
+    # поэтому для блока из n мест нужно ~log2(n) операций над целым числом
+    covered = 1
+    while covered < n:
+        step = min(covered, n - covered)
+        free &= free >> step
+        covered += step
+    return free
+
+
+def lowest_bit(x):
+    return (x & -x).bit_length() - 1
+
+
+class SeatLayout:
+    def __init__(self, layout):
+        self.layout = layout
+        self.zones = {name: Decimal(str(price)) for name, price in layout['zones'].items()}
+        self.rows = []            # (label, offset, seats, zone)
+        self.zone_rows = {}       # zone -> [индексы рядов в порядке предпочтения]
+        self.zone_masks = {}
+        offset = 0
+        for i, row in enumerate(layout['rows']):
+            if row['zone'] not in self.zones:
+                raise SeatMapError(f"Ряд {row['label']}: неизвестная зона {row['zone']}")
+            self.rows.append((str(row['label']), offset, row['seats'], row['zone']))
+            self.zone_rows.setdefault(row['zone'], []).append(i)
+            self.zone_masks[row['zone']] = self.zone_masks.get(row['zone'], 0) | (((1 << row['seats']) - 1) << offset)
+            offset += row['seats']
+        self.total = offset
+        self.full_mask = (1 << self.total) - 1
+        self.nbytes = (self.total + 7) // 8
+        self._starts = {}         # (zone, n) -> маска допустимых начал блока (блок не переходит на другой ряд)
+        self._lock = threading.Lock()
+
+    def encode(self, bits):
+        return bits.to_bytes(self.nbytes, 'little')
+
+    def decode(self, data):
+        return int.from_bytes(data or b'', 'little')
+
+    def _valid_starts(self, zone, n):
+        key = (zone, n)
+        mask = self._starts.get(key)
+        if mask is None:
+            mask = 0
+            for i in self.zone_rows.get(zone, ()):
+                _, offset, seats, _ = self.rows[i]
+                if seats >= n:
+                    mask |= ((1 << (seats - n + 1)) - 1) << offset
+            with self._lock:
+                self._starts[key] = mask
+        return mask
+
+    def find_block(self, taken, zone, n):
+        # Первое место лучшего блока из n соседних свободных мест зоны или None
+        if zone not in self.zones or not 1 <= n <= MAX_BLOCK:
+            return None
+        starts = runs_of(~taken & self.zone_masks[zone], n) & self._valid_starts(zone, n)
+        if not starts:
+            return None
+        for i in self.zone_rows[zone]:
+            _, offset, seats, _ = self.rows[i]
+            if seats < n:
+                continue
+            row_starts = (starts >> offset) & ((1 << (seats - n + 1)) - 1)
+            if not row_starts:
+                continue
+            # Ближайшее к центру ряда начало блока: лучшее слева и лучшее справа от центра
+            center = (seats - n) // 2
+            left = row_starts & ((1 << (center + 1)) - 1)
+            right = row_starts >> center
+            candidates = []
+            if left:
+                candidates.append(left.bit_length() - 1)
+            if right:
+                candidates.append(center + lowest_bit(right))
+            return offset + min(candidates, key=lambda start: abs(start - center))
+        return None
+
+    def block_bits(self, start, n):
+        return ((1 << n) - 1) << start
+
+    def seat(self, index):
+        # (ряд, номер места в ряду с 1, зона)
+        for label, offset, seats, zone in self.rows:
+            if offset <= index < offset + seats:
+                return label, index - offset + 1, zone
+        raise SeatMapError(f'Места {index} нет в схеме зала')
+
+    def free_by_zone(self, taken):
+        return {zone: bin(mask & ~taken).count('1') for zone, mask in self.zone_masks.items()}
+
+    def grid(self, sold, held):
+        # Ряды для шаблона: [(ряд, зона, [(номер, состояние)])]
+        result = []
+        for label, offset, seats, zone in self.rows:
+            row_sold = sold >> offset
+            row_held = held >> offset
+            states = []
+            for i in range(seats):
+                bit = 1 << i
+                states.append((i + 1, 'sold' if row_sold & bit else 'held' if row_held & bit else 'free'))
+            result.append((label, zone, states))
+        return result
+
+
+def make_layout(rows, seats, zones):
+    # zones: [(имя, первый ряд, последний ряд, цена)], ряды нумеруются с 1
+    layout = {'zones': {}, 'rows': []}
+    zone_of = {}
+    for name, first, last, price in zones:
+        layout['zones'][name] = str(price)
+        for row in range(first, last + 1):
+            zone_of[row] = name
+    for row in range(1, rows + 1):
+        if row not in zone_of:
+            raise SeatMapError(f'Ряд {row} не входит ни в одну зону')
+        layout['rows'].append({'label': str(row), 'seats': seats, 'zone': zone_of[row]})
+    return layout
+
+
+_layouts = {}                 # текст layout -> SeatLayout; схема зала не меняется после создания
+_layouts_lock = threading.Lock()
+
+
+def _layout(raw):
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode('utf-8')
+    layout = _layouts.get(raw)
+    if layout is None:
+        layout = SeatLayout(json.loads(raw))
+        with _layouts_lock:
+            _layouts[raw] = layout
+    return layout
+
+
+class SeatMapModel:
+    @staticmethod
+    def create(performance_id, layout):
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Ticket WHERE Performance_performance_id=%s", (performance_id,))
+        if cursor.fetchone()[0]:
+            raise SeatMapError('На представление уже проданы билеты без мест - схему зала не создать')
+        seat_layout = SeatLayout(layout)
+        query = """INSERT INTO SeatMap (Performance_performance_id, layout, sold, held) VALUES (%s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE layout=VALUES(layout), sold=VALUES(sold), held=VALUES(held)"""
+        cursor.execute(query, (performance_id, json.dumps(layout, ensure_ascii=False),
+                               seat_layout.encode(0), seat_layout.encode(0)))
+        cursor.execute("DELETE FROM SeatMapHold WHERE Performance_performance_id=%s", (performance_id,))
+        cursor.execute("UPDATE Performance SET available_seats=%s WHERE performance_id=%s",
+                       (seat_layout.total, performance_id))
+        db.commit()
+        return seat_layout
+
+    @staticmethod
+    def get(performance_id):
+        # {'layout': SeatLayout, 'sold': int, 'held': int, 'free': {зона: свободно}} или None,
+        # если схемы у представления нет
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT layout, sold, held FROM SeatMap WHERE Performance_performance_id=%s",
+                       (performance_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        layout = _layout(row['layout'])
+        sold, held = layout.decode(row['sold']), layout.decode(row['held'])
+        return {'layout': layout, 'sold': sold, 'held': held, 'free': layout.free_by_zone(sold | held)}
+
+    @staticmethod
+    def _lock(cursor, performance_id):
+        # Блокировка строки SeatMap - общая точка сериализации всех операций с местами
+        # представления; сначала всегда SeatMap, потом SeatMapHold
+        cursor.execute("""SELECT s.layout, s.sold, s.held, p.Play_play_id AS play_id
+                          FROM SeatMap s JOIN Performance p ON p.performance_id = s.Performance_performance_id
+                          WHERE s.Performance_performance_id=%s FOR UPDATE""", (performance_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise SeatMapError('У представления нет схемы зала')
+        layout = _layout(row['layout'])
+        return layout, layout.decode(row['sold']), layout.decode(row['held']), row['play_id']
+
+    @staticmethod
+    def _expire(cursor, performance_id, held):
+        # Истёкшие брони возвращают места; вызывается под блокировкой SeatMap
+        cursor.execute("""SELECT hold_id, seats FROM SeatMapHold
+                          WHERE Performance_performance_id=%s AND expires_at <= NOW() FOR UPDATE""",
+                       (performance_id,))
+        expired = cursor.fetchall()
+        freed = 0
+        for hold in expired:
+            for index in _seats(hold['seats']):
+                held &= ~(1 << index)
+                freed += 1
+        if expired:
+            placeholders = ', '.join(['%s'] * len(expired))
+            cursor.execute(f"DELETE FROM SeatMapHold WHERE hold_id IN ({placeholders})",
+                           tuple(hold['hold_id'] for hold in expired))
+        return held, freed
+
+    @staticmethod
+    def hold(performance_id, user_id, zone, quantity, ttl=HOLD_TTL_SECONDS):
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        try:
+            layout, sold, held, play_id = SeatMapModel._lock(cursor, performance_id)
+            held, freed = SeatMapModel._expire(cursor, performance_id, held)
+            start = layout.find_block(sold | held, zone, quantity)
+            if start is None:
+                # Освобождённые истёкшими бронями места всё равно нужно вернуть
+                SeatMapModel._save(cursor, performance_id, layout, sold, held, freed)
+                db.commit()
+                raise NoSeatsError(f'В зоне «{zone}» нет {quantity} свободных мест рядом')
+            seats = list(range(start, start + quantity))
+            held |= layout.block_bits(start, quantity)
+            # Срок - по часам MySQL: с ними сравнивают expires_at все проверки (NOW())
+            cursor.execute("""INSERT INTO SeatMapHold (Performance_performance_id, User_user_id, zone, seats, expires_at)
+                              VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)""",
+                           (performance_id, user_id, zone, ','.join(map(str, seats)), ttl))
+            hold_id = cursor.lastrowid
+            SeatMapModel._save(cursor, performance_id, layout, sold, held, freed - quantity)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return {'hold_id': hold_id, 'play_id': play_id, 'seats': [layout.seat(i) for i in seats],
+                'price': layout.zones[zone] * quantity}
+
+    @staticmethod
+    def get_hold(hold_id, user_id):
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""SELECT h.hold_id, h.Performance_performance_id AS performance_id, h.zone, h.seats,
+                                 h.expires_at, s.layout
+                          FROM SeatMapHold h JOIN SeatMap s ON s.Performance_performance_id = h.Performance_performance_id
+                          WHERE h.hold_id=%s AND h.User_user_id=%s AND h.expires_at > NOW()""", (hold_id, user_id))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        layout = _layout(row.pop('layout'))
+        seats = _seats(row['seats'])
+        row['seats'] = [layout.seat(i) for i in seats]
+        row['price'] = layout.zones[row['zone']] * len(seats)
+        return row
+
+    @staticmethod
+    def _locked_hold(cursor, hold_id, user_id):
+        cursor.execute("SELECT Performance_performance_id FROM SeatMapHold WHERE hold_id=%s AND User_user_id=%s",
+                       (hold_id, user_id))
+        row = cursor.fetchone()
+        if row is None:
+            raise SeatHoldNotFoundError('Бронь не найдена или её срок истёк')
+        performance_id = row['Performance_performance_id']
+        lock = SeatMapModel._lock(cursor, performance_id)
+        # Перечитываем под блокировкой: бронь могли подтвердить или снять параллельно
+        cursor.execute("""SELECT zone, seats, expires_at > NOW() AS active FROM SeatMapHold
+                          WHERE hold_id=%s AND User_user_id=%s FOR UPDATE""", (hold_id, user_id))
+        hold = cursor.fetchone()
+        if hold is None:
+            raise SeatHoldNotFoundError('Бронь не найдена или её срок истёк')
+        return performance_id, lock, hold
+
+    @staticmethod
+    def confirm(hold_id, user_id):
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        try:
+            performance_id, (layout, sold, held, play_id), hold = SeatMapModel._locked_hold(cursor, hold_id, user_id)
+            if not hold['active']:
+                raise SeatHoldNotFoundError('Срок брони истёк')
+            seats = _seats(hold['seats'])
+            price = layout.zones[hold['zone']]
+            for index in seats:
+                held &= ~(1 << index)
+                sold |= 1 << index
+            cursor.executemany("""INSERT INTO Ticket (Performance_performance_id, purchase_date, price, User_user_id,
+                                                      seat_index)
+                                  VALUES (%s, CURDATE(), %s, %s, %s)""",
+                               [(performance_id, price, user_id, index) for index in seats])
+            cursor.callproc('RecordSale', [performance_id, play_id, price, len(seats)])
+            cursor.execute("DELETE FROM SeatMapHold WHERE hold_id=%s", (hold_id,))
+            SeatMapModel._save(cursor, performance_id, layout, sold, held, 0)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return {'performance_id': performance_id, 'play_id': play_id, 'seats': [layout.seat(i) for i in seats],
+                'price': price * len(seats)}
+
+    @staticmethod
+    def release(hold_id, user_id):
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        try:
+            performance_id, (layout, sold, held, play_id), hold = SeatMapModel._locked_hold(cursor, hold_id, user_id)
+            seats = _seats(hold['seats'])
+            for index in seats:
+                held &= ~(1 << index)
+            cursor.execute("DELETE FROM SeatMapHold WHERE hold_id=%s", (hold_id,))
+            SeatMapModel._save(cursor, performance_id, layout, sold, held, len(seats))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return {'performance_id': performance_id, 'play_id': play_id}
+
+    @staticmethod
+    def _save(cursor, performance_id, layout, sold, held, seats_delta):
+        cursor.execute("UPDATE SeatMap SET sold=%s, held=%s WHERE Performance_performance_id=%s",
+                       (layout.encode(sold), layout.encode(held), performance_id))
+        # available_seats остаётся счётчиком свободных мест для списков и статистики
+        if seats_delta:
+            cursor.execute("UPDATE Performance SET available_seats = available_seats + %s WHERE performance_id=%s",
+                           (seats_delta, performance_id))
+
+
+def _seats(text):
+    return [int(index) for index in text.split(',') if index]
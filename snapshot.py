@@ -0,0 +1,344 @@
+# snapshot.py
+# Общий для всех воркеров снимок каталога: пьесы, представления и число свободных мест,
+# упакованные struct в один файл фиксированного формата. Воркеры отображают файл в память
+# (mmap, только чтение) и разбирают нужные записи прямо из отображения - страницы файла
+# одни на всю машину (page cache), и память на каталог не растёт с числом воркеров.
+# Снимок перестраивает один процесс: тот, кому досталась flock-блокировка SNAPSHOT_FILE.lock
+# (если он завершится, блокировку подхватит другой). Новый файл пишется рядом и
+# подменяется через os.replace, читатели переоткрывают его по смене inode.
+# В заголовке записаны версии 'play' и 'performance' (versions.py), по которым строился
+# снимок; если счётчики ушли вперёд, снимок не используется, и модели читают как раньше,
+# из кэша и БД, пока он не перестроится.
+#
+# Формат (little-endian): заголовок | пьесы | представления | индекс по id | индекс по
+# времени | строки UTF-8. Пьесы отсортированы по play_id, представления - по
+# (play_id, date_time, performance_id), индексы - номера представлений, упорядоченные
+# по performance_id и по (date_time, performance_id).
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_CHARSET
+from config import SNAPSHOT_ENABLED, SNAPSHOT_FILE, SNAPSHOT_POLL_INTERVAL, SNAPSHOT_MIN_INTERVAL
+from versions import versions
+
+try:
+    import fcntl
+except ImportError:  # Windows: без снимка, модели читают из кэша и БД
+    fcntl = None
+
+KEYS = ('play', 'performance')
+
+_MAGIC = b'TFC1'
+_HEADER = struct.Struct('<4sQQQdII')   # магия, эпоха versions, версии play и performance, время сборки, число пьес и представлений
+_PLAY = struct.Struct('<iiIIIIIIII')   # play_id, duration, title, description, genre (смещение, длина), первое представление, их число
+_PERFORMANCE = struct.Struct('<iiqIIiI')  # performance_id, play_id, date_time, venue (смещение, длина), available_seats, номер пьесы
+_INDEX = struct.Struct('<I')
+
+_NULL_INT = -2 ** 31                   # NULL в целом столбце
+_NULL_LENGTH = 0xFFFFFFFF              # NULL в строковом
+_EPOCH = datetime(1970, 1, 1)          # DATETIME хранится секундами от этой даты, без часового пояса
+
+
+def _seconds(value):
+    return (value - _EPOCH) // timedelta(seconds=1)
+
+
+class _Strings:
+    def __init__(self):
+        self.data = bytearray()
+        self._offsets = {}    # одинаковые строки (залы, жанры) хранятся один раз
+
+    def add(self, value):
+        if value is None:
+            return 0, _NULL_LENGTH
+        encoded = value.encode('utf-8')
+        offset = self._offsets.get(encoded)
+        if offset is None:
+            offset = self._offsets[encoded] = len(self.data)
+            self.data += encoded
+        return offset, len(encoded)
+
+
+def build(plays, performances, epoch=0, play_version=0, performance_version=0):
+    # plays: play_id, title, description, genre, duration;
+    # performances: performance_id, play_id, date_time, venue, available_seats
+    plays = sorted(plays, key=lambda play: play['play_id'])
+    play_index = {play['play_id']: i for i, play in enumerate(plays)}
+    performances = sorted((perf for perf in performances if perf['play_id'] in play_index),
+                          key=lambda perf: (perf['play_id'], perf['date_time'], perf['performance_id']))
+    ranges = {}
+    for i, perf in enumerate(performances):
+        first, count = ranges.get(perf['play_id'], (i, 0))
+        ranges[perf['play_id']] = (first, count + 1)
+
+    strings = _Strings()
+    out = bytearray(_HEADER.pack(_MAGIC, epoch, play_version, performance_version, time.time(),
+                                 len(plays), len(performances)))
+    for play in plays:
+        first, count = ranges.get(play['play_id'], (0, 0))
+        out += _PLAY.pack(play['play_id'], _NULL_INT if play['duration'] is None else play['duration'],
+                          *strings.add(play['title']), *strings.add(play['description']),
+                          *strings.add(play['genre']), first, count)
+    seconds = [_seconds(perf['date_time']) for perf in performances]
+    for perf, at in zip(performances, seconds):
+        out += _PERFORMANCE.pack(perf['performance_id'], perf['play_id'], at,
+                                 *strings.add(perf['venue']), perf['available_seats'], play_index[perf['play_id']])
+    ids = [perf['performance_id'] for perf in performances]
+    order = range(len(performances))
+    for key in (ids.__getitem__, lambda i: (seconds[i], ids[i])):
+        out += struct.pack(f'<{len(ids)}I', *sorted(order, key=key))
+    return bytes(out + strings.data)
+
+
+class SnapshotView:
+    # Разбор записей прямо из отображённого файла; словари создаются только для запрошенных строк
+    def __init__(self, buf, inode=None):
+        self.buf = buf
+        self.inode = inode
+        magic, self.epoch, self.play_version, self.performance_version, self.built_at, \
+            self.n_plays, self.n_performances = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('Файл не является снимком каталога')
+        self._plays = _HEADER.size
+        self._performances = self._plays + self.n_plays * _PLAY.size
+        self._by_id = self._performances + self.n_performances * _PERFORMANCE.size
+        self._by_date = self._by_id + self.n_performances * _INDEX.size
+        self._strings = self._by_date + self.n_performances * _INDEX.size
+
+    def fresh(self, epoch, slots):
+        return (self.epoch == epoch and self.play_version == slots['play'][0]
+                and self.performance_version == slots['performance'][0])
+
+    def _string(self, offset, length):
+        if length == _NULL_LENGTH:
+            return None
+        start = self._strings + offset
+        return str(self.buf[start:start + length], 'utf-8')
+
+    def _play_record(self, i):
+        return _PLAY.unpack_from(self.buf, self._plays + i * _PLAY.size)
+
+    def _play(self, i):
+        play_id, duration, title_at, title_len, description_at, description_len, genre_at, genre_len, _, _ = \
+            self._play_record(i)
+        return {'play_id': play_id, 'title': self._string(title_at, title_len),
+                'description': self._string(description_at, description_len),
+                'genre': self._string(genre_at, genre_len), 'duration': None if duration == _NULL_INT else duration}
+
+    def _performance_record(self, i):
+        return _PERFORMANCE.unpack_from(self.buf, self._performances + i * _PERFORMANCE.size)
+
+    def _performance(self, i):
+        performance_id, play_id, seconds, venue_at, venue_len, available_seats, play = self._performance_record(i)
+        _, _, title_at, title_len = self._play_record(play)[:4]
+        return {'performance_id': performance_id, 'play_id': play_id,
+                'date_time': _EPOCH + timedelta(seconds=seconds), 'venue': self._string(venue_at, venue_len),
+                'available_seats': available_seats, 'title': self._string(title_at, title_len)}
+
+    def _indexed(self, base, j):
+        return _INDEX.unpack_from(self.buf, base + j * _INDEX.size)[0]
+
+    @staticmethod
+    def _bisect(n, key_at, key):
+        # Первая позиция, ключ которой больше key
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find_play(self, play_id):
+        i = self._bisect(self.n_plays, lambda i: self._play_record(i)[0], play_id) - 1
+        return i if i >= 0 and self._play_record(i)[0] == play_id else None
+
+    def plays(self, after=None, limit=None):
+        # Как PlayModel._load_all_plays: по play_id, after = (play_id,) последней строки
+        start = self._bisect(self.n_plays, lambda i: self._play_record(i)[0], after[0]) if after else 0
+        stop = min(self.n_plays, start + limit) if limit else self.n_plays
+        return [self._play(i) for i in range(start, stop)]
+
+    def play(self, play_id):
+        i = self._find_play(play_id)
+        return None if i is None else self._play(i)
+
+    def performances_by_play(self, play_id):
+        i = self._find_play(play_id)
+        if i is None:
+            return []
+        first, count = self._play_record(i)[8:]
+        return [self._performance(j) for j in range(first, first + count)]
+
+    def performance(self, performance_id):
+        def key_at(j):
+            return self._performance_record(self._indexed(self._by_id, j))[0]
+        j = self._bisect(self.n_performances, key_at, performance_id) - 1
+        if j < 0 or key_at(j) != performance_id:
+            return None
+        return self._performance(self._indexed(self._by_id, j))
+
+    def performances(self, after=None, limit=None):
+        # Как PerformanceModel.get_all_performances: по (date_time, performance_id)
+        start = 0
+        if after:
+            def key_at(j):
+                record = self._performance_record(self._indexed(self._by_date, j))
+                return record[2], record[0]
+            start = self._bisect(self.n_performances, key_at, (_seconds(after[0]), after[1]))
+        stop = min(self.n_performances, start + limit) if limit else self.n_performances
+        return [self._performance(self._indexed(self._by_date, j)) for j in range(start, stop)]
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self._view = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._leader_fd = None
+        self._built_at = 0.0
+        self._wake = threading.Event()
+        self._stats = {'served': 0, 'stale': 0, 'reopened': 0, 'rebuilds': 0, 'failed_rebuilds': 0,
+                       'last_build_ms': 0.0}
+
+    def view(self):
+        # Снимок, совпадающий с текущими версиями каталога, или None - тогда читать из БД
+        if not SNAPSHOT_ENABLED or fcntl is None:
+            return None
+        self._ensure_started()
+        epoch, slots = versions.snapshot(KEYS)
+        view = self._view
+        if view is None or not view.fresh(epoch, slots):
+            view = self._reopen()
+            if view is None or not view.fresh(epoch, slots):
+                self._count('stale')
+                self._wake.set()
+                return None
+        self._count('served')
+        return view
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _ensure_started(self):
+        # Поток-обновитель - в каждом процессе (после fork потоки не наследуются), но
+        # снимок строит только держатель блокировки
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._leader_fd is not None:
+                # Унаследованный от родителя дескриптор: блокировка принадлежит не нам
+                os.close(self._leader_fd)
+                self._leader_fd = None
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='catalog-snapshot', daemon=True).start()
+
+    def _reopen(self):
+        # Файл подменили (другой inode) - отображаем новый; старое отображение освободится,
+        # когда его перестанут читать
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        view = self._view
+        if view is not None and view.inode == st.st_ino:
+            return view
+        try:
+            with open(self.path, 'rb') as f:
+                view = SnapshotView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), st.st_ino)
+        except (OSError, ValueError, struct.error):
+            return None
+        self._view = view
+        self._count('reopened')
+        return view
+
+    def _lead(self):
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(SNAPSHOT_POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                if self._lead():
+                    self._refresh()
+            except Exception:
+                # БД недоступна и т.п. - модели читают мимо снимка, попробуем на следующем круге
+                self._count('failed_rebuilds')
+                time.sleep(SNAPSHOT_POLL_INTERVAL)
+
+    def _refresh(self):
+        epoch, slots = versions.snapshot(KEYS)
+        view = self._reopen()
+        if view is not None and view.fresh(epoch, slots):
+            return
+        # Во время распродажи версии растут с каждой покупкой - перестраиваем не чаще SNAPSHOT_MIN_INTERVAL
+        wait = self._built_at + SNAPSHOT_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+            epoch, slots = versions.snapshot(KEYS)
+        self.rebuild(epoch, slots)
+
+    def rebuild(self, epoch, slots):
+        # Версии прочитаны до выборки: запись, попавшая между ними, сделает снимок устаревшим
+        # сразу, а не спрячет изменение
+        started = time.perf_counter()
+        plays, performances = self._load()
+        data = build(plays, performances, epoch, slots['play'][0], slots['performance'][0])
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        self._built_at = time.monotonic()
+        self._reopen()
+        with self._lock:
+            self._stats['rebuilds'] += 1
+            self._stats['last_build_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    @staticmethod
+    def _load():
+        # С первичного сервера и на своём соединении: поток работает вне запросов и пула
+        conn = mysql.connector.connect(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD,
+                                       database=MYSQL_DB, charset=MYSQL_CHARSET)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT play_id, title, description, genre, duration FROM Play")
+            plays = cursor.fetchall()
+            cursor.execute("""SELECT performance_id, Play_play_id AS play_id, date_time, venue, available_seats
+                              FROM Performance""")
+            performances = cursor.fetchall()
+            return plays, performances
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, leader=self._leader_fd is not None)
+        view = self._view
+        if view is not None:
+            stats.update(plays=view.n_plays, performances=view.n_performances, size=len(view.buf),
+                         age=round(time.time() - view.built_at, 1))
+        return stats
+
+
+catalog_snapshot = CatalogSnapshot(os.path.join(os.path.dirname(os.path.abspath(__file__)), SNAPSHOT_FILE))
@@ -0,0 +1,147 @@
+# stats.py
+# Сводная статистика продаж для /admin/statistics: средняя цена и число проданных
+# билетов по каждой пьесе и занятость по каждому представлению считаются двумя
+# запросами, сколько бы пьес ни было. Без фильтра по датам данные берутся из
+# агрегатов PlaySales/PerformanceSales, с фильтром - считаются по билетам.
+from cache import TTLCache
+from config import STATS_CACHE_TTL
+from db import get_db, get_read_db
+
+stats_cache = TTLCache(maxsize=64, ttl=STATS_CACHE_TTL)
+
+
+def _date_condition(date_from, date_to, params):
+    # Условие для билетов в выбранном периоде (подставляется в SUM/CASE)
+    condition = "t.ticket_id IS NOT NULL"
+    if date_from:
+        condition += " AND t.purchase_date >= %s"
+        params.append(date_from)
+    if date_to:
+        condition += " AND t.purchase_date <= %s"
+        params.append(date_to)
+    return condition
+
+
+def get_dashboard(date_from=None, date_to=None):
+    return stats_cache.get_or_load(('dashboard', date_from, date_to),
+                                   lambda: _load_dashboard(date_from, date_to))
+
+
+def _load_dashboard(date_from, date_to):
+    # Сводка только читает - её можно считать на реплике
+    db = get_read_db()
+    cursor = db.cursor(dictionary=True)
+    if date_from or date_to:
+        plays, performances = _load_from_tickets(cursor, date_from, date_to)
+    else:
+        plays, performances = _load_from_aggregates(cursor)
+    cursor.close()
+
+    by_play = {}
+    for perf in performances:
+        perf['tickets_sold'] = int(perf['tickets_sold'] or 0)
+        capacity = perf['tickets_total'] + perf['available_seats']
+        perf['occupancy_rate'] = 100.0 * perf['tickets_sold'] / capacity if capacity else None
+        by_play.setdefault(perf['play_id'], []).append(perf)
+
+    for play in plays:
+        play['tickets_sold'] = int(play['tickets_sold'] or 0)
+        play['revenue'] = play['revenue'] or 0
+        play['average_price'] = play['revenue'] / play['tickets_sold'] if play['tickets_sold'] else None
+        play['performances'] = by_play.get(play['play_id'], [])
+    return plays
+
+
+def _load_from_aggregates(cursor):
+    query = """SELECT pl.play_id, pl.title,
+                      COALESCE(s.tickets_sold, 0) AS tickets_sold, COALESCE(s.revenue, 0) AS revenue
+               FROM Play pl
+               LEFT JOIN PlaySales s ON s.Play_play_id = pl.play_id
+               ORDER BY pl.title, pl.play_id"""
+    cursor.execute(query)
+    plays = cursor.fetchall()
+
+    query = """SELECT p.performance_id, p.Play_play_id AS play_id, p.date_time, p.venue, p.available_seats,
+                      COALESCE(s.seats_sold, 0) AS tickets_sold, COALESCE(s.seats_sold, 0) AS tickets_total
+               FROM Performance p
+               LEFT JOIN PerformanceSales s ON s.Performance_performance_id = p.performance_id
+               ORDER BY p.date_time, p.performance_id"""
+    cursor.execute(query)
+    return plays, cursor.fetchall()
+
+
+def _load_from_tickets(cursor, date_from, date_to):
+    params = []
+    in_period = _date_condition(date_from, date_to, params)
+    query = f"""SELECT pl.play_id, pl.title,
+                       SUM(CASE WHEN {in_period} THEN 1 ELSE 0 END) AS tickets_sold,
+                       SUM(CASE WHEN {in_period} THEN t.price ELSE 0 END) AS revenue
+                FROM Play pl
+                LEFT JOIN Performance p ON p.Play_play_id = pl.play_id
+                LEFT JOIN Ticket t ON t.Performance_performance_id = p.performance_id
+                GROUP BY pl.play_id, pl.title
+                ORDER BY pl.title, pl.play_id"""
+    cursor.execute(query, tuple(params))
+    plays = cursor.fetchall()
+
+    params = []
+    in_period = _date_condition(date_from, date_to, params)
+    # Вместимость = все проданные билеты + оставшиеся места, независимо от периода
+    query = f"""SELECT p.performance_id, p.Play_play_id AS play_id, p.date_time, p.venue, p.available_seats,
+                       SUM(CASE WHEN {in_period} THEN 1 ELSE 0 END) AS tickets_sold,
+                       COUNT(t.ticket_id) AS tickets_total
+                FROM Performance p
+                LEFT JOIN Ticket t ON t.Performance_performance_id = p.performance_id
+                GROUP BY p.performance_id, p.Play_play_id, p.date_time, p.venue, p.available_seats
+                ORDER BY p.date_time, p.performance_id"""
+    cursor.execute(query, tuple(params))
+    return plays, cursor.fetchall()
+
+
+# --- Сверка агрегатов с билетами ---
+
+_SALES_FIELDS = ('tickets_sold', 'seats_sold', 'revenue', 'min_price', 'max_price')
+
+_SALES_SOURCES = (
+    ('PerformanceSales', 'Performance_performance_id',
+     """SELECT t.Performance_performance_id AS id, COUNT(*) AS tickets_sold, COUNT(*) AS seats_sold,
+               SUM(t.price) AS revenue, MIN(t.price) AS min_price, MAX(t.price) AS max_price
+        FROM Ticket t
+        GROUP BY t.Performance_performance_id"""),
+    ('PlaySales', 'Play_play_id',
+     """SELECT p.Play_play_id AS id, COUNT(*) AS tickets_sold, COUNT(*) AS seats_sold,
+               SUM(t.price) AS revenue, MIN(t.price) AS min_price, MAX(t.price) AS max_price
+        FROM Ticket t
+        JOIN Performance p ON t.Performance_performance_id = p.performance_id
+        GROUP BY p.Play_play_id"""),
+)
+
+
+def reconcile_sales(fix=False):
+    # Возвращает расхождения (таблица, id, поле, по билетам, в агрегате);
+    # с fix=True агрегаты пересчитываются заново в одной транзакции
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    mismatches = []
+    for table, key, source in _SALES_SOURCES:
+        cursor.execute(source)
+        expected = {row['id']: row for row in cursor.fetchall()}
+        cursor.execute(f"SELECT {key} AS id, {', '.join(_SALES_FIELDS)} FROM {table}")
+        actual = {row['id']: row for row in cursor.fetchall()}
+        for row_id in sorted(expected.keys() | actual.keys()):
+            # Строка агрегата без билетов равнозначна отсутствию строки
+            want = expected.get(row_id) or dict.fromkeys(_SALES_FIELDS, None)
+            have = actual.get(row_id) or dict.fromkeys(_SALES_FIELDS, None)
+            for field in _SALES_FIELDS:
+                if (want[field] or 0) != (have[field] or 0):
+                    mismatches.append((table, row_id, field, want[field], have[field]))
+
+    if fix and mismatches:
+        for table, key, source in _SALES_SOURCES:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(f"INSERT INTO {table} ({key}, {', '.join(_SALES_FIELDS)}) "
+                           f"SELECT id, {', '.join(_SALES_FIELDS)} FROM ({source}) AS src")
+        db.commit()
+        stats_cache.clear()
+    cursor.close()
+    return mismatches
@@ -0,0 +1,123 @@
+# tests/conftest.py
+# Тесты, которым нужна MySQL, работают на одноразовой базе: имя задаёт переменная
+# окружения THEATER_TEST_DB, сервер и учётные данные - из config.py. База создаётся перед
+# сессией, схема накатывается schema.migrate, после сессии база удаляется. Без
+# THEATER_TEST_DB такие тесты пропускаются; остальные используют заглушки и идут всегда.
+#   THEATER_TEST_DB=theater_test python -m pytest -q
+import os
+import sys
+import tempfile
+import uuid
+
+import mysql.connector
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+TEST_DB = os.environ.get('THEATER_TEST_DB')
+
+# До импорта модулей приложения: они читают настройки при импорте. Файлы версий и снимка
+# каталога - во временном каталоге, чтобы не мешать запущенному рядом приложению
+_files = tempfile.mkdtemp(prefix='theater-tests-')
+config.VERSIONS_FILE = os.path.join(_files, 'versions.bin')
+config.SNAPSHOT_FILE = os.path.join(_files, 'catalog.snapshot')
+config.SNAPSHOT_ENABLED = False
+if TEST_DB:
+    config.MYSQL_DB = TEST_DB
+
+
+def _connect(database=None):
+    return mysql.connector.connect(host=config.MYSQL_HOST, user=config.MYSQL_USER, password=config.MYSQL_PASSWORD,
+                                   database=database, charset=config.MYSQL_CHARSET)
+
+
+@pytest.fixture(scope='session')
+def database():
+    if not TEST_DB:
+        pytest.skip('THEATER_TEST_DB не задана: тесты с MySQL пропущены')
+    server = _connect()
+    cursor = server.cursor()
+    cursor.execute("SHOW DATABASES LIKE %s", (TEST_DB,))
+    if cursor.fetchone():
+        # Чужую базу не трогаем: её пришлось бы удалить после тестов
+        pytest.exit(f'База {TEST_DB} уже существует; для тестов нужна новая')
+    cursor.execute(f"CREATE DATABASE `{TEST_DB}` CHARACTER SET utf8mb4")
+    try:
+        from schema import migrate
+        conn = _connect(TEST_DB)
+        migrate(conn)
+        conn.close()
+        yield TEST_DB
+    finally:
+        cursor.execute(f"DROP DATABASE `{TEST_DB}`")
+        server.close()
+
+
+@pytest.fixture(scope='session')
+def app(database):
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def conn(database):
+    conn = _connect(database)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def make_user(conn):
+    created = []
+
+    def make():
+        cursor = conn.cursor()
+        name = f'test_{uuid.uuid4().hex[:12]}'
+        cursor.execute("INSERT INTO User (username, email, password_hash) VALUES (%s, %s, %s)",
+                       (name, f'{name}@example.com', 'x' * 60))
+        conn.commit()
+        created.append(cursor.lastrowid)
+        return cursor.lastrowid
+
+    yield make
+    cursor = conn.cursor()
+    for user_id in created:
+        cursor.execute("DELETE FROM User WHERE user_id=%s", (user_id,))
+    conn.commit()
+
+
+@pytest.fixture
+def make_play(conn):
+    created = []
+
+    def make(duration=120):
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO Play (title, description, genre, duration) VALUES (%s, %s, %s, %s)",
+                       (f'Пьеса {uuid.uuid4().hex[:8]}', 'Тест', 'Драма', duration))
+        conn.commit()
+        created.append(cursor.lastrowid)
+        return cursor.lastrowid
+
+    yield make
+    # Представления, билеты и агрегаты продаж удаляются каскадом
+    cursor = conn.cursor()
+    for play_id in created:
+        cursor.execute("DELETE FROM Play WHERE play_id=%s", (play_id,))
+    conn.commit()
+
+
+@pytest.fixture
+def make_performance(conn, make_play):
+    def make(seats=50, play_id=None, date_time='2030-01-01 19:00:00', venue=None):
+        play_id = play_id or make_play()
+        cursor = conn.cursor()
+        cursor.execute("""INSERT INTO Performance (Play_play_id, date_time, venue, available_seats)
+                          VALUES (%s, %s, %s, %s)""",
+                       (play_id, date_time, venue or f'Зал {uuid.uuid4().hex[:8]}', seats))
+        conn.commit()
+        return cursor.lastrowid
+
+    return make
@@ -0,0 +1,62 @@
+# tests/test_batching.py
+# Групповая фиксация без БД: истёкшее ожидание не оставляет вставку, которая потом всё же
+# запишется, - вызывающий либо получает TimeoutError и вставки не будет, либо дожидается её.
+import threading
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from batching import BatchWriter
+
+
+class SlowFlush:
+    # flush, который держит пакет, пока тест не отпустит gate
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.written = []
+
+    def __call__(self, conn, items):
+        self.started.set()
+        self.gate.wait(5)
+        self.written.extend(items)
+        return [f'ok:{item}' for item in items]
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    flush = SlowFlush()
+    writer = BatchWriter('test', flush, max_size=1, max_linger=0)
+    monkeypatch.setattr(writer, '_connection', lambda: None)
+    yield writer, flush
+    flush.gate.set()
+
+
+def test_timeout_waits_for_item_in_flush(writer):
+    writer, flush = writer
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', writer.submit('a', timeout=0.05)))
+    thread.start()
+    assert flush.started.wait(5)
+    thread.join(0.2)
+    assert thread.is_alive()        # ожидание истекло, но вставка уже пишется - ждём её
+    flush.gate.set()
+    thread.join(5)
+    assert result == {'value': 'ok:a'}
+    assert flush.written == ['a']
+
+
+def test_timeout_cancels_queued_item(writer):
+    writer, flush = writer
+    first = threading.Thread(target=writer.submit, args=('a',))
+    first.start()
+    assert flush.started.wait(5)
+
+    # Писатель занят пакетом 'a', 'b' ещё в очереди: её можно снять
+    with pytest.raises(TimeoutError):
+        writer.submit('b', timeout=0.05)
+    flush.gate.set()
+    first.join(5)
+    assert writer.submit('c', timeout=5) == 'ok:c'
+    assert flush.written == ['a', 'c']
+    assert writer.stats()['cancelled'] == 1
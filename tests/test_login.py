@@ -0,0 +1,52 @@
+# tests/test_login.py
+# Вход без БД (модель пользователя и пул bcrypt заменены): занятый пул мешает только
+# проверке пароля, а не пересчёту хэша после успешной проверки.
+import pytest
+
+import app as app_module
+from passwords import PasswordBusyError
+
+USER = {'user_id': 7, 'username': 'anna', 'password_hash': 'старый хэш'}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'WTF_CSRF_ENABLED', False)
+    monkeypatch.setattr(app_module.UserModel, 'get_user_by_username', staticmethod(lambda username: USER))
+    updates = []
+    monkeypatch.setattr(app_module.UserModel, 'update_password_hash',
+                        staticmethod(lambda user_id, password_hash: updates.append((user_id, password_hash))))
+    with app_module.app.test_client() as client:
+        yield client, updates
+
+
+def _busy(*args, **kwargs):
+    raise PasswordBusyError('Сервер перегружен')
+
+
+def test_login_when_rehash_busy(client, monkeypatch):
+    client, updates = client
+    monkeypatch.setattr(app_module, 'verify_password', lambda password, stored: (True, True))
+    monkeypatch.setattr(app_module, 'hash_password', _busy)
+    response = client.post('/login', data={'username': 'anna', 'password': 'секрет'})
+    assert response.status_code == 302
+    assert updates == []
+    with client.session_transaction() as session:
+        assert session['user_id'] == 7
+
+
+def test_login_rehashes(client, monkeypatch):
+    client, updates = client
+    monkeypatch.setattr(app_module, 'verify_password', lambda password, stored: (True, True))
+    monkeypatch.setattr(app_module, 'hash_password', lambda password: 'новый хэш')
+    assert client.post('/login', data={'username': 'anna', 'password': 'секрет'}).status_code == 302
+    assert updates == [(7, 'новый хэш')]
+
+
+def test_login_when_verify_busy(client, monkeypatch):
+    client, updates = client
+    monkeypatch.setattr(app_module, 'verify_password', _busy)
+    response = client.post('/login', data={'username': 'anna', 'password': 'секрет'})
+    assert response.status_code == 503
+    with client.session_transaction() as session:
+        assert 'user_id' not in session
@@ -0,0 +1,48 @@
+# tests/test_plans.py
+# Планы запросов моделей: каждое открытое чтение проверяется plans.check_plans (или
+# перечислено в UNCHECKED_READS с причиной), а на схеме schema.migrate ни один запрос
+# не сканирует таблицу целиком и все объявленные индексы на месте.
+import inspect
+
+import models
+import seatmap
+from plans import MODEL_READS, UNCHECKED_READS, check_plans
+
+MODELS = (models.UserModel, models.PlayModel, models.PerformanceModel, models.TicketModel,
+          models.ReviewModel, seatmap.SeatMapModel)
+READ_PREFIXES = ('get_', 'iter_', 'search_')
+
+
+def _public_reads():
+    reads = []
+    for model in MODELS:
+        for name, member in vars(model).items():
+            if not isinstance(member, staticmethod) or name.startswith('_'):
+                continue
+            if name in ('get', 'schedule') or name.startswith(READ_PREFIXES):
+                reads.append(f'{model.__name__}.{name}')
+    return reads
+
+
+def test_every_model_read_is_checked():
+    # Имя в MODEL_READS может быть уточнено: 'PlayModel.get_all_plays (страница)'
+    checked = {name.split(' ')[0] for name, _ in MODEL_READS}
+    missing = [read for read in _public_reads() if read not in checked and read not in UNCHECKED_READS]
+    assert not missing, f'нет в plans.MODEL_READS и plans.UNCHECKED_READS: {missing}'
+
+
+def test_unchecked_reads_exist():
+    stale = [name for name in UNCHECKED_READS if name not in _public_reads()]
+    assert not stale, f'в plans.UNCHECKED_READS лишние имена: {stale}'
+
+
+def test_plans_use_indexes(app):
+    with app.test_request_context():
+        report = check_plans()
+    problems = {
+        'missing_indexes': report['missing_indexes'],
+        'silent': report['silent'],
+        'full_scans': [(query['name'], query['sql'], query['full_scans'])
+                       for query in report['queries'] if query['full_scans']],
+    }
+    assert report['ok'], problems
@@ -0,0 +1,33 @@
+# tests/test_pool_exhausted.py
+# Исчерпанный пул соединений без БД (чтение модели заменено): страницы и API отвечают
+# 503 с Retry-After, как при переполненном пуле bcrypt и очереди на покупку, а не 500.
+import pytest
+
+import app as app_module
+from db import PoolExhaustedError
+
+
+def _exhausted(*args, **kwargs):
+    raise PoolExhaustedError('Нет свободных соединений с базой данных')
+
+
+@pytest.fixture
+def client():
+    with app_module.app.test_client() as client:
+        yield client
+
+
+def test_page_busy(client, monkeypatch):
+    monkeypatch.setattr(app_module.ReviewModel, 'get_all_reviews', staticmethod(_exhausted))
+    response = client.get('/reviews_all')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert 'Нет свободных соединений' in response.get_data(as_text=True)
+
+
+def test_api_busy(client, monkeypatch):
+    monkeypatch.setattr(app_module.PlayModel, 'get_play_by_id', staticmethod(_exhausted))
+    response = client.get('/api/v1/plays/1')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json() == {'error': 'Нет свободных соединений с базой данных'}
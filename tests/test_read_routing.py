@@ -0,0 +1,105 @@
+# tests/test_read_routing.py
+# Выбор соединения для чтения (db._read_slot) на заглушках вместо первичного сервера и
+# реплики: уже взятая запросом реплика не отдаётся для данных, которые только что изменились,
+# а счётчики чтений не теряют увеличений, когда реплику выбирают сразу многие потоки.
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+import db
+from versions import versions
+
+
+class FakePool:
+    def __init__(self, name):
+        self.name = name
+        self.acquired = 0
+        self.released = 0
+
+    def acquire(self, timeout=None):
+        self.acquired += 1
+        return SimpleNamespace(conn=SimpleNamespace(name=self.name), statements=None)
+
+    def release(self, slot):
+        self.released += 1
+
+
+class FakeReplica:
+    def __init__(self):
+        self.pool = FakePool('replica')
+        self.reads = 0
+
+    def usable(self):
+        return True
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    primary, replica = FakePool('primary'), FakeReplica()
+    monkeypatch.setattr(db, 'get_pool', lambda: primary)
+    monkeypatch.setattr(db, 'get_replicas', lambda: [replica])
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context('/'):
+        yield primary, replica.pool
+        db.close_db()
+
+
+def _server(fresh_keys=()):
+    return db.get_read_db(*fresh_keys).name
+
+
+def test_fresh_keys_rechecked_after_replica_taken(servers, monkeypatch):
+    primary, replica = servers
+    monkeypatch.setattr(versions, 'snapshot', lambda keys: (0, {key: (1, 0.0) for key in keys}))
+    assert _server(('review',)) == 'replica'
+
+    # 'performance' только что изменился: читать его с реплики уже нельзя
+    monkeypatch.setattr(versions, 'snapshot', lambda keys: (0, {key: (2, time.time()) for key in keys}))
+    assert _server(('performance',)) == 'primary'
+    assert _server() == 'replica'
+    assert (primary.acquired, replica.acquired) == (1, 1)
+
+
+def test_stale_keys_keep_replica(servers, monkeypatch):
+    primary, replica = servers
+    monkeypatch.setattr(versions, 'snapshot', lambda keys: (0, {key: (1, 0.0) for key in keys}))
+    assert _server(('play',)) == 'replica'
+    assert _server(('performance',)) == 'replica'
+    assert (primary.acquired, replica.acquired) == (0, 1)
+
+
+def test_slots_released(servers, monkeypatch):
+    primary, replica = servers
+    monkeypatch.setattr(versions, 'snapshot', lambda keys: (0, {key: (1, 0.0) for key in keys}))
+    _server()
+    monkeypatch.setattr(versions, 'snapshot', lambda keys: (0, {key: (2, time.time()) for key in keys}))
+    _server(('performance',))
+    db.close_db()
+    assert (primary.released, replica.released) == (1, 1)
+
+
+def test_counters_exact_across_threads(monkeypatch):
+    replicas = [FakeReplica(), FakeReplica()]
+    monkeypatch.setattr(db, 'get_replicas', lambda: replicas)
+    monkeypatch.setattr(db, '_must_read_primary', lambda fresh_keys: False)
+    monkeypatch.setattr(db, '_read_stats', dict.fromkeys(db._read_stats, 0))
+    monkeypatch.setattr(db, '_replica_turn', 0)
+    app = Flask(__name__)
+
+    def reads():
+        for _ in range(500):
+            with app.app_context():
+                db._read_slot()
+
+    threads = [threading.Thread(target=reads) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db._read_stats['replica'] == 4000
+    # Очередь реплик делится поровну: ни один ход не потерялся
+    assert [replica.reads for replica in replicas] == [2000, 2000]
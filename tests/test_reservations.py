@@ -0,0 +1,86 @@
+# tests/test_reservations.py
+# Одновременные покупки не продают больше мест, чем есть: ReserveSeats списывает места
+# условным UPDATE, пакетная покупка (reserve_batch) - так же, одной транзакцией.
+import threading
+from collections import Counter
+
+import pytest
+
+from reservations import ReservationModel, SoldOutError
+
+BUYERS = 300
+SEATS = 50
+PRICE = 400
+
+
+def _state(conn, performance_id):
+    conn.commit()   # новый снимок REPEATABLE READ
+    cursor = conn.cursor()
+    cursor.execute("SELECT available_seats, Play_play_id FROM Performance WHERE performance_id=%s",
+                   (performance_id,))
+    available_seats, play_id = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*) FROM Ticket WHERE Performance_performance_id=%s", (performance_id,))
+    tickets, = cursor.fetchone()
+    cursor.execute("SELECT tickets_sold FROM PerformanceSales WHERE Performance_performance_id=%s",
+                   (performance_id,))
+    performance_sold, = cursor.fetchone() or (0,)
+    cursor.execute("SELECT tickets_sold FROM PlaySales WHERE Play_play_id=%s", (play_id,))
+    play_sold, = cursor.fetchone() or (0,)
+    return {'available_seats': available_seats, 'tickets': tickets,
+            'performance_sold': performance_sold, 'play_sold': play_sold}
+
+
+def test_concurrent_buyers_never_oversell(app, conn, make_user, make_performance):
+    performance_id = make_performance(seats=SEATS)
+    user_id = make_user()
+    outcomes = Counter()
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(BUYERS)
+
+    def buyer():
+        start.wait()
+        with app.app_context():
+            try:
+                ReservationModel.reserve(performance_id, user_id, PRICE)
+                outcome = 'sold'
+            except SoldOutError:
+                outcome = 'sold_out'
+            except Exception as e:
+                outcome = 'error'
+                errors.append(e)
+        with lock:
+            outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=buyer) for _ in range(BUYERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert outcomes == {'sold': SEATS, 'sold_out': BUYERS - SEATS}
+    assert _state(conn, performance_id) == {'available_seats': 0, 'tickets': SEATS,
+                                            'performance_sold': SEATS, 'play_sold': SEATS}
+
+
+def test_batch_purchase_never_oversells(conn, make_user, make_performance):
+    performance_id = make_performance(seats=SEATS)
+    user_id = make_user()
+    results = ReservationModel.reserve_batch(conn, [(performance_id, user_id, PRICE)] * BUYERS)
+
+    assert sum(isinstance(result, dict) for result in results) == SEATS
+    assert all(isinstance(result, SoldOutError) for result in results if not isinstance(result, dict))
+    assert _state(conn, performance_id) == {'available_seats': 0, 'tickets': SEATS,
+                                            'performance_sold': SEATS, 'play_sold': SEATS}
+
+
+@pytest.mark.parametrize('seats', [0, 1])
+def test_last_seat(app, make_user, make_performance, seats):
+    performance_id = make_performance(seats=seats)
+    user_id = make_user()
+    with app.app_context():
+        if seats:
+            assert ReservationModel.reserve(performance_id, user_id, PRICE)['available_seats'] == 0
+        with pytest.raises(SoldOutError):
+            ReservationModel.reserve(performance_id, user_id, PRICE)
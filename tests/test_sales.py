@@ -0,0 +1,82 @@
+# tests/test_sales.py
+# Агрегаты PlaySales остаются верными, когда представление с проданными билетами
+# переносят к другой пьесе или удаляют: они меняются в той же транзакции, что и Performance.
+# Показатели статистики (utils.py) читают эти агрегаты через функции миграции 4.
+from datetime import datetime
+
+from models import PerformanceModel
+from reservations import ReservationModel
+from utils import get_average_ticket_price, get_occupancy_rate, get_total_tickets_sold
+
+
+def _play_sales(conn, play_id):
+    conn.commit()   # новый снимок REPEATABLE READ
+    cursor = conn.cursor()
+    cursor.execute("""SELECT tickets_sold, seats_sold, revenue, min_price, max_price
+                      FROM PlaySales WHERE Play_play_id=%s""", (play_id,))
+    row = cursor.fetchone()
+    return tuple(None if value is None else float(value) for value in row) if row else None
+
+
+def _sell(app, performance_id, user_id, *prices):
+    with app.app_context():
+        for price in prices:
+            ReservationModel.reserve(performance_id, user_id, price)
+
+
+def test_move_performance_moves_sales(app, conn, make_user, make_play, make_performance):
+    user_id = make_user()
+    old_play, new_play = make_play(), make_play()
+    moved = make_performance(play_id=old_play, date_time='2030-02-01 19:00:00')
+    stays = make_performance(play_id=old_play, date_time='2030-02-02 19:00:00')
+    target = make_performance(play_id=new_play, date_time='2030-02-03 19:00:00')
+    _sell(app, moved, user_id, 100, 900)
+    _sell(app, stays, user_id, 300)
+    _sell(app, target, user_id, 500)
+
+    with app.test_request_context():
+        PerformanceModel.update_performance(moved, new_play, datetime(2030, 2, 1, 19), 'Зал переноса', 48)
+
+    assert _play_sales(conn, old_play) == (1, 1, 300, 300, 300)
+    assert _play_sales(conn, new_play) == (3, 3, 1500, 100, 900)
+
+
+def test_move_performance_to_play_without_sales(app, conn, make_user, make_play, make_performance):
+    user_id = make_user()
+    old_play, new_play = make_play(), make_play()
+    moved = make_performance(play_id=old_play)
+    _sell(app, moved, user_id, 200, 400)
+
+    with app.test_request_context():
+        PerformanceModel.update_performance(moved, new_play, datetime(2030, 3, 1, 19), 'Зал без продаж', 48)
+
+    assert _play_sales(conn, old_play) == (0, 0, 0, None, None)
+    assert _play_sales(conn, new_play) == (2, 2, 600, 200, 400)
+
+
+def test_delete_performance_subtracts_sales(app, conn, make_user, make_play, make_performance):
+    user_id = make_user()
+    play_id = make_play()
+    deleted = make_performance(play_id=play_id, date_time='2030-04-01 19:00:00')
+    stays = make_performance(play_id=play_id, date_time='2030-04-02 19:00:00')
+    _sell(app, deleted, user_id, 50, 1000)
+    _sell(app, stays, user_id, 250)
+
+    with app.test_request_context():
+        PerformanceModel.delete_performance(deleted)
+
+    assert _play_sales(conn, play_id) == (1, 1, 250, 250, 250)
+
+
+def test_statistics_read_sales_through_functions(app, conn, make_user, make_play, make_performance):
+    user_id = make_user()
+    play_id = make_play()
+    performance_id = make_performance(seats=10, play_id=play_id)
+    _sell(app, performance_id, user_id, 100, 300)
+
+    conn.commit()
+    cursor = conn.cursor()
+    assert float(get_average_ticket_price(play_id, cursor)[0]) == 200
+    assert float(get_occupancy_rate(performance_id, cursor)[0]) == 20
+    assert get_total_tickets_sold(play_id, cursor) == (2,)
+    assert get_total_tickets_sold(make_play(), cursor) == (0,)
@@ -0,0 +1,140 @@
+# tests/test_schedule.py
+# Расписание залов: выборка кандидатов по группам продолжительности (без БД) и проверка
+# пересечений под GET_LOCK, общей для процессов приложения (с БД).
+import io
+import multiprocessing
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import db
+from importer import import_file
+from models import PerformanceModel
+from schedule import ScheduleConflictError, ScheduleIndex, _Timeline
+
+START = datetime(2030, 5, 1, 10, 0)
+
+
+def _row(performance_id, start, duration, venue='Большая сцена'):
+    return {'performance_id': performance_id, 'play_id': 1, 'title': f'Пьеса {performance_id}',
+            'date_time': start, 'venue': venue, 'duration': duration}
+
+
+def test_long_interval_does_not_widen_scan():
+    timeline = _Timeline()
+    for i in range(1000):
+        start = START + timedelta(hours=3 * i)
+        timeline.add(i, start, start + timedelta(minutes=120))
+    marathon = START + timedelta(hours=3 * 500)
+    timeline.add('marathon', marathon, marathon + timedelta(days=30))
+
+    # Представления по 2 часа: кандидаты - только соседи, а не всё, что началось за 30 дней
+    found = timeline.candidates(START + timedelta(hours=30), START + timedelta(hours=31))
+    assert found == [10]
+    # Длинное представление находится по своей группе
+    inside = marathon + timedelta(days=10)
+    assert 'marathon' in timeline.candidates(inside, inside + timedelta(hours=1))
+
+
+def test_remove_drops_empty_group():
+    timeline = _Timeline()
+    end = START + timedelta(days=30)
+    timeline.add('marathon', START, end)
+    timeline.add(1, START, START + timedelta(minutes=90))
+    timeline.remove('marathon', START, end)
+    assert list(timeline.groups) == [timedelta(minutes=90)]
+    assert timeline.candidates(START + timedelta(days=10), START + timedelta(days=11)) == []
+
+
+def test_candidates_sorted_by_start():
+    index = ScheduleIndex()
+    index.rebuild([_row(1, START, 600), _row(2, START + timedelta(hours=1), 60),
+                   _row(3, START + timedelta(hours=2), 60), _row(4, START + timedelta(hours=3), 600)])
+    found = index.between(START, START + timedelta(hours=5))
+    assert [item['performance_id'] for item in found] == [1, 2, 3, 4]
+
+
+def test_conflicts_after_remove():
+    index = ScheduleIndex()
+    index.rebuild([_row(1, START, 60), _row(2, START + timedelta(days=1), 60 * 24 * 10)])
+    with pytest.raises(ScheduleConflictError):
+        index.check('большая  сцена', START + timedelta(days=3), 60)
+    index.remove(2)
+    index.check('Большая сцена', START + timedelta(days=3), 60)
+
+
+def _create(app, play_id, venue, start, barrier, results):
+    # Соединения родителя процессу-потомку не достаются: у воркера свой пул, как после fork сервера
+    db._pool = db._replicas = None
+    barrier.wait()
+    try:
+        with app.test_request_context():
+            PerformanceModel.create_performance(play_id, start, venue, 10)
+        results.put('created')
+    except ScheduleConflictError:
+        results.put('conflict')
+    except Exception as e:
+        results.put(repr(e))
+
+
+def test_processes_do_not_double_book_venue(app, conn, make_play):
+    # У каждого процесса своё расписание в памяти; пересечение ловит только общая блокировка
+    play_id = make_play(duration=120)
+    venue = 'Зал гонки процессов'
+    ctx = multiprocessing.get_context('fork')
+    workers = 8
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    processes = [ctx.Process(target=_create, args=(app, play_id, venue, START + timedelta(minutes=5 * i),
+                                                   barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    outcomes = sorted(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+
+    assert outcomes == ['conflict'] * (workers - 1) + ['created']
+    conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM Performance WHERE venue=%s", (venue,))
+    assert cursor.fetchone() == (1,)
+
+
+def test_import_and_create_do_not_double_book_venue(app, conn, make_play):
+    # Импорт проверяет пачку и пишет её под той же блокировкой, что и create_performance
+    play_id = make_play(duration=120)
+    for attempt in range(5):
+        venue = f'Зал импорта {attempt}'
+        start = START + timedelta(days=attempt)
+        barrier = threading.Barrier(2)
+        outcomes = {}
+
+        def create():
+            barrier.wait()
+            try:
+                with app.test_request_context():
+                    PerformanceModel.create_performance(play_id, start, venue, 10)
+                outcomes['create'] = 'created'
+            except ScheduleConflictError:
+                outcomes['create'] = 'conflict'
+
+        def load():
+            row = (f'play_id,date_time,venue,available_seats\n'
+                   f'{play_id},{start + timedelta(minutes=30):%Y-%m-%dT%H:%M},{venue},10\n')
+            barrier.wait()
+            with app.test_request_context():
+                report = import_file(io.StringIO(row), 'performances', 'csv')
+            outcomes['import'] = 'created' if report['inserted'] else 'conflict'
+
+        threads = [threading.Thread(target=create), threading.Thread(target=load)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+
+        assert sorted(outcomes.values()) == ['conflict', 'created'], outcomes
+        conn.commit()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Performance WHERE venue=%s", (venue,))
+        assert cursor.fetchone() == (1,)
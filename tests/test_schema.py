@@ -0,0 +1,97 @@
+# tests/test_schema.py
+# Миграции можно повторить: Index/Column/Routine не пересоздают то, что уже есть (без БД,
+# на заглушке курсора), а повторный flask migrate после сбоя не ломает данные (с БД).
+import pytest
+
+from reservations import ReservationModel
+from schema import MIGRATIONS, Column, Index, Routine, migrate, _apply
+
+
+class FakeCursor:
+    # information_schema отвечает по множеству existing, остальное записывается в executed
+    def __init__(self, existing):
+        self.existing = existing
+        self.executed = []
+        self.found = None
+
+    def execute(self, sql, params=()):
+        if 'information_schema' in sql:
+            self.found = tuple(params) in self.existing
+        else:
+            self.executed.append(sql)
+
+    def fetchone(self):
+        return (1,) if self.found else None
+
+
+ADD_PLAY = Routine('PROCEDURE', 'AddPlay', 'CREATE PROCEDURE AddPlay() BEGIN END')
+
+
+@pytest.mark.parametrize('statement, key, sql', [
+    (Index('Ticket', 'idx_ticket_user', ('User_user_id',)), ('Ticket', 'idx_ticket_user'),
+     'ALTER TABLE Ticket ADD INDEX idx_ticket_user (User_user_id)'),
+    (Column('Ticket', 'seat_index', 'INT NULL'), ('Ticket', 'seat_index'),
+     'ALTER TABLE Ticket ADD COLUMN seat_index INT NULL'),
+    (ADD_PLAY, ('PROCEDURE', 'AddPlay'), 'CREATE PROCEDURE AddPlay() BEGIN END'),
+])
+def test_guarded_statements(statement, key, sql):
+    cursor = FakeCursor(existing=set())
+    _apply(cursor, statement)
+    assert cursor.executed == [sql]
+
+    cursor = FakeCursor(existing={key})
+    _apply(cursor, statement)
+    assert cursor.executed == []
+
+
+def _fetch(conn, query, params=()):
+    conn.commit()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def _add_play_body(conn):
+    rows = _fetch(conn, "SELECT ROUTINE_DEFINITION FROM information_schema.ROUTINES "
+                        "WHERE ROUTINE_SCHEMA = DATABASE() AND ROUTINE_NAME = 'AddPlay'")
+    return rows[0][0]
+
+
+def test_existing_add_play_kept(conn):
+    # В рабочей базе AddPlay мог отличаться от нашего - миграция его не заменяет
+    ours = next(statement for _, _, statements in MIGRATIONS for statement in statements
+                if isinstance(statement, Routine) and statement.name == 'AddPlay')
+    cursor = conn.cursor()
+    cursor.execute("DROP PROCEDURE AddPlay")
+    cursor.execute("""CREATE PROCEDURE AddPlay(IN p_title VARCHAR(255), IN p_description TEXT,
+                                               IN p_genre VARCHAR(100), IN p_duration INT)
+                      BEGIN
+                          /* своя версия */
+                          INSERT INTO Play (title, description, genre, duration)
+                          VALUES (p_title, p_description, p_genre, p_duration);
+                      END""")
+    cursor.execute("DELETE FROM SchemaVersion WHERE version = 0")
+    conn.commit()
+    try:
+        assert [version for version, _ in migrate(conn)] == [0]
+        assert 'своя версия' in _add_play_body(conn)
+    finally:
+        cursor.execute("DROP PROCEDURE AddPlay")
+        _apply(cursor, ours)
+
+
+def test_rerun_after_failure_keeps_sales(app, conn, make_user, make_performance):
+    # Сбой после ALTER TABLE / начального заполнения: версии не записаны, миграции
+    # выполняются ещё раз - столбец уже есть, а продажи не удваиваются
+    performance_id = make_performance(seats=10)
+    user_id = make_user()
+    with app.app_context():
+        ReservationModel.reserve(performance_id, user_id, 300, quantity=2)
+    query = "SELECT tickets_sold, revenue FROM PerformanceSales WHERE Performance_performance_id=%s"
+    before = _fetch(conn, query, (performance_id,))
+
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM SchemaVersion WHERE version IN (2, 3)")
+    conn.commit()
+    assert [version for version, _ in migrate(conn)] == [2, 3]
+    assert _fetch(conn, query, (performance_id,)) == before
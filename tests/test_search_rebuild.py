@@ -0,0 +1,86 @@
+# tests/test_search_rebuild.py
+# Перестройка устаревшего поискового индекса без БД (чтение пьес заменено): индекс
+# перестраивает один поток, остальные в это время ищут по старому и не ждут. Строится
+# индекс при первом поиске: импорт приложения (flask migrate, тесты) в БД не ходит.
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import models
+from models import PlayModel
+from search_index import SearchIndex
+
+PLAYS = [{'play_id': 1, 'title': 'Чайка', 'description': 'Комедия в четырёх действиях', 'genre': 'Комедия',
+          'duration': 150}]
+
+
+@pytest.fixture
+def slow_plays(monkeypatch):
+    gate = threading.Event()
+    calls = []
+
+    def iter_all_plays():
+        calls.append(threading.current_thread().name)
+        gate.wait(5)
+        return iter(PLAYS)
+
+    monkeypatch.setattr(PlayModel, 'iter_all_plays', staticmethod(iter_all_plays))
+    monkeypatch.setattr(models, 'search_index', SearchIndex())
+    yield gate, calls
+    gate.set()
+
+
+def _stale_index():
+    index = SearchIndex()
+    index.rebuild([dict(PLAYS[0], title='Старая чайка')])
+    index.built_at = time.monotonic() - models.SEARCH_INDEX_REFRESH - 1
+    return index
+
+
+def test_stale_index_rebuilt_once(slow_plays, monkeypatch):
+    gate, calls = slow_plays
+    old = _stale_index()
+    monkeypatch.setattr(models, 'search_index', old)
+    rebuilder = threading.Thread(target=PlayModel.build_search_index, name='rebuilder')
+    rebuilder.start()
+    while not calls:
+        time.sleep(0.001)
+
+    # Перестройка идёт: остальные запросы сразу получают старый индекс
+    started = time.monotonic()
+    for _ in range(20):
+        assert PlayModel.build_search_index() is old
+    assert time.monotonic() - started < 1
+
+    gate.set()
+    rebuilder.join(5)
+    assert calls == ['rebuilder']
+    assert models.search_index is not old
+    assert PlayModel.build_search_index() is models.search_index
+    assert calls == ['rebuilder']
+
+
+def test_empty_index_waits_for_rebuild(slow_plays):
+    gate, calls = slow_plays
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(PlayModel.build_search_index())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    # Все дождались одного построения и получили непустой индекс
+    assert len(calls) == 1
+    assert all(len(index) == 1 for index in results)
+
+
+def test_import_app_does_not_touch_database():
+    # Обращение к пулу завершает процесс сразу: исключение приложение могло бы поймать
+    code = ("import os, db\n"
+            "db.get_pool = lambda: os._exit(3)\n"
+            "import app\n")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
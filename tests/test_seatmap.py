@@ -0,0 +1,112 @@
+# tests/test_seatmap.py
+# Поиск блока соседних мест по битовым картам (без БД) и брони по схеме зала (с БД): срок
+# брони считается по часам MySQL, а истёкшие брони возвращает событие ExpireSeatMapHolds.
+import random
+
+import pytest
+
+from seatmap import MAX_BLOCK, SeatLayout, SeatMapModel, make_layout, runs_of
+
+LAYOUT = {'zones': {'Партер': '1500.00'}, 'rows': [{'label': '1', 'seats': 10, 'zone': 'Партер'}]}
+# Ряды 1-2 - партер по 6 мест, ряд 3 - балкон из 4 мест
+HALL = make_layout(3, 6, [('Партер', 1, 2, 1500), ('Балкон', 3, 3, 500)])
+HALL['rows'][2]['seats'] = 4
+
+
+def _bits(*seats):
+    return sum(1 << seat for seat in seats)
+
+
+def _runs_naive(free, n, width):
+    return sum(1 << p for p in range(width) if all(free >> (p + k) & 1 for k in range(n)))
+
+
+@pytest.mark.parametrize('n', range(1, 12))
+def test_runs_of_matches_naive(n):
+    rnd = random.Random(n)
+    for _ in range(200):
+        free = rnd.getrandbits(40)
+        assert runs_of(free, n) == _runs_naive(free, n, 40)
+
+
+def test_valid_starts_stay_within_row():
+    layout = SeatLayout(HALL)
+    # Блок из 3 мест в ряду из 6 может начинаться с мест 0..3 ряда
+    assert layout._valid_starts('Партер', 3) == _bits(0, 1, 2, 3, 6, 7, 8, 9)
+    assert layout._valid_starts('Балкон', 4) == _bits(12)
+    assert layout._valid_starts('Балкон', 5) == 0
+
+
+def test_find_block_prefers_center_of_earliest_row():
+    layout = SeatLayout(HALL)
+    assert layout.find_block(0, 'Партер', 2) == 2
+    # Центр первого ряда занят: ближайший к центру свободный блок слева или справа
+    assert layout.find_block(_bits(2, 3), 'Партер', 2) == 0
+    assert layout.find_block(_bits(1, 2, 3), 'Партер', 2) == 4
+
+
+def test_find_block_does_not_cross_rows():
+    layout = SeatLayout(HALL)
+    # В первом ряду свободны только места 4-5, во втором - 0-1: вместе четыре подряд,
+    # но блок из 3 мест на стыке рядов не годится; освободилось место 8 - блок 6-8 во втором ряду
+    taken = _bits(0, 1, 2, 3, 8, 9)
+    assert layout.find_block(taken, 'Партер', 3) is None
+    assert layout.find_block(taken & ~_bits(8), 'Партер', 3) == 6
+
+
+def test_find_block_limits():
+    layout = SeatLayout(HALL)
+    assert layout.find_block(0, 'Балкон', 4) == 12
+    assert layout.find_block(_bits(12), 'Балкон', 4) is None
+    assert layout.find_block(0, 'Ложа', 1) is None
+    assert layout.find_block(0, 'Партер', 0) is None
+    assert layout.find_block(0, 'Партер', MAX_BLOCK + 1) is None
+
+
+def test_hold_expires_by_database_clock(app, conn, make_user, make_performance):
+    performance_id = make_performance(seats=10)
+    user_id = make_user()
+    with app.test_request_context():
+        SeatMapModel.create(performance_id, LAYOUT)
+        hold = SeatMapModel.hold(performance_id, user_id, 'Партер', 2, ttl=120)
+
+    conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("SELECT TIMESTAMPDIFF(SECOND, NOW(), expires_at) FROM SeatMapHold WHERE hold_id=%s",
+                   (hold['hold_id'],))
+    left, = cursor.fetchone()
+    assert 110 <= left <= 120
+
+
+def test_expired_hold_not_returned(app, make_user, make_performance):
+    performance_id = make_performance(seats=10)
+    user_id = make_user()
+    with app.test_request_context():
+        SeatMapModel.create(performance_id, LAYOUT)
+        live = SeatMapModel.hold(performance_id, user_id, 'Партер', 2)
+        expired = SeatMapModel.hold(performance_id, user_id, 'Партер', 2, ttl=0)
+        assert SeatMapModel.get_hold(live['hold_id'], user_id) is not None
+        assert SeatMapModel.get_hold(expired['hold_id'], user_id) is None
+
+
+def test_expired_holds_released_without_new_hold(app, conn, make_user, make_performance):
+    performance_id = make_performance(seats=10)
+    user_id = make_user()
+    with app.test_request_context():
+        SeatMapModel.create(performance_id, LAYOUT)
+        live = SeatMapModel.hold(performance_id, user_id, 'Партер', 2)
+        SeatMapModel.hold(performance_id, user_id, 'Партер', 3, ttl=0)
+
+    cursor = conn.cursor()
+    cursor.callproc('ReleaseExpiredSeatMapHolds')
+    conn.commit()
+    cursor.execute("SELECT available_seats FROM Performance WHERE performance_id=%s", (performance_id,))
+    assert cursor.fetchone() == (8,)
+    with app.test_request_context():
+        state = SeatMapModel.get(performance_id)
+        assert SeatMapModel.get_hold(live['hold_id'], user_id) is not None
+    layout = state['layout']
+    live_bits = sum(1 << (number - 1) for _, number, _ in live['seats'])   # в схеме один ряд
+    assert state['held'] == live_bits
+    assert state['free'] == {'Партер': 8}
+    assert layout.find_block(state['sold'] | state['held'], 'Партер', 3) is not None
@@ -1,3 +1,7 @@
+# Показатели считают функции AverageTicketPrice/OccupancyRate/TotalTicketsSold (schema.py,
+# миграция 4) по агрегатам PlaySales/PerformanceSales, которые обновляются при каждой
+# покупке, поэтому стоимость не зависит от количества проданных билетов.
+
 def get_average_ticket_price(play_id, cursor):
     cursor.execute("SELECT AverageTicketPrice(%s)", (play_id,))
     result = cursor.fetchone()
@@ -0,0 +1,173 @@
+# versions.py
+# Счётчики версий данных каталога и отзывов для условных GET (ETag / Last-Modified).
+# Методы записи моделей увеличивают счётчик после commit(); маршруты, обёрнутые в
+# conditional(), сравнивают валидаторы клиента со счётчиками и отвечают 304 раньше,
+# чем обратятся к БД или шаблонам. Счётчики лежат в общем файле, отображённом в память
+# (mmap), поэтому видны всем процессам-воркерам на этой машине.
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request, session
+
+from config import VERSIONS_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows: только блокировка внутри процесса
+    fcntl = None
+
+# 'schedule' - даты, залы и продолжительность представлений (расписание залов); в отличие
+# от 'performance' не меняется при покупке билетов
+KEYS = ('play', 'performance', 'review', 'schedule')
+
+_HEADER = struct.Struct('<Q')    # эпоха файла: меняется при пересоздании, чтобы старые ETag не совпали
+_SLOT = struct.Struct('<Qd')     # версия, время последнего изменения (unix time)
+_SIZE = _HEADER.size + _SLOT.size * len(KEYS)
+
+
+class VersionCounters:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._seen = {}          # версия, которую этот процесс уже учёл в своих кэшах
+        self._listeners = {}     # ключ -> [callback], вызываются при изменении из другого процесса
+
+    def _ensure_open(self):
+        # После fork файл открывается заново: flock на унаследованном дескрипторе
+        # общий у родителя и потомков и не разделял бы их
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError:
+                # Файл недоступен - счётчики только в памяти этого процесса
+                self._fd, self._map = None, bytearray(_SIZE)
+                self._initialize()
+            else:
+                self._fd = fd
+                self._flock(fcntl.LOCK_EX if fcntl else None)
+                try:
+                    if os.fstat(fd).st_size < _SIZE:
+                        os.ftruncate(fd, _SIZE)
+                        self._map = mmap.mmap(fd, _SIZE)
+                        self._initialize()
+                    else:
+                        self._map = mmap.mmap(fd, _SIZE)
+                finally:
+                    self._funlock()
+            self._pid = os.getpid()
+
+    def _initialize(self):
+        now = time.time()
+        _HEADER.pack_into(self._map, 0, random.getrandbits(63) or 1)
+        for i in range(len(KEYS)):
+            _SLOT.pack_into(self._map, _HEADER.size + i * _SLOT.size, 0, now)
+
+    def _flock(self, operation):
+        if fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd, operation)
+
+    def _funlock(self):
+        if fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read(self):
+        epoch, = _HEADER.unpack_from(self._map, 0)
+        slots = {key: _SLOT.unpack_from(self._map, _HEADER.size + i * _SLOT.size) for i, key in enumerate(KEYS)}
+        return epoch, slots
+
+    def bump(self, *keys):
+        self._ensure_open()
+        with self._lock:
+            self._flock(fcntl.LOCK_EX if fcntl else None)
+            try:
+                now = time.time()
+                for key in keys:
+                    offset = _HEADER.size + KEYS.index(key) * _SLOT.size
+                    version, _ = _SLOT.unpack_from(self._map, offset)
+                    _SLOT.pack_into(self._map, offset, version + 1, now)
+                    self._seen[key] = version + 1
+            finally:
+                self._funlock()
+
+    def snapshot(self, keys=KEYS):
+        # (эпоха, {ключ: (версия, время изменения)}); заодно сообщает подписчикам
+        # об изменениях, сделанных другими процессами
+        self._ensure_open()
+        with self._lock:
+            self._flock(fcntl.LOCK_SH if fcntl else None)
+            try:
+                epoch, slots = self._read()
+            finally:
+                self._funlock()
+        for key in keys:
+            version = slots[key][0]
+            if self._seen.get(key) != version:
+                if key in self._seen:
+                    for callback in self._listeners.get(key, ()):
+                        callback()
+                self._seen[key] = version
+        return epoch, {key: slots[key] for key in keys}
+
+    def on_change(self, key, callback):
+        self._listeners.setdefault(key, []).append(callback)
+
+
+versions = VersionCounters(os.path.join(os.path.dirname(os.path.abspath(__file__)), VERSIONS_FILE))
+
+
+def _identity():
+    # Страницы отличаются для гостя, пользователя (его имя в меню) и администратора
+    user_id = session.get('user_id')
+    return f"u{user_id}" if user_id else 'g'
+
+
+def conditional(*keys):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # Сообщения flash выводятся при отрисовке - такой ответ нельзя заменять на 304
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            epoch, slots = versions.snapshot(keys)
+            etag = '-'.join([f'{epoch:x}'] + [str(slots[key][0]) for key in keys] + [_identity()])
+            last_modified = datetime.fromtimestamp(int(max(modified for _, modified in slots.values())),
+                                                   tz=timezone.utc)
+
+            # If-None-Match приоритетнее If-Modified-Since и сравнивается нестрого (RFC 9110):
+            # сжатый ответ API помечен W/ с тем же значением
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since:
+                not_modified = last_modified <= request.if_modified_since
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # no-cache: хранить можно, но каждый раз сверяться с сервером. Страницы гостя
+            # одинаковы для всех и подходят для общего кэша обратного прокси
+            response.headers['Cache-Control'] = 'private, no-cache' if 'user_id' in session else 'public, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator